@@ -0,0 +1,68 @@
+"""大量の作業名の分類にかかる時間を、チャンクの同時実行数ごとに比較する。
+    
+    uv run python benchmarks/bench_gemini_chunks.py --tasks 2000 --concurrency 1 4 16
+
+Gemini の代わりに httpx.MockTransport で、応答の生成時間（固定分 + 出力トークン数に比例する分）を
+asyncio.sleep で再現する。比較のため、1 チャンク分だけを問い合わせたときの時間も測る。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+from gemini_service import TASK_TOKEN_OVERHEAD, GeminiService  # noqa: E402
+from models import TaskItem  # noqa: E402
+
+
+def make_transport(base_latency, seconds_per_token):
+    async def handler(request):
+        prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+        names = [line[2:] for line in prompt.splitlines() if line.startswith("- ")]
+        tokens = sum(len(name) + TASK_TOKEN_OVERHEAD for name in names)
+        await asyncio.sleep(base_latency + tokens * seconds_per_token)
+        text = json.dumps({"categories": [{"category": "その他", "subcategory": "開発", "tasks": names}]})
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+    return httpx.MockTransport(handler)
+
+
+async def measure(tasks, concurrency, args):
+    client = httpx.AsyncClient(transport=make_transport(args.base_latency, args.seconds_per_token))
+    service = GeminiService(
+        "key", "bench-model", client, api_base="http://stub/v1beta",
+        chunk_tokens=args.chunk_tokens, max_concurrency=concurrency
+    )
+    chunks = len(service._chunk(tasks))
+    started = time.perf_counter()
+    summary = await service.categorize_tasks(tasks, [])
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+    assert sum(category.total_duration_ms for category in summary.categories) == sum(task.duration_ms for task in tasks)
+    return chunks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--chunk-tokens", type=int, default=1024)
+    parser.add_argument("--base-latency", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.002)
+    args = parser.parse_args()
+    
+    tasks = [TaskItem(task_name=f"プロジェクト作業 {index:05d}", duration_ms=60000) for index in range(args.tasks)]
+    
+    first_chunk = GeminiService("key", chunk_tokens=args.chunk_tokens)._chunk(tasks)[0]
+    _, single = asyncio.run(measure(first_chunk, 1, args))
+    print(f"1 チャンク ({len(first_chunk)} 件)      : {single:7.2f} s")
+    for concurrency in args.concurrency:
+        chunks, elapsed = asyncio.run(measure(tasks, concurrency, args))
+        print(f"同時実行数 {concurrency:>3} ({chunks} チャンク): {elapsed:7.2f} s  ({elapsed / single:5.2f} x 1 チャンク)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Gemini API 呼び出しの 1 リクエストあたりのレイテンシを、接続プールの有無で比較する。
+    
+    uv run python benchmarks/bench_gemini_client.py --requests 200 --tls
+
+ローカルにスタブサーバーを立て、呼び出しごとに httpx.AsyncClient を作る（従来の実装）場合と、
+共有クライアントを使い回す場合を測る。--tls では openssl で自己署名証明書を作り、TLS ハンドシェイクの分も含める。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from gemini_service import GeminiService, create_gemini_http_client  # noqa: E402
+from models import TaskItem  # noqa: E402
+
+
+stub = FastAPI()
+
+
+@stub.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str):
+    text = json.dumps({"categories": [{"category": "その他", "subcategory": "開発", "tasks": ["API実装"]}]})
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(port, certfile=None, keyfile=None):
+    config = uvicorn.Config(stub, port=port, log_level="warning", ssl_certfile=certfile, ssl_keyfile=keyfile)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def make_certificate(directory):
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True
+    )
+    return certfile, keyfile
+
+
+async def measure(api_base, count, pooled, verify):
+    tasks = [TaskItem(task_name="API実装", duration_ms=1000)]
+    latencies = []
+    shared = create_gemini_http_client(verify=verify) if pooled else None
+    for _ in range(count):
+        client = shared or create_gemini_http_client(verify=verify)
+        service = GeminiService("bench-key", "stub-model", client, api_base)
+        started = time.perf_counter()
+        await service.categorize_tasks(tasks)
+        latencies.append(time.perf_counter() - started)
+        if not pooled:
+            await client.aclose()
+    if shared is not None:
+        await shared.aclose()
+    return latencies
+
+
+def report(label, latencies):
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered) * 1000
+    p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000
+    print(f"{label:<22} mean {statistics.mean(ordered) * 1000:7.2f} ms   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+    
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = make_certificate(directory) if args.tls else (None, None)
+        server, thread = start_stub(port, certfile, keyfile)
+        scheme = "https" if args.tls else "http"
+        api_base = f"{scheme}://127.0.0.1:{port}/v1beta"
+        try:
+            # 計測前に 1 回ずつ呼んでインポートなどの初回コストを除く
+            asyncio.run(measure(api_base, 1, True, certfile or True))
+            per_call = asyncio.run(measure(api_base, args.requests, False, certfile or True))
+            pooled = asyncio.run(measure(api_base, args.requests, True, certfile or True))
+        finally:
+            server.should_exit = True
+            thread.join()
+    
+    print(f"requests: {args.requests}, transport: {scheme}")
+    report("client per call", per_call)
+    report("shared pooled client", pooled)
+    print(f"speedup (mean):        {statistics.mean(per_call) / statistics.mean(pooled):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""分類結果の最初のカテゴリが届くまでの時間と全体の時間を、generateContent と streamGenerateContent で比較する。
+    
+    uv run python benchmarks/bench_gemini_stream.py --tasks 200 --piece-delay 0.02
+
+ローカルに gemini_stub のサーバーを立て、生成されたテキストを piece_size 文字ごとに piece_delay 秒かけて返させる
+（generateContent は同じ時間をかけてから全体を返す）。
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import uvicorn  # noqa: E402
+from gemini_service import GeminiService, create_gemini_http_client  # noqa: E402
+from gemini_stub import create_stub_app  # noqa: E402
+from models import TaskItem  # noqa: E402
+
+
+KEYWORDS = ["開発", "テスト", "会議", "学習", "設計", "資料"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(port, piece_size, piece_delay):
+    app = create_stub_app(piece_size=piece_size, piece_delay=piece_delay)
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def measure(base, tasks, streaming, rounds):
+    first_times, totals = [], []
+    client = create_gemini_http_client()
+    for _ in range(rounds):
+        # 毎回キャッシュを空にして Gemini（スタブ）に問い合わせる
+        service = GeminiService(
+            "key", "bench-model", client, api_base=base, streaming=streaming, chunk_tokens=100000, deadline_seconds=60
+        )
+        started = time.perf_counter()
+        first = None
+        async for _ in service.stream_categories(tasks, []):
+            if first is None:
+                first = time.perf_counter() - started
+        totals.append(time.perf_counter() - started)
+        first_times.append(first)
+    await client.aclose()
+    return statistics.median(first_times), statistics.median(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--piece-size", type=int, default=32)
+    parser.add_argument("--piece-delay", type=float, default=0.02)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    
+    tasks = [
+        TaskItem(task_name=f"{KEYWORDS[index % len(KEYWORDS)]}作業 {index:04d}", duration_ms=60000)
+        for index in range(args.tasks)
+    ]
+    port = free_port()
+    server, thread = start_stub(port, args.piece_size, args.piece_delay)
+    base = f"http://127.0.0.1:{port}/v1beta"
+    try:
+        for label, streaming in (("generateContent      ", False), ("streamGenerateContent", True)):
+            first, total = asyncio.run(measure(base, tasks, streaming, args.rounds))
+            print(f"{label}: 最初のカテゴリ {first * 1000:8.1f} ms / 全体 {total * 1000:8.1f} ms")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
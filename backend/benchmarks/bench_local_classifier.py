@@ -0,0 +1,77 @@
+"""Gemini の分類結果から学習した手元の分類器が、確信度の閾値ごとにどれだけの作業名をどの精度で答えるかを測る。
+    
+    uv run python benchmarks/bench_local_classifier.py --train 2000 --test 5000 --noise 0.1
+
+Gemini の代わりにキーワード規則（RuleClassifier）で正解を付け、学習用の正解の一部（--noise）をでたらめな分類に
+置き換える（Gemini の揺れの代わり）。学習に使っていない作業名について、閾値以上で答えた割合と、その正解率を表示する。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from classification_cache import normalize_task_name  # noqa: E402
+from local_classifier import LocalClassifier  # noqa: E402
+from rule_classifier import RuleClassifier  # noqa: E402
+
+
+TARGETS = ["API", "画面", "ログイン", "週次", "定例", "新機能", "不具合", "バッチ", "メール", "顧客", "月次", "移行"]
+ACTIONS = ["実装", "テスト", "ミーティング", "調査", "設計", "資料作成", "対応", "レビュー", "返信", "デバッグ"]
+
+
+def make_names(count, projects, randomness):
+    names = []
+    for index in range(count):
+        parts = [randomness.choice(TARGETS), randomness.choice(ACTIONS)]
+        if randomness.random() < 0.6:
+            parts.insert(0, randomness.choice(projects))
+        if randomness.random() < 0.5:
+            parts.append(f"#{index}")
+        names.append(normalize_task_name(" ".join(parts)))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train", type=int, default=2000)
+    parser.add_argument("--test", type=int, default=5000)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.15, 0.2])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    randomness = random.Random(args.seed)
+    projects = [f"プロジェクト{index:02d}" for index in range(args.projects)]
+    rules = RuleClassifier()
+    
+    def label(name):
+        return rules.classify(name, projects)[:2]
+    
+    train = make_names(args.train, projects, randomness)
+    test = make_names(args.test, projects, randomness)
+    labels = sorted({label(name) for name in train})
+    examples = {name: label(name) if randomness.random() >= args.noise else randomness.choice(labels) for name in train}
+    
+    learner = LocalClassifier()
+    started = time.perf_counter()
+    learner.add_many(examples)
+    trained = time.perf_counter() - started
+    started = time.perf_counter()
+    predictions = learner.predict_many(test, projects)
+    predicted = time.perf_counter() - started
+    
+    print(f"学習 {len(examples):,} 件 ({len(labels)} 分類, 誤り {args.noise:.0%}): {trained:6.3f} s")
+    print(f"予測 {len(test):,} 件: {predicted:6.3f} s  ({len(test) / predicted:,.0f} 件/s)")
+    for threshold in args.thresholds:
+        served = [(prediction, name) for prediction, name in zip(predictions, test) if prediction and prediction[2] >= threshold]
+        correct = sum(prediction[:2] == label(name) for prediction, name in served)
+        accuracy = correct / len(served) if served else 0.0
+        print(f"閾値 {threshold:4.2f}: 手元で回答 {len(served) / len(test):6.1%}  正解率 {accuracy:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
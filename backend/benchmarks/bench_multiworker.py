@@ -0,0 +1,127 @@
+"""uvicorn のワーカー数を変えて、共有 SQLite ストアでのセッション API のスループットを測る。
+    
+    uv run python benchmarks/bench_multiworker.py --workers 1 2 4 --clients 8 --seconds 10
+
+各クライアントは別ユーザーとして 開始 → 状態取得 → 一時停止 → 再開 → 停止 を繰り返す。
+状態取得は毎回新しい接続で行うので別のワーカーに振り分けられ、開始したセッションが
+見えなかった回数（ワーカー間の不整合）も数える。
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(conn, method, path, user_id, body=None):
+    headers = {"X-User-Id": user_id}
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+        body = json.dumps(body)
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"{method} {path}: {response.status} {data!r}")
+    return json.loads(data) if data else None
+
+
+def run_client(port, user_id, seconds, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    requests = 0
+    stale_reads = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        session = request(conn, "POST", "/sessions/start", user_id, {"task_name": "負荷テスト"})
+        # 新しい接続は別のワーカーに届きうる
+        other = http.client.HTTPConnection("127.0.0.1", port)
+        active = request(other, "GET", "/sessions/active", user_id)
+        other.close()
+        if active is None or active["id"] != session["id"]:
+            stale_reads += 1
+        request(conn, "PATCH", f"/sessions/{session['id']}/pause", user_id)
+        request(conn, "PATCH", f"/sessions/{session['id']}/pause", user_id)
+        request(conn, "POST", f"/sessions/{session['id']}/stop", user_id)
+        requests += 5
+    conn.close()
+    results.put((requests, stale_reads))
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def bench(workers, clients, seconds):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, SESSION_STORE_DB=os.path.join(directory, "sessions.db"))
+        env.pop("SESSION_STORE_DIR", None)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+             "--http", "uvicorn_protocol:NoDelayHTTPProtocol", "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR, env=env
+        )
+        try:
+            wait_until_ready(port)
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=run_client, args=(port, f"user-{i}", seconds, results))
+                for i in range(clients)
+            ]
+            started = time.perf_counter()
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+    requests = sum(count for count, _ in totals)
+    stale_reads = sum(stale for _, stale in totals)
+    return requests / elapsed, stale_reads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+    
+    print(f"cpus: {os.cpu_count()}, clients: {args.clients}, seconds: {args.seconds}")
+    baseline = None
+    for workers in args.workers:
+        throughput, stale_reads = bench(workers, args.clients, args.seconds)
+        baseline = baseline or throughput
+        print(
+            f"workers={workers}:  {throughput:8.1f} req/s  ({throughput / baseline:4.2f}x)  "
+            f"stale reads: {stale_reads}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""キーワード規則による作業名の分類速度（件/秒）を、以前のキーワードごとの in 判定と比較する。
+    
+    uv run python benchmarks/bench_rule_classifier.py --names 200000 --projects 20
+
+作業名はすべて異なる場合（メモが効かない）と、Zipf 分布で繰り返し現れる場合（実際の作業記録に近い）の 2 通りを測る。
+作業名はあらかじめ normalize_task_name で正規化しておき、分類だけの時間を測る。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from classification_cache import normalize_task_name  # noqa: E402
+from rule_classifier import DEFAULT_RULES, RuleClassifier  # noqa: E402
+
+
+WORDS = ["API", "画面", "ログイン", "週次", "定例", "新機能", "不具合", "バッチ", "メール", "顧客", "月次", "移行"]
+ACTIONS = ["実装", "テスト", "ミーティング", "調査", "設計", "資料作成", "対応", "レビュー", "返信", "デバッグ"]
+
+
+def legacy_classify(task_lower, projects):
+    # 以前の _mock_classify と同じく、プロジェクトとキーワードを 1 つずつ in で調べる
+    category = DEFAULT_RULES["default_category"]
+    for project in projects:
+        if project.lower() in task_lower:
+            category = project
+            break
+    subcategory = DEFAULT_RULES["default_subcategory"]
+    for group in DEFAULT_RULES["subcategories"]:
+        if any(keyword in task_lower for keyword in group["keywords"]):
+            subcategory = group["name"]
+            break
+    return category, subcategory
+
+
+def make_names(count, projects, randomness):
+    names = []
+    for index in range(count):
+        parts = [randomness.choice(WORDS), randomness.choice(ACTIONS), f"#{index}"]
+        if randomness.random() < 0.5:
+            parts.insert(0, randomness.choice(projects))
+        names.append(normalize_task_name(" ".join(parts)))
+    return names
+
+
+def zipf_names(unique, count, randomness):
+    weights = [1 / rank for rank in range(1, len(unique) + 1)]
+    return randomness.choices(unique, weights, k=count)
+
+
+def measure(label, classify, names):
+    started = time.perf_counter()
+    classify(names)
+    elapsed = time.perf_counter() - started
+    print(f"  {len(names) / elapsed:12,.0f} 件/s  ({elapsed:6.3f} s)  {label}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=200000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    randomness = random.Random(args.seed)
+    projects = [f"プロジェクト{index:02d}" for index in range(args.projects)]
+    unique = make_names(args.names, projects, randomness)
+    repeated = zipf_names(unique[:args.names // 20], args.names, randomness)
+    
+    for label, names in (("すべて異なる作業名", unique), ("Zipf で繰り返す作業名", repeated)):
+        print(f"{label} ({len(names):,} 件, 異なる名前 {len(set(names)):,} 件, プロジェクト {len(projects)} 件)")
+        measure("以前の in 判定", lambda names: [legacy_classify(name, projects) for name in names], names)
+        # 毎回新しい分類器で測り、オートマトンの構築とメモの作成も時間に含める
+        measure("RuleClassifier.classify_many", lambda names: RuleClassifier().classify_many(names, projects), names)
+        classifier = RuleClassifier()
+        classifier.classify_many(names, projects)
+        measure("（メモ作成済み）", lambda names: classifier.classify_many(names, projects), names)
+
+
+if __name__ == "__main__":
+    main()
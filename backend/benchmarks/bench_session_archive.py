@@ -0,0 +1,91 @@
+"""停止済みセッション 1 件あたりのメモリ使用量を Session モデルとアーカイブで比較する。
+    
+    uv run python benchmarks/bench_session_archive.py --count 1000000
+
+SESSION_STORE_DIR を指定したとき（WalSessionStore）に、スナップショット用にライタースレッドが
+アーカイブとは別に保持する JSON の量も測る。
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+import uuid
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import Session, SessionStatus  # noqa: E402
+from session_archive import SessionArchive  # noqa: E402
+from session_store import WalSessionStore  # noqa: E402
+
+
+TASK_NAMES = ["API開発", "テスト作成", "チーム会議", "設計レビュー", "ドキュメント作成", "調査"]
+
+
+def generate_sessions(count):
+    base_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        start_time = base_time + timedelta(minutes=i)
+        yield Session(
+            id=str(uuid.uuid4()),
+            user_id="default",
+            task_name=TASK_NAMES[i % len(TASK_NAMES)],
+            status=SessionStatus.STOPPED,
+            start_time=start_time,
+            pause_time=None,
+            end_time=start_time + timedelta(seconds=45),
+            total_duration=45000
+        )
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    holder = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return holder, current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    def build_models():
+        return {session.id: session for session in generate_sessions(args.count)}
+    
+    def build_archive():
+        archive = SessionArchive()
+        for session in generate_sessions(args.count):
+            archive.add(session)
+        return archive
+    
+    def build_wal_state(directory):
+        # スナップショットは作らず、ライタースレッドが保持する最新状態だけを残す
+        store = WalSessionStore(directory, snapshot_interval=args.count + 1, fsync=False)
+        store.load()
+        for session in generate_sessions(args.count):
+            store.append("stop", session)
+        store.flush()
+        return store
+    
+    models, model_bytes = measure(build_models)
+    del models
+    archive, archive_bytes = measure(build_archive)
+    del archive
+    with tempfile.TemporaryDirectory() as directory:
+        store, wal_bytes = measure(lambda: build_wal_state(directory))
+        store.close()
+    
+    print(f"sessions:           {args.count:,}")
+    print(f"Session models:     {model_bytes / args.count:8.1f} bytes/session ({model_bytes / 2**20:,.1f} MiB)")
+    print(f"SessionArchive:     {archive_bytes / args.count:8.1f} bytes/session ({archive_bytes / 2**20:,.1f} MiB)")
+    print(f"reduction:          {model_bytes / archive_bytes:8.1f}x")
+    print(f"WAL snapshot state: {wal_bytes / args.count:8.1f} bytes/session ({wal_bytes / 2**20:,.1f} MiB, アーカイブに加えて必要)")
+
+
+if __name__ == "__main__":
+    main()
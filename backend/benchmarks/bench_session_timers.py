@@ -0,0 +1,67 @@
+"""進行中セッションのタイマー登録・取り消し・期限処理の所要時間を測る。
+    
+    uv run python benchmarks/bench_session_timers.py --count 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session_timers import TimerWheel  # noqa: E402
+
+
+def timed(operation):
+    started = time.perf_counter()
+    result = operation()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--horizon", type=float, default=8 * 3600, help="期限をばらつかせる範囲（秒）")
+    args = parser.parse_args()
+    
+    now = 0.0
+    wheel = TimerWheel(now=now)
+    deadlines = [now + random.uniform(1, args.horizon) for _ in range(args.count)]
+    
+    def arm():
+        for key, deadline in enumerate(deadlines):
+            wheel.schedule(key, deadline)
+    
+    def rearm():
+        # 再開・ハートビートのたびに掛け直す想定
+        for key, deadline in enumerate(deadlines):
+            wheel.schedule(key, deadline + 60)
+    
+    def tick_through():
+        fired = 0
+        for second in range(1, int(args.horizon) + 62):
+            fired += len(wheel.advance(now + second))
+        return fired
+    
+    _, arm_seconds = timed(arm)
+    _, rearm_seconds = timed(rearm)
+    fired, tick_seconds = timed(tick_through)
+    ticks = int(args.horizon) + 61
+    
+    def cancel():
+        for key in range(args.count):
+            wheel.cancel(key)
+    
+    arm()
+    _, cancel_seconds = timed(cancel)
+    
+    print(f"timers:             {args.count:,}")
+    print(f"arm:                {arm_seconds / args.count * 1e6:8.2f} us/timer")
+    print(f"re-arm:             {rearm_seconds / args.count * 1e6:8.2f} us/timer")
+    print(f"cancel:             {cancel_seconds / args.count * 1e6:8.2f} us/timer")
+    print(f"advance:            {tick_seconds / ticks * 1e6:8.2f} us/tick ({fired:,} fired over {ticks:,} ticks)")
+
+
+if __name__ == "__main__":
+    main()
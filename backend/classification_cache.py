@@ -0,0 +1,279 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+Classification = Tuple[str, str]
+
+
+def normalize_task_name(task_name: str) -> str:
+    # 全角・半角や大文字小文字、空白の違いだけの作業名を同じものとして扱う
+    return " ".join(unicodedata.normalize("NFKC", task_name).split()).casefold()
+
+
+class ClassificationCache:
+    """作業名ごとの分類結果（カテゴリ, 小項目）を保持する LRU + TTL キャッシュ。
+    
+    キーには正規化した作業名に加えてモデル名とプロジェクト一覧を含める（呼び出し側で組み立てる）。
+    件数が上限を超えたら最も長く使われていないものから捨てる。
+    """
+    
+    # ファイルなどに永続化し、読み書きがワーカー間のロックを待つことがあるか
+    persistent = False
+    
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 7 * 86400.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Classification, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Hashable) -> Optional[Classification]:
+        return self.get_many([key]).get(key)
+    
+    def get_many(self, keys: List[Hashable]) -> Dict[Hashable, Classification]:
+        # 見つかったキーの分類結果だけを返す。メモリになかったキーは永続化先（あれば）からまとめて読み込む
+        with self._lock:
+            now = self._clock()
+            found: Dict[Hashable, Classification] = {}
+            missing = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+            loaded = self._load_many(missing) if missing else {}
+            for key in missing:
+                entry = loaded.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._remember(key, entry)
+                found[key] = entry[0]
+            self.hits += len(found)
+            return found
+    
+    def put(self, key: Hashable, classification: Classification) -> None:
+        self.put_many({key: classification})
+    
+    def put_many(self, classifications: Dict[Hashable, Classification]) -> None:
+        # 永続化先（あれば）へは 1 回の書き込みでまとめて保存する
+        if not classifications:
+            return
+        with self._lock:
+            expires_at = self._clock() + self.ttl_seconds
+            entries = {key: (classification, expires_at) for key, classification in classifications.items()}
+            for key, entry in entries.items():
+                self._remember(key, entry)
+            self._save_many(entries)
+    
+    def items(self) -> List[Tuple[Hashable, Classification]]:
+        # 期限内のメモリ上の分類結果（SQLite なら起動時に読み込んだ分を含む）。手元の分類器の学習に使う
+        with self._lock:
+            now = self._clock()
+            return [(key, entry[0]) for key, entry in self._entries.items() if entry[1] > now]
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+    
+    def close(self) -> None:
+        pass
+    
+    def _remember(self, key: Hashable, entry: Tuple[Classification, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def _load_many(self, keys: List[Hashable]) -> Dict[Hashable, Tuple[Classification, float]]:
+        return {}
+    
+    def _save_many(self, entries: Dict[Hashable, Tuple[Classification, float]]) -> None:
+        pass
+
+
+class SqliteClassificationCache(ClassificationCache):
+    """分類結果を SQLite（WAL モード）にも保存し、再起動後や他のワーカーと共有するキャッシュ。
+    
+    メモリ上の LRU を 1 段目とし、そこになければファイルを引く。期限はプロセス間で比べられるよう
+    UNIX 時刻で持つ。起動時には最近使われたものから warm_entries 件（省略時は max_entries 件）をメモリに読み込む。
+    ファイルの件数が max_disk_entries を超えたら、最後に使われたのが古いものから削除する。
+    """
+    
+    persistent = True
+    PRUNE_INTERVAL = 1000
+    # 1 回の SELECT の IN に並べるキーの数（SQLite の変数の上限より十分小さくする）
+    QUERY_BATCH = 500
+    
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000,
+        ttl_seconds: float = 7 * 86400.0,
+        max_disk_entries: int = 1000000,
+        warm_entries: Optional[int] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        super().__init__(max_entries, ttl_seconds, clock)
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # 読み取りは自動コミットで行い、書き込みは要求ごとにまとめて 1 つのトランザクションにする。
+        # 書き込みは UPSERT と最終利用時刻の更新だけなので、複数のワーカーが同時に書いても壊れない
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            "key TEXT PRIMARY KEY, category TEXT NOT NULL, subcategory TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS classifications_last_used ON classifications (last_used)"
+        )
+        self._writes_since_prune = 0
+        self.warm(max_entries if warm_entries is None else warm_entries)
+    
+    def warm(self, limit: int) -> int:
+        # 最近使われた順に読み、古いものから入れていくので LRU の順序もそのまま再現される
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, category, subcategory, expires_at FROM classifications "
+                "WHERE expires_at > ? ORDER BY last_used DESC LIMIT ?",
+                (self._clock(), min(limit, self.max_entries))
+            ).fetchall()
+            for key, category, subcategory, expires_at in reversed(rows):
+                self._remember(self._decode_key(key), ((category, subcategory), expires_at))
+        return len(rows)
+    
+    def stats(self) -> Dict[str, int]:
+        stats = super().stats()
+        with self._lock:
+            stats["disk_hits"] = self.disk_hits
+            stats["disk_size"] = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        return stats
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+    
+    def _load_many(self, keys: List[Hashable]) -> Dict[Hashable, Tuple[Classification, float]]:
+        now = self._clock()
+        encoded = {self._encode_key(key): key for key in keys}
+        names = list(encoded)
+        loaded: Dict[Hashable, Tuple[Classification, float]] = {}
+        for start in range(0, len(names), self.QUERY_BATCH):
+            batch = names[start:start + self.QUERY_BATCH]
+            rows = self._conn.execute(
+                "SELECT key, category, subcategory, expires_at FROM classifications "
+                f"WHERE expires_at > ? AND key IN ({', '.join('?' * len(batch))})",
+                (now, *batch)
+            ).fetchall()
+            for name, category, subcategory, expires_at in rows:
+                loaded[encoded[name]] = ((category, subcategory), expires_at)
+        if loaded:
+            # 次回の起動時に読み込む対象を決めるため、ファイルから引いたときだけ最終利用時刻を更新する
+            with self._write_transaction():
+                self._conn.executemany(
+                    "UPDATE classifications SET last_used = ? WHERE key = ?",
+                    [(now, self._encode_key(key)) for key in loaded]
+                )
+            self.disk_hits += len(loaded)
+        return loaded
+    
+    def _save_many(self, entries: Dict[Hashable, Tuple[Classification, float]]) -> None:
+        now = self._clock()
+        with self._write_transaction():
+            self._conn.executemany(
+                "INSERT INTO classifications (key, category, subcategory, expires_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET category = excluded.category, subcategory = excluded.subcategory, "
+                "expires_at = excluded.expires_at, last_used = excluded.last_used",
+                [
+                    (self._encode_key(key), category, subcategory, expires_at, now)
+                    for key, ((category, subcategory), expires_at) in entries.items()
+                ]
+            )
+            self._writes_since_prune += len(entries)
+            if self._writes_since_prune >= self.PRUNE_INTERVAL:
+                self._prune()
+    
+    @contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        # 読み取りから書き込みに昇格すると競合時に待たずに失敗するので、最初から書き込みロックを取る
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+    
+    def _prune(self) -> None:
+        self._writes_since_prune = 0
+        self._conn.execute("DELETE FROM classifications WHERE expires_at <= ?", (self._clock(),))
+        self._conn.execute(
+            "DELETE FROM classifications WHERE key IN ("
+            "SELECT key FROM classifications ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+    
+    def _encode_key(self, key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False)
+    
+    def _decode_key(self, key: str) -> Hashable:
+        # JSON では tuple が list になるので、入れ子も含めて tuple に戻す
+        def to_tuple(value):
+            return tuple(to_tuple(item) for item in value) if isinstance(value, list) else value
+        return to_tuple(json.loads(key))
+
+
+def create_classification_cache() -> ClassificationCache:
+    # CLASSIFICATION_CACHE_DB を指定すると再起動後も残り、ワーカー間でも共有される
+    max_entries = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "10000"))
+    ttl_seconds = float(os.getenv("CLASSIFICATION_CACHE_TTL_SECONDS", "604800"))
+    database = os.getenv("CLASSIFICATION_CACHE_DB")
+    if not database:
+        return ClassificationCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return SqliteClassificationCache(
+        database,
+        max_entries=max_entries,
+        ttl_seconds=ttl_seconds,
+        max_disk_entries=int(os.getenv("CLASSIFICATION_CACHE_DB_SIZE", "1000000"))
+    )
@@ -0,0 +1,145 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+
+# 時間をおけば成功しうる応答。これ以外の 4xx は再試行しても結果が変わらない
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    # Retry-After は秒数か HTTP 日付のどちらか。解釈できなければ None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return max((at - (now or datetime.now(timezone.utc))).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Gemini API 呼び出しの再試行設定。
+    
+    max_retries: 最初の試行に加えて再試行する回数
+    base_delay / max_delay: 指数バックオフの基準と上限（秒）。待ち時間は 0 から上限までの一様乱数（フルジッター）
+    attempt_timeout: 1 回の試行のタイムアウト（秒）。要求全体の期限が先に来るならそちらに合わせる
+    Retry-After が返されたら、少なくともその時間は待つ。
+    """
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        attempt_timeout: float = 10.0,
+        random_source: Callable[[], float] = random.random
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self._random = random_source
+    
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # attempt は 0 始まりの失敗回数
+        backoff = self._random() * min(self.max_delay, self.base_delay * (2 ** attempt))
+        if retry_after is not None:
+            return max(backoff, retry_after)
+        return backoff
+
+
+class CircuitBreaker:
+    """連続した失敗で開き、しばらく Gemini API を呼ばずにローカルの分類へ切り替えるサーキットブレーカー。
+    
+    closed: 通常どおり呼び出す。failure_threshold 回続けて失敗すると open になる
+    open: reset_timeout 秒のあいだ呼び出さない。経過後は half_open になる
+    half_open: 1 回だけ試し、成功すれば closed、失敗すれば再び open に戻る
+    （試行が結果を記録しないまま reset_timeout 秒経ったら、キャンセルされたものとみなして次の試行を許す）
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self.opened_total = 0
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+    
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and (
+                not self._trial_in_flight or self._clock() - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_in_flight = True
+                self._trial_started = self._clock()
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.opened_total += 1
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+    
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+
+def create_retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+        attempt_timeout=float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", "10"))
+    )
+
+
+def create_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+    )
@@ -1,50 +1,501 @@
+import asyncio
+import importlib.util
 import json
+import os
+import re
 import httpx
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from models import TaskItem, CategoryItem, SummaryResponse
+from classification_cache import Classification, ClassificationCache, normalize_task_name
+from single_flight import SingleFlight
+from json_stream import JsonArrayItemParser
+from rule_classifier import RuleClassifier
+from local_classifier import LocalClassifier
+from gemini_resilience import RETRYABLE_STATUS_CODES, CircuitBreaker, RetryPolicy, parse_retry_after
+
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+MAX_OUTPUT_TOKENS = 2048
+# 応答の JSON で作業名 1 件あたりに増えるトークン数の見積もり（引用符・区切りなど、作業名自体の分は別に数える）
+TASK_TOKEN_OVERHEAD = 4
+# 以前のプロンプト形式（"作業名 (1234ms)"）のまま作業名が返ってきたときに取り除く末尾
+DURATION_SUFFIX = re.compile(r"\s*\(\d+ms\)$")
+
+
+# 分類できた作業名を少しずつ受け取るコールバック（正規化した作業名 → (カテゴリ, 小項目)）
+Reporter = Callable[[Dict[str, Classification]], None]
+
+
+def response_schema(projects: List[str]) -> dict:
+    # 応答をこの形の JSON に制約する（カテゴリはプロジェクトか「その他」のどれか）
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "categories": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "category": {"type": "STRING", "enum": list(projects) + ["その他"]},
+                        "subcategory": {"type": "STRING"},
+                        "tasks": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    },
+                    "required": ["category", "subcategory", "tasks"],
+                    "propertyOrdering": ["category", "subcategory", "tasks"],
+                },
+            },
+        },
+        "required": ["categories"],
+    }
+
+
+class GeminiUnavailableError(Exception):
+    """再試行しても分類結果を得られなかった（ブレーカーが開いている・期限切れを含む）。"""
+
+
+class GeminiRequestError(Exception):
+    """Gemini API がリクエストを拒否した（API キーやモデル名・responseSchema の誤りなど、再試行しても直らない 4xx）。"""
+
+
+def aggregate_tasks(tasks: List[TaskItem]) -> List[TaskItem]:
+    # 正規化した作業名ごとに作業時間を合計する。表記は最初に現れたものを使い、順序も最初に現れた順
+    totals: Dict[str, TaskItem] = {}
+    for task in tasks:
+        name = normalize_task_name(task.task_name)
+        if name in totals:
+            totals[name].duration_ms += task.duration_ms
+        else:
+            totals[name] = TaskItem(task_name=task.task_name, duration_ms=task.duration_ms)
+    return list(totals.values())
+
+
+def create_gemini_http_client(**overrides) -> httpx.AsyncClient:
+    # 接続を使い回して TCP/TLS ハンドシェイクを毎回行わないよう、アプリ全体で 1 つのクライアントを共有する。
+    # HTTP/2 は h2 パッケージがあるときだけ有効にする（サーバーが対応していなければ HTTP/1.1 になる）
+    http2 = os.getenv("GEMINI_HTTP2", "true").lower() != "false" and importlib.util.find_spec("h2") is not None
+    options = dict(
+        timeout=30.0,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            keepalive_expiry=float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60")),
+        ),
+    )
+    options.update(overrides)
+    return httpx.AsyncClient(**options)
 
 
 class GeminiService:
     
-    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_name: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        api_base: Optional[str] = None,
+        cache: Optional[ClassificationCache] = None,
+        chunk_tokens: int = MAX_OUTPUT_TOKENS // 2,
+        max_concurrency: int = 4,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        deadline_seconds: float = 20.0,
+        streaming: bool = False,
+        rules: Optional[RuleClassifier] = None,
+        rule_confidence: Optional[float] = None,
+        learner: Optional[LocalClassifier] = None,
+        local_confidence: Optional[float] = None
+    ):
         self.api_key = api_key
         self.model_name = model_name or "gemini-2.5-flash"
-        self.base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent"
+        self.base_url = f"{api_base or DEFAULT_API_BASE}/models/{self.model_name}:generateContent"
+        # streaming では streamGenerateContent を使い、生成された分から分類結果を取り出す
+        self.stream_url = f"{api_base or DEFAULT_API_BASE}/models/{self.model_name}:streamGenerateContent"
+        self.streaming = streaming
+        # キーワード規則の分類器。API キーがないときや Gemini から結果を得られないときの分類に使い、
+        # rule_confidence を指定すると、確信度がそれ以上の作業名は Gemini に問い合わせずにこの分類を使う
+        self.rules = rules if rules is not None else RuleClassifier()
+        self.rule_confidence = rule_confidence
+        self.rule_classified = 0
+        # 同じ作業名を毎回 Gemini に問い合わせないよう、作業名ごとの分類結果を保持する
+        self.cache = cache if cache is not None else ClassificationCache()
+        # Gemini の分類結果から学習する手元の分類器。キャッシュにある結果から学習を始め、
+        # local_confidence を指定すると、確信度がそれ以上の作業名は Gemini に問い合わせずにこの予測を使う
+        self.learner = learner
+        self.local_confidence = local_confidence
+        self.local_classified = 0
+        self.local_deferred = 0
+        if learner is not None:
+            learner.add_many({key[-1]: classification for key, classification in self.cache.items()})
+        # 応答の JSON が maxOutputTokens で途切れないよう、1 回のプロンプトに入れる作業名をこの見積もりトークン数までに抑える
+        self.chunk_tokens = chunk_tokens
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 同じ作業名の集合を同時に問い合わせている要求があれば、その結果を共有する
+        self._in_flight = SingleFlight()
+        # 一時的な失敗は再試行し、続けて失敗したらブレーカーを開いてローカルの規則で分類する。
+        # 1 回の要約は deadline_seconds 以内に返し、間に合わない分はローカルの規則で分類する
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.deadline_seconds = deadline_seconds
+        self.retries = 0
+        self.fallbacks = 0
+        # 渡されたクライアントはアプリ側（lifespan）が閉じる。渡されなければ初回の呼び出しで作って自分で閉じる
+        self._client = http_client
+        self._owns_client = False
     
-    async def categorize_tasks(self, tasks: List[TaskItem], projects: List[str] = None) -> SummaryResponse:
+    async def categorize_tasks(
+        self,
+        tasks: List[TaskItem],
+        projects: List[str] = None,
+        on_classified: Optional[Reporter] = None
+    ) -> SummaryResponse:
+        projects = projects or []
+        # 同じ作業名が何度現れても 1 回だけ分類し、作業時間は分類後に名前ごとの合計で集計する
+        tasks = aggregate_tasks(tasks)
+        report = self._reporter(on_classified)
         if not self.api_key:
-            return self._mock_categorize_tasks(tasks, projects or [])
+            assignments = self._fallback(tasks, projects)
+            report(assignments)
+            return self._aggregate(tasks, assignments)
         
-        prompt = self._build_categorization_prompt(tasks, projects or [])
+        # 規則で確信を持って分類できる作業名とキャッシュにある作業名はそのまま使い、残りだけを Gemini に送る
+        assignments: Dict[str, Classification] = {}
+        misses: Dict[str, TaskItem] = {}
+        names = [normalize_task_name(task.task_name) for task in tasks]
+        if self.rule_confidence is not None:
+            for name, (category, subcategory, confidence) in zip(names, self.rules.classify_many(names, projects)):
+                if confidence >= self.rule_confidence:
+                    assignments[name] = (category, subcategory)
+            self.rule_classified += len(assignments)
+        keys = {name: self._cache_key(name, projects) for name in names if name not in assignments}
+        cached = await self._in_cache_thread(self.cache.get_many, list(keys.values()))
+        for name, task in zip(names, tasks):
+            if name not in keys:
+                continue
+            classification = cached.get(keys[name])
+            if classification is None:
+                misses[name] = task
+            else:
+                assignments[name] = classification
+        if misses and self.learner is not None and self.local_confidence is not None:
+            for name, prediction in zip(list(misses), self.learner.predict_many(list(misses), projects)):
+                if prediction is not None and prediction[2] >= self.local_confidence:
+                    assignments[name] = prediction[:2]
+                    del misses[name]
+                    self.local_classified += 1
+            self.local_deferred += len(misses)
+        report(assignments)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}?key={self.api_key}",
-                json={
-                    "contents": [{
-                        "parts": [{
-                            "text": prompt
-                        }]
-                    }],
-                    "generationConfig": {
-                        "temperature": 0.1,
-                        "maxOutputTokens": 2048,
-                    }
-                },
-                headers={"Content-Type": "application/json"}
+        if misses:
+            key = (self.model_name, tuple(sorted(projects)), tuple(sorted(misses)))
+            unclassified = list(misses.values())
+            deadline = asyncio.get_running_loop().time() + self.deadline_seconds
+            classified = await self._in_flight.run(
+                key, lambda: self._classify_all(unclassified, projects, deadline, report)
             )
+            # 他の要求の問い合わせに合流した場合は、途中経過を受け取れないので最後にまとめて通知する
+            report(classified)
+            assignments.update(classified)
+        
+        # 作業時間は要求ごとの値で集計するので、分類結果を共有しても合計は要求ごとに正しい
+        return self._aggregate(tasks, self._canonicalize(assignments, self._spellings(projects)))
+    
+    async def stream_categories(self, tasks: List[TaskItem], projects: List[str] = None) -> AsyncIterator[CategoryItem]:
+        # 作業名が分類されるたびに、増えた（カテゴリ, 小項目）の時点での合計を返す。
+        # 同じ項目は合計が増えるたびに返し直すので、受け取る側は項目ごとに最後の値で置き換えればよい
+        projects = projects or []
+        durations = {normalize_task_name(task.task_name): task.duration_ms for task in aggregate_tasks(tasks)}
+        spellings = self._spellings(projects)
+        totals: Dict[Classification, int] = {}
+        queue: "asyncio.Queue[Optional[Dict[str, Classification]]]" = asyncio.Queue()
+        job = asyncio.ensure_future(self.categorize_tasks(tasks, projects, queue.put_nowait))
+        job.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                changed: Dict[Classification, None] = {}
+                for name, classification in self._canonicalize(batch, spellings).items():
+                    totals[classification] = totals.get(classification, 0) + durations[name]
+                    changed[classification] = None
+                for category, subcategory in changed:
+                    yield CategoryItem(
+                        category=category, subcategory=subcategory, total_duration_ms=totals[(category, subcategory)]
+                    )
+            await job
+        finally:
+            if not job.done():
+                job.cancel()
+    
+    def _reporter(self, on_classified: Optional[Reporter]) -> Reporter:
+        # まだ通知していない作業名だけを on_classified に渡す
+        reported = set()
+        
+        def report(assignments: Dict[str, Classification]) -> None:
+            if on_classified is None:
+                return
+            fresh = {name: classification for name, classification in assignments.items() if name not in reported}
+            if fresh:
+                reported.update(fresh)
+                on_classified(fresh)
+        
+        return report
+    
+    async def _classify_all(
+        self, tasks: List[TaskItem], projects: List[str], deadline: float, report: Reporter
+    ) -> Dict[str, Classification]:
+        # 大きな入力はチャンクに分けて同時に問い合わせる（同時実行数はセマフォで制限する）
+        chunks = [
+            asyncio.ensure_future(self._classify_chunk(chunk, projects, deadline, report)) for chunk in self._chunk(tasks)
+        ]
+        try:
+            results = await asyncio.gather(*chunks)
+        except BaseException:
+            # 1 つが失敗したら（設定の誤りや要求の取り消し）、要求全体が失敗するので残りのチャンクの問い合わせも止める
+            for chunk in chunks:
+                chunk.cancel()
+            await asyncio.gather(*chunks, return_exceptions=True)
+            raise
+        assignments: Dict[str, Classification] = {}
+        for result in results:
+            assignments.update(result)
+        return assignments
+    
+    def _chunk(self, tasks: List[TaskItem]) -> List[List[TaskItem]]:
+        chunks: List[List[TaskItem]] = []
+        used = 0
+        for task in tasks:
+            tokens = len(task.task_name) + TASK_TOKEN_OVERHEAD
+            if not chunks or (chunks[-1] and used + tokens > self.chunk_tokens):
+                chunks.append([])
+                used = 0
+            chunks[-1].append(task)
+            used += tokens
+        return chunks
+    
+    async def _classify_chunk(
+        self, tasks: List[TaskItem], projects: List[str], deadline: float, report: Reporter
+    ) -> Dict[str, Classification]:
+        try:
+            async with self._semaphore:
+                return await self._classify(tasks, projects, deadline, report)
+        except GeminiUnavailableError:
+            # 要約全体を失敗させず、このチャンクだけローカルの規則で分類する（キャッシュはしない）
+            self.fallbacks += 1
+            fallback = self._fallback(tasks, projects)
+            report(fallback)
+            return fallback
+    
+    def _fallback(self, tasks: List[TaskItem], projects: List[str]) -> Dict[str, Classification]:
+        names = [normalize_task_name(task.task_name) for task in tasks]
+        return {
+            name: (category, subcategory)
+            for name, (category, subcategory, _) in zip(names, self.rules.classify_many(names, projects))
+        }
+    
+    def _spellings(self, projects: List[str]) -> Dict[str, str]:
+        return {normalize_task_name(project): project for project in projects}
+    
+    def _canonicalize(self, assignments: Dict[str, Classification], spellings: Dict[str, str]) -> Dict[str, Classification]:
+        # チャンクやキャッシュごとに表記が揺れても同じ項目に集計されるよう、正規化して同じになる名前は
+        # プロジェクト名、なければ最初に現れた表記にそろえる（spellings は呼び出しをまたいで使い回せる）
+        def canonical(name: str) -> str:
+            return spellings.setdefault(normalize_task_name(name), name)
+        
+        return {
+            task_name: (canonical(category), canonical(subcategory))
+            for task_name, (category, subcategory) in assignments.items()
+        }
+    
+    async def _classify(
+        self, tasks: List[TaskItem], projects: List[str], deadline: float, report: Reporter
+    ) -> Dict[str, Classification]:
+        prompt = self._build_categorization_prompt(tasks, projects)
+        body = {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": 0.1,
+                "maxOutputTokens": MAX_OUTPUT_TOKENS,
+                "responseMimeType": "application/json",
+                "responseSchema": response_schema(projects),
+            }
+        }
+        
+        wanted = {normalize_task_name(task.task_name): task for task in tasks}
+        assignments: Dict[str, Classification] = {}
+        
+        def collect(items: list) -> None:
+            # 閉じたカテゴリの要素ごとに、プロンプトに含めた作業名だけを採用する（キャッシュには最後にまとめて書く）
+            batch = {}
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                classification = (item.get("category"), item.get("subcategory"))
+                if not all(isinstance(value, str) for value in classification):
+                    continue
+                for task_name in item.get("tasks") or []:
+                    name = normalize_task_name(DURATION_SUFFIX.sub("", str(task_name)))
+                    if name in wanted and name not in assignments:
+                        assignments[name] = batch[name] = classification
+            if self.learner is not None:
+                self.learner.add_many(batch)
+            report(batch)
+        
+        if self.streaming:
+            await self._read_stream(body, deadline, collect)
+        else:
+            response = await self._post(f"{self.base_url}?key={self.api_key}", body, deadline)
+            try:
+                generated_text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+                collect(JsonArrayItemParser().feed(generated_text))
+            except (ValueError, KeyError, IndexError, TypeError):
+                pass
+        # Gemini から得た分類結果は、このチャンクの分をまとめて 1 回でキャッシュに書く
+        await self._in_cache_thread(
+            self.cache.put_many,
+            {self._cache_key(name, projects): classification for name, classification in assignments.items()}
+        )
+        
+        # 解析できない・途中で途切れた・モデルが返さなかった作業名はキャッシュせず、ローカルの規則で分類する
+        rest = [task for name, task in wanted.items() if name not in assignments]
+        if rest:
+            self.fallbacks += 1
+            fallback = self._fallback(rest, projects)
+            report(fallback)
+            assignments.update(fallback)
+        return assignments
+    
+    async def _read_stream(self, body: dict, deadline: float, collect: Callable[[list], None]) -> None:
+        # SSE の各イベントに含まれる生成途中のテキストを順に読み、カテゴリの要素が閉じるたびに collect へ渡す
+        loop = asyncio.get_running_loop()
+        response = await self._post(f"{self.stream_url}?alt=sse&key={self.api_key}", body, deadline, stream=True)
+        parser = JsonArrayItemParser()
+        
+        async def consume() -> None:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):])
+                parts = (chunk.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+                collect(parser.feed("".join(part.get("text", "") for part in parts)))
+        
+        try:
+            await asyncio.wait_for(consume(), timeout=max(deadline - loop.time(), 0))
+        except (asyncio.TimeoutError, httpx.TransportError, ValueError, KeyError, IndexError, TypeError, AttributeError):
+            # 途中で途切れても、それまでに受け取った分類は使う
+            pass
+        finally:
+            await response.aclose()
+    
+    async def _post(self, url: str, body: dict, deadline: float, stream: bool = False) -> httpx.Response:
+        # 429・5xx・通信エラーはジッター付きの指数バックオフで再試行する。
+        # 期限までに次の試行を始められない、再試行回数を使い切った、ブレーカーが開いている場合は GeminiUnavailableError。
+        # それ以外の 4xx は設定の誤りなので、ローカルの規則に切り替えて隠さず GeminiRequestError で呼び出し元に返す
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise GeminiUnavailableError("Gemini API circuit is open")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise GeminiUnavailableError("Gemini API deadline exceeded")
+            retry_after = None
+            client = self._get_client()
+            request = client.build_request("POST", url, json=body, headers={"Content-Type": "application/json"})
+            try:
+                # stream では応答ヘッダーまでを待ち、本文は呼び出し側が読む
+                response = await asyncio.wait_for(
+                    client.send(request, stream=stream), timeout=min(self.retry_policy.attempt_timeout, remaining)
+                )
+            except asyncio.TimeoutError:
+                failure = "Gemini API request timed out"
+            except httpx.TransportError as error:
+                failure = f"Gemini API request failed: {error!r}"
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # 応答が返ってきている限り API 自体は動いているので、4xx でもブレーカーは閉じる
+                    self.breaker.record_success()
+                    if response.status_code != 200:
+                        await response.aclose()
+                        raise GeminiRequestError(f"Gemini API rejected the request: {response.status_code}")
+                    return response
+                await response.aclose()
+                failure = f"Gemini API error: {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
             
-            if response.status_code != 200:
-                raise Exception(f"Gemini API error: {response.status_code}")
-            
-            result = response.json()
-            generated_text = result["candidates"][0]["content"]["parts"][0]["text"]
-            
-            return self._parse_gemini_response(generated_text, tasks)
+            self.breaker.record_failure()
+            if attempt >= self.retry_policy.max_retries:
+                raise GeminiUnavailableError(failure)
+            delay = self.retry_policy.delay(attempt, retry_after)
+            if loop.time() + delay >= deadline:
+                raise GeminiUnavailableError(failure)
+            await asyncio.sleep(delay)
+            attempt += 1
+            self.retries += 1
+    
+    async def _in_cache_thread(self, function: Callable, *args):
+        # ファイルに保存するキャッシュは他のワーカーの書き込みを待つことがあるので、イベントループを止めないようスレッドで呼ぶ
+        if self.cache.persistent:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+    
+    def _cache_key(self, normalized_name: str, projects: List[str]):
+        return (self.model_name, tuple(sorted(projects)), normalized_name)
+    
+    def _aggregate(self, tasks: List[TaskItem], assignments: Dict[str, Classification]) -> SummaryResponse:
+        totals: Dict[Classification, int] = {}
+        for task in tasks:
+            classification = assignments.get(normalize_task_name(task.task_name))
+            if classification is not None:
+                totals[classification] = totals.get(classification, 0) + task.duration_ms
+        return SummaryResponse(categories=[
+            CategoryItem(category=category, subcategory=subcategory, total_duration_ms=total)
+            for (category, subcategory), total in totals.items()
+        ])
+    
+    def upstream_stats(self) -> Dict[str, object]:
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_opened_total": self.breaker.opened_total,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "coalesced": self._in_flight.coalesced,
+            "rule_classified": self.rule_classified,
+        }
+    
+    def local_stats(self) -> Dict[str, object]:
+        # served_fraction は規則とキャッシュで決まらなかった作業名のうち、手元の分類器で答えた割合
+        asked = self.local_classified + self.local_deferred
+        stats = self.learner.stats() if self.learner is not None else {"examples": 0, "labels": 0, "dims": 0}
+        return {
+            **stats,
+            "threshold": self.local_confidence,
+            "served": self.local_classified,
+            "deferred": self.local_deferred,
+            "served_fraction": self.local_classified / asked if asked else 0.0,
+        }
+    
+    async def aclose(self) -> None:
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._owns_client = False
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = create_gemini_http_client()
+            self._owns_client = True
+        return self._client
     
     def _build_categorization_prompt(self, tasks: List[TaskItem], projects: List[str]) -> str:
+        # 分類に作業時間は要らないので作業名だけを送る
         tasks_text = "\n".join([
-            f"- {task.task_name} ({task.duration_ms}ms)"
+            f"- {task.task_name}"
             for task in tasks
         ])
         
@@ -82,82 +533,3 @@ class GeminiService:
 
 小項目（作業種類）の例: 開発、会議、学習、設計、テスト、デバッグ、ドキュメント作成、コードレビュー、実装、調査、打ち合わせ
 """
-    
-    def _parse_gemini_response(self, response_text: str, original_tasks: List[TaskItem]) -> SummaryResponse:
-        try:
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            json_text = response_text[json_start:json_end]
-            
-            parsed_data = json.loads(json_text)
-            categories = []
-            
-            task_duration_map = {task.task_name: task.duration_ms for task in original_tasks}
-            
-            for cat_data in parsed_data.get("categories", []):
-                total_duration = 0
-                for task_name_with_duration in cat_data.get("tasks", []):
-                    # Extract task name from "task_name (duration_ms)" format
-                    if " (" in task_name_with_duration:
-                        clean_task_name = task_name_with_duration.split(" (")[0]
-                    else:
-                        clean_task_name = task_name_with_duration
-                    
-                    total_duration += task_duration_map.get(clean_task_name, 0)
-                
-                categories.append(CategoryItem(
-                    category=cat_data["category"],
-                    subcategory=cat_data["subcategory"],
-                    total_duration_ms=total_duration
-                ))
-            
-            return SummaryResponse(categories=categories)
-            
-        except (json.JSONDecodeError, KeyError) as e:
-            return self._mock_categorize_tasks(original_tasks, [])
-    
-    def _mock_categorize_tasks(self, tasks: List[TaskItem], projects: List[str]) -> SummaryResponse:
-        categories = []
-        
-        for task in tasks:
-            # プロジェクト（カテゴリ）の決定
-            task_lower = task.task_name.lower()
-            category = "その他"  # デフォルト
-            
-            # プロジェクト名がタスク名に含まれているかチェック
-            for project in projects:
-                if project.lower() in task_lower:
-                    category = project
-                    break
-            
-            # 作業種類（サブカテゴリ）の決定
-            if any(keyword in task_lower for keyword in ['開発', 'コード', '実装', 'プログラム']):
-                subcategory = "開発"
-            elif any(keyword in task_lower for keyword in ['テスト', 'test', 'デバッグ']):
-                subcategory = "テスト"
-            elif any(keyword in task_lower for keyword in ['会議', 'ミーティング', '打ち合わせ']):
-                subcategory = "会議"
-            elif any(keyword in task_lower for keyword in ['学習', '勉強', '調査', '研究']):
-                subcategory = "学習"
-            elif any(keyword in task_lower for keyword in ['設計', 'design', '仕様']):
-                subcategory = "設計"
-            elif any(keyword in task_lower for keyword in ['ドキュメント', '資料', '文書']):
-                subcategory = "ドキュメント作成"
-            else:
-                subcategory = "一般作業"
-            
-            existing_category = next(
-                (cat for cat in categories if cat.category == category and cat.subcategory == subcategory),
-                None
-            )
-            
-            if existing_category:
-                existing_category.total_duration_ms += task.duration_ms
-            else:
-                categories.append(CategoryItem(
-                    category=category,
-                    subcategory=subcategory,
-                    total_duration_ms=task.duration_ms
-                ))
-        
-        return SummaryResponse(categories=categories)
\ No newline at end of file
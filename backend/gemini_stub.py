@@ -0,0 +1,135 @@
+"""Gemini API（generateContent / streamGenerateContent）の代わりに動かす、障害を注入できるローカルのスタブサーバー。
+    
+    uv run python gemini_stub.py --port 9000 --failure-rate 0.3 --failure-status 503 --retry-after 1
+    uv run python gemini_stub.py --port 9000 --piece-size 16 --piece-delay 0.05
+
+GEMINI_API_BASE=http://127.0.0.1:9000/v1beta を指定して API サーバーを起動すると、再試行・サーキットブレーカー・
+期限の動きを確かめられる。分類はローカルの規則（キーワード）で行う。
+streamGenerateContent は生成されたテキストを piece_size 文字ずつ、piece_delay 秒おきに SSE で返す。
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import List, Optional, Sequence
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from classification_cache import normalize_task_name
+from rule_classifier import RuleClassifier
+
+
+def prompt_task_names(prompt: str) -> List[str]:
+    # プロンプトの作業リスト（"- 作業名" の行）から作業名を取り出す
+    return [line[2:] for line in prompt.splitlines() if line.startswith("- ")]
+
+
+def create_stub_app(
+    failure_rate: float = 0.0,
+    failure_status: int = 503,
+    retry_after: Optional[float] = None,
+    latency: float = 0.0,
+    malformed_rate: float = 0.0,
+    script: Sequence[str] = (),
+    seed: Optional[int] = None,
+    piece_size: int = 32,
+    piece_delay: float = 0.0
+) -> FastAPI:
+    """script に "ok" / "malformed" / ステータスコード を並べると、最初のリクエストから順にその応答を返す。
+    使い切った後は failure_rate・malformed_rate の確率で障害を起こす。"""
+    app = FastAPI()
+    app.state.requests = 0
+    rules = RuleClassifier()
+    randomness = random.Random(seed)
+    pending = list(script)
+    
+    def next_fault() -> str:
+        if pending:
+            return pending.pop(0)
+        draw = randomness.random()
+        if draw < failure_rate:
+            return str(failure_status)
+        if draw < failure_rate + malformed_rate:
+            return "malformed"
+        return "ok"
+    
+    async def reply(request: Request):
+        # 障害を起こすならそのレスポンスを、そうでなければ生成したテキストを返す
+        app.state.requests += 1
+        fault = next_fault()
+        if latency:
+            await asyncio.sleep(latency)
+        if fault not in ("ok", "malformed"):
+            headers = {"Retry-After": f"{retry_after:g}"} if retry_after is not None else {}
+            return JSONResponse({"error": {"code": int(fault), "message": "injected fault"}}, int(fault), headers), None
+        
+        body = await request.json()
+        prompt = body["contents"][0]["parts"][0]["text"]
+        categories = {}
+        for name in prompt_task_names(prompt):
+            category, subcategory, _ = rules.classify(normalize_task_name(name), [])
+            categories.setdefault((category, subcategory), []).append(name)
+        text = json.dumps({"categories": [
+            {"category": category, "subcategory": subcategory, "tasks": names}
+            for (category, subcategory), names in categories.items()
+        ]}, ensure_ascii=False)
+        if fault == "malformed":
+            # maxOutputTokens で途切れた応答を再現する
+            text = text[:len(text) // 2]
+        return None, text
+    
+    def candidate(text: str) -> dict:
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+    
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        error, text = await reply(request)
+        if error is not None:
+            return error
+        # ストリーミングと同じ生成時間をかけてから、全体をまとめて返す
+        if piece_delay:
+            await asyncio.sleep(piece_delay * ((len(text) - 1) // piece_size))
+        return candidate(text)
+    
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def stream_generate_content(model: str, request: Request):
+        error, text = await reply(request)
+        if error is not None:
+            return error
+        
+        async def events():
+            for start in range(0, len(text), piece_size):
+                if piece_delay and start:
+                    await asyncio.sleep(piece_delay)
+                yield f"data: {json.dumps(candidate(text[start:start + piece_size]), ensure_ascii=False)}\r\n\r\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    return app
+
+
+def main():
+    import uvicorn
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--script", nargs="*", default=[])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--piece-size", type=int, default=32)
+    parser.add_argument("--piece-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    
+    app = create_stub_app(
+        args.failure_rate, args.failure_status, args.retry_after, args.latency,
+        args.malformed_rate, args.script, args.seed, args.piece_size, args.piece_delay
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class IdempotentResponse:
+    __slots__ = ("fingerprint", "status_code", "body", "headers", "expires_at")
+    
+    def __init__(self, fingerprint: str, status_code: int, body: Any, headers: Dict[str, str], expires_at: float):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+        self.expires_at = expires_at
+
+
+class IdempotencyCache:
+    """Idempotency-Key ごとに直近のレスポンスを保持する、件数上限付きの TTL キャッシュ。
+    
+    キーはユーザーごとに分ける。全エントリの TTL が同じなので挿入順に期限が切れ、
+    先頭から期限切れを取り除くだけで済む。同じキーで内容の異なるリクエストが来たら ValueError を送出する。
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], IdempotentResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, user_id: str, key: str, fingerprint: str) -> Optional[IdempotentResponse]:
+        with self._lock:
+            self._expire()
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None
+            if entry.fingerprint != fingerprint:
+                raise ValueError("Idempotency key reused with a different request")
+            return entry
+    
+    def put(
+        self,
+        user_id: str,
+        key: str,
+        fingerprint: str,
+        status_code: int,
+        body: Any,
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        with self._lock:
+            self._entries.pop((user_id, key), None)
+            self._entries[(user_id, key)] = IdempotentResponse(
+                fingerprint, status_code, body, dict(headers or {}), self._clock() + self.ttl_seconds
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _expire(self) -> None:
+        now = self._clock()
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+
+class SqliteIdempotencyCache:
+    """共有の SQLite セッションストアに保存する Idempotency-Key のキャッシュ（複数ワーカー構成用）。
+    
+    再送が最初のリクエストと別のワーカーに届いても前回のレスポンスを返せるよう、セッションストアと同じ接続・
+    同じトランザクションで読み書きする。期限はプロセス間で比べられるよう壁時計で持ち、
+    PRUNE_INTERVAL 回の保存ごとに期限切れと上限を超えた古いものを消す。
+    """
+    
+    PRUNE_INTERVAL = 1000
+    
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        lock: threading.RLock,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn = connection
+        self._lock = lock
+        self._clock = clock
+        self._writes_since_prune = 0
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                "user_id TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, status_code INTEGER NOT NULL, "
+                "body TEXT NOT NULL, headers TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (user_id, key))"
+            )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0]
+    
+    def get(self, user_id: str, key: str, fingerprint: str) -> Optional[IdempotentResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, status_code, body, headers, expires_at FROM idempotency_keys "
+                "WHERE user_id = ? AND key = ? AND expires_at > ?",
+                (user_id, key, self._clock())
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] != fingerprint:
+            raise ValueError("Idempotency key reused with a different request")
+        return IdempotentResponse(row[0], row[1], json.loads(row[2]), json.loads(row[3]), row[4])
+    
+    def put(
+        self,
+        user_id: str,
+        key: str,
+        fingerprint: str,
+        status_code: int,
+        body: Any,
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        with self._lock:
+            now = self._clock()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys "
+                "(user_id, key, fingerprint, status_code, body, headers, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, key, fingerprint, status_code, json.dumps(body), json.dumps(dict(headers or {})), now + self.ttl_seconds)
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= self.PRUNE_INTERVAL:
+                self._writes_since_prune = 0
+                self._conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "DELETE FROM idempotency_keys WHERE rowid IN ("
+                    "SELECT rowid FROM idempotency_keys ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
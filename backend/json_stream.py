@@ -0,0 +1,45 @@
+import json
+from typing import Any, List, Optional
+
+
+class JsonArrayItemParser:
+    """JSON テキストを少しずつ受け取り、最初に現れる配列の要素（オブジェクト）を閉じた時点で 1 つずつ取り出す。
+    
+    {"categories": [{...}, {...}]} のような応答を生成途中から読み、完成した要素だけを返す。
+    途中で途切れた場合も、それまでに閉じた要素は取り出せる。文字列の中の括弧は数えない。
+    """
+    
+    def __init__(self):
+        self._depth = 0
+        self._array_depth: Optional[int] = None
+        self._in_string = False
+        self._escaped = False
+        self._item: Optional[List[str]] = None
+    
+    def feed(self, text: str) -> List[Any]:
+        items = []
+        for char in text:
+            if self._item is not None:
+                self._item.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if char == "{" and self._depth == self._array_depth and self._item is None:
+                    self._item = [char]
+                self._depth += 1
+                if char == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+            elif char in "]}":
+                self._depth -= 1
+                if self._item is not None and self._depth == self._array_depth:
+                    items.append(json.loads("".join(self._item)))
+                    self._item = None
+        return items
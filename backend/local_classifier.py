@@ -0,0 +1,143 @@
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from classification_cache import Classification, normalize_task_name
+
+
+# (カテゴリ, 小項目, 確信度)。確信度が閾値以上なら Gemini に問い合わせずにこの分類を使う
+LocalPrediction = Tuple[str, str, float]
+
+# プロジェクト一覧に関係なく使えるカテゴリ（Gemini の応答で、どのプロジェクトにも当てはまらない作業）
+DEFAULT_CATEGORY = "その他"
+
+
+def hash_ngrams(normalized_name: str, dims: int, sizes: Sequence[int] = (1, 2, 3)) -> Tuple[np.ndarray, np.ndarray]:
+    # 文字 n-gram を dims 次元にハッシュし、L2 正規化した (次元の添字, 重み) を返す。
+    # 2 文字以上の n-gram は先頭・末尾が分かるよう前後に境界の記号を付けて作る（1 文字の境界記号はどの作業名にも
+    # 現れて似ていない作業名どうしの類似度を底上げするので含めない）。組み込みの hash はプロセスごとに値が変わるので crc32 を使う
+    padded = f"\x02{normalized_name}\x03"
+    counts: Dict[int, int] = {}
+    for size in sizes:
+        text = padded if size > 1 else normalized_name
+        for start in range(len(text) - size + 1):
+            index = zlib.crc32(text[start:start + size].encode("utf-8")) % dims
+            counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    return indices, weights / np.linalg.norm(weights)
+
+
+class LocalClassifier:
+    """Gemini の分類結果から学習し、似た作業名を手元で分類する最近傍重心分類器。
+    
+    作業名を文字 n-gram のハッシュ特徴量にし、分類結果（カテゴリ, 小項目）ごとに特徴量の和を持つ。
+    予測では各分類の重心とのコサイン類似度を比べ、最も近いものと 2 番目との差を確信度とする。
+    候補が 1 つしかなければ比べる相手がないので予測しない。どの分類にも似ていない作業名は類似度がどれも小さく、差も小さくなる。
+    学習は作業名を追加するだけなので、応答を受け取るたびに行える。
+    同じ作業名が別の分類で追加されたら新しい方に付け替える。
+    候補にするのは、例が min_examples 件以上あり、カテゴリが今回のプロジェクト一覧か「その他」の分類だけ。
+    """
+    
+    PREDICT_BATCH = 256
+    
+    def __init__(self, dims: int = 4096, min_examples: int = 3):
+        self.dims = dims
+        self.min_examples = min_examples
+        self._lock = threading.Lock()
+        self._labels: List[Classification] = []
+        self._label_index: Dict[Classification, int] = {}
+        self._label_categories: List[str] = []
+        self._sums = np.zeros((0, dims))
+        self._counts = np.zeros(0, dtype=np.int64)
+        # 作業名 → 分類の番号。同じ作業名を二重に数えないために使う
+        self._examples: Dict[str, int] = {}
+        # 正規化した重心を転置したもの（dims × 分類数）。追加があったら作り直す
+        self._centroids: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self._examples)
+    
+    def add(self, normalized_name: str, classification: Classification) -> None:
+        self.add_many({normalized_name: classification})
+    
+    def add_many(self, examples: Dict[str, Classification]) -> None:
+        with self._lock:
+            for name, classification in examples.items():
+                label = self._label(tuple(classification))
+                previous = self._examples.get(name)
+                if previous == label:
+                    continue
+                indices, weights = hash_ngrams(name, self.dims)
+                if previous is not None:
+                    np.subtract.at(self._sums[previous], indices, weights)
+                    self._counts[previous] -= 1
+                np.add.at(self._sums[label], indices, weights)
+                self._counts[label] += 1
+                self._examples[name] = label
+                self._centroids = None
+    
+    def predict_many(self, normalized_names: Sequence[str], projects: Sequence[str]) -> List[Optional[LocalPrediction]]:
+        # 候補になる分類が 2 つ未満なら None
+        if not normalized_names:
+            return []
+        with self._lock:
+            allowed = {normalize_task_name(project) for project in projects} | {normalize_task_name(DEFAULT_CATEGORY)}
+            candidates = np.array([
+                label for label, category in enumerate(self._label_categories)
+                if self._counts[label] >= self.min_examples and category in allowed
+            ], dtype=np.int64)
+            if len(candidates) < 2:
+                return [None] * len(normalized_names)
+            centroids = self._centroid_matrix()[:, candidates]
+            labels = [self._labels[label] for label in candidates]
+        
+        # 作業名の特徴量を PREDICT_BATCH 件ずつ密な行列に並べ、重心との積で類似度の行列（作業名数 × 候補数）を作る
+        scores = np.empty((len(normalized_names), len(candidates)))
+        for start in range(0, len(normalized_names), self.PREDICT_BATCH):
+            batch = normalized_names[start:start + self.PREDICT_BATCH]
+            features = np.zeros((len(batch), self.dims))
+            for row, name in enumerate(batch):
+                indices, weights = hash_ngrams(name, self.dims)
+                features[row, indices] = weights
+            scores[start:start + len(batch)] = features @ centroids
+        
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), best] - np.partition(scores, -2, axis=1)[:, -2]
+        return [
+            (*labels[label], float(value))
+            for label, value in zip(best.tolist(), confidence.tolist())
+        ]
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "examples": len(self._examples),
+                "labels": int((self._counts > 0).sum()),
+                "dims": self.dims,
+            }
+    
+    def _label(self, classification: Classification) -> int:
+        label = self._label_index.get(classification)
+        if label is None:
+            label = len(self._labels)
+            self._labels.append(classification)
+            self._label_index[classification] = label
+            self._label_categories.append(normalize_task_name(classification[0]))
+            self._sums = np.vstack([self._sums, np.zeros((1, self.dims))])
+            self._counts = np.append(self._counts, 0)
+        return label
+    
+    def _centroid_matrix(self) -> np.ndarray:
+        if self._centroids is None:
+            norms = np.linalg.norm(self._sums, axis=1, keepdims=True)
+            self._centroids = (self._sums / np.where(norms > 0, norms, 1.0)).T.copy()
+        return self._centroids
+
+
+def create_local_classifier() -> LocalClassifier:
+    return LocalClassifier(
+        dims=int(os.getenv("LOCAL_CLASSIFIER_DIMS", "4096")),
+        min_examples=int(os.getenv("LOCAL_CLASSIFIER_MIN_EXAMPLES", "3"))
+    )
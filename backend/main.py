@@ -1,19 +1,71 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import PlainTextResponse
-from typing import Optional
-from models import SessionCreate, SessionResponse, SummaryRequest, SummaryResponse, CategoryItem
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Any, Callable, Optional
+from models import DEFAULT_USER_ID, Session, SessionCreate, SessionImportError, SessionImportResponse, SessionStoreStatsResponse, BatchRequest, BatchResponse, BatchOperationResult, BatchOperationType, SessionResponse, SessionListResponse, SessionStatus, SessionTotalsResponse, TimelineBucket, TimelineResponse, SummaryRequest, SessionSummaryRequest, SummaryResponse, CategoryItem, ClassificationCacheStatsResponse, GeminiUpstreamStatsResponse, LocalClassifierStatsResponse
 from session_service import SessionService
-from gemini_service import GeminiService
+from session_index import ensure_utc
+from session_store import create_session_store
+from session_events import SessionEventHub
+from session_retention import create_retention_policy, run_compaction
+from session_timers import create_session_auto_pauser
+from gemini_service import GeminiService, create_gemini_http_client
+from classification_cache import create_classification_cache
+from gemini_resilience import create_circuit_breaker, create_retry_policy
+from rule_classifier import create_rule_classifier
+from local_classifier import create_local_classifier
 from markdown_service import MarkdownService
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _session_auto_pauser_instance, _gemini_http_client
+    # Gemini API への接続はアプリ全体で 1 つのクライアントのプールを使い回す
+    _gemini_http_client = create_gemini_http_client()
+    reset_gemini_service()
+    # 永続化した分類キャッシュは起動時に読み込んでおき、最初の要約から使えるようにする
+    get_gemini_service()
+    
+    background_tasks = []
+    # 保持ポリシーが設定されていれば、停止済みセッションの整理をバックグラウンドで続ける
+    policy = create_retention_policy()
+    if policy.enabled:
+        interval = float(os.getenv("SESSION_COMPACTION_INTERVAL", "60"))
+        background_tasks.append(asyncio.create_task(run_compaction(get_session_service, policy, interval)))
+    service = get_session_service()
+    if service.shared:
+        interval = float(os.getenv("SESSION_SYNC_INTERVAL", "0.5"))
+        background_tasks.append(asyncio.create_task(run_session_sync(interval)))
+    # 放置されたセッションの自動一時停止・停止。全セッションのタイマーを 1 つのタスクで処理する
+    auto_pauser = create_session_auto_pauser(service)
+    if auto_pauser.enabled:
+        _session_auto_pauser_instance = auto_pauser
+        background_tasks.append(asyncio.create_task(auto_pauser.run()))
+    yield
+    _session_auto_pauser_instance = None
+    for task in background_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # 永続化ストアの未書き込みログを確実にディスクへ書き出す
+    reset_session_service()
+    await _gemini_http_client.aclose()
+    _gemini_http_client = None
+    reset_gemini_service()
+
 app = FastAPI(
     title="Task Tracker API",
     description="作業時間追跡とカテゴリ分類のためのAPI",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 _session_service_instance = None
@@ -21,25 +73,85 @@ _session_service_instance = None
 def get_session_service():
     global _session_service_instance
     if _session_service_instance is None:
-        _session_service_instance = SessionService()
+        # 日別の集計は SESSION_DAY_UTC_OFFSET_HOURS の時差のタイムゾーンで日を区切る（日本時間なら 9、未指定なら UTC）
+        day_offset = timedelta(hours=float(os.getenv("SESSION_DAY_UTC_OFFSET_HOURS", "0")))
+        _session_service_instance = SessionService(create_session_store(), day_timezone=timezone(day_offset))
+        _session_service_instance.add_listener(get_session_event_hub().publish)
+    # 複数ワーカー構成では、他のワーカーが書き込んだ変更をリクエストごとに取り込む
+    _session_service_instance.sync()
     return _session_service_instance
 
+async def run_session_sync(interval_seconds: float) -> None:
+    # リクエストが来なくても他のワーカーの変更を取り込み、SSE の購読者へ届ける
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await asyncio.to_thread(get_session_service().sync)
+
 def reset_session_service():
-    global _session_service_instance
+    global _session_service_instance, _idempotency_cache_instance
+    if _session_service_instance is not None:
+        _session_service_instance.close()
     _session_service_instance = None
+    # キャッシュ済みのレスポンスは破棄したサービスのセッションを指すので一緒に捨てる
+    _idempotency_cache_instance = None
+
+_idempotency_cache_instance = None
+
+def get_idempotency_cache(service: SessionService):
+    global _idempotency_cache_instance
+    if _idempotency_cache_instance is None:
+        # 共有ストアでは全ワーカーから見えるテーブルに保存し、再送が別のワーカーに届いても前回のレスポンスを返す
+        _idempotency_cache_instance = service.idempotency_cache(
+            max_entries=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+        )
+    return _idempotency_cache_instance
+
+_session_auto_pauser_instance = None
+
+_session_event_hub_instance = None
+
+def get_session_event_hub():
+    global _session_event_hub_instance
+    if _session_event_hub_instance is None:
+        _session_event_hub_instance = SessionEventHub()
+    return _session_event_hub_instance
 
 _gemini_service_instance = None
+_gemini_http_client = None
 
 def get_gemini_service():
     global _gemini_service_instance
     if _gemini_service_instance is None:
         api_key = os.getenv("GEMINI_API_KEY")
         model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-        _gemini_service_instance = GeminiService(api_key, model_name)
+        api_base = os.getenv("GEMINI_API_BASE")
+        cache = create_classification_cache()
+        # キーワード規則の確信度がこの値以上の作業名は Gemini に問い合わせない（none で無効）
+        threshold = os.getenv("RULE_CONFIDENCE_THRESHOLD", "1.0")
+        rule_confidence = None if threshold.lower() == "none" else float(threshold)
+        # Gemini の分類結果から学習した分類器の確信度がこの値以上なら問い合わせない（既定の none は学習のみ）
+        local_threshold = os.getenv("LOCAL_CLASSIFIER_CONFIDENCE", "none")
+        local_confidence = None if local_threshold.lower() == "none" else float(local_threshold)
+        _gemini_service_instance = GeminiService(
+            api_key, model_name, _gemini_http_client, api_base, cache,
+            chunk_tokens=int(os.getenv("GEMINI_CHUNK_TOKENS", "1024")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+            retry_policy=create_retry_policy(),
+            breaker=create_circuit_breaker(),
+            deadline_seconds=float(os.getenv("GEMINI_DEADLINE_SECONDS", "20")),
+            streaming=os.getenv("GEMINI_STREAMING", "true").lower() != "false",
+            rules=create_rule_classifier(),
+            rule_confidence=rule_confidence,
+            learner=create_local_classifier(),
+            local_confidence=local_confidence
+        )
     return _gemini_service_instance
 
 def reset_gemini_service():
     global _gemini_service_instance
+    if _gemini_service_instance is not None:
+        _gemini_service_instance.cache.close()
     _gemini_service_instance = None
 
 _markdown_service_instance = None
@@ -54,6 +166,68 @@ def reset_markdown_service():
     global _markdown_service_instance
     _markdown_service_instance = None
 
+def get_user_id(x_user_id: Optional[str] = Header(None)) -> str:
+    # X-User-Id ヘッダーでユーザー（テナント）ごとにセッションを分離する
+    if x_user_id is None or not x_user_id.strip():
+        return DEFAULT_USER_ID
+    return x_user_id.strip()
+
+def get_expected_version(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    # If-Match: "<version>" で楽観的排他制御を行う（"*" または未指定なら無条件）
+    if if_match is None or if_match.strip() == "*":
+        return None
+    etag = if_match.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    try:
+        return int(etag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=412, detail="Precondition failed: invalid If-Match")
+
+def set_session_etag(response: Response, session) -> None:
+    response.headers["ETag"] = f'"{session.version}"'
+
+def get_idempotency_key(idempotency_key: Optional[str] = Header(None)) -> Optional[str]:
+    if idempotency_key is None or not idempotency_key.strip():
+        return None
+    return idempotency_key.strip()
+
+async def run_session_write(service: SessionService, write: Callable[[], Any]) -> Any:
+    # 共有ストアへの書き込みは flock と BEGIN IMMEDIATE で他のワーカーの書き込みを待つことがあるので、
+    # イベントループを止めないようスレッドで実行する。プロセス内だけのストアではそのまま呼ぶ
+    if service.shared:
+        return await asyncio.to_thread(write)
+    return write()
+
+def idempotent_session_write(
+    service: SessionService,
+    response: Response,
+    user_id: str,
+    key: Optional[str],
+    fingerprint: str,
+    write: Callable[[], Any],
+    status_code: int = 200
+):
+    # 同じ Idempotency-Key の再送には、write を呼ばずに前回のレスポンスを返す。照会から保存までを 1 つの書き込みとして
+    # 直列化するので、再送が別のワーカーに同時に届いても二重に実行しない（単一プロセスでは await を挟まないので並行しない）。
+    # キーを別の内容のリクエストに使い回すと ValueError
+    with service.transaction():
+        if key is not None:
+            cached = get_idempotency_cache(service).get(user_id, key, fingerprint)
+            if cached is not None:
+                return JSONResponse(
+                    cached.body, status_code=cached.status_code, headers={**cached.headers, "Idempotent-Replayed": "true"}
+                )
+        session = write()
+        set_session_etag(response, session)
+        result = SessionResponse.from_session(session)
+        if key is not None:
+            # セッションはこの後も更新されるので、この時点の内容をシリアライズして保存する
+            get_idempotency_cache(service).put(
+                user_id, key, fingerprint, status_code, result.model_dump(mode="json"), {"ETag": response.headers["ETag"]}
+            )
+        return result
+
 @app.get("/")
 async def read_root():
     return {"message": "Task Tracker API"}
@@ -65,31 +239,258 @@ async def health_check():
 @app.post("/sessions/start", response_model=SessionResponse, status_code=201)
 async def start_session(
     session_data: SessionCreate,
-    service: SessionService = Depends(get_session_service)
+    response: Response,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key)
 ):
-    session = service.start_session(session_data)
-    return SessionResponse.from_session(session)
+    fingerprint = f"POST /sessions/start {session_data.model_dump_json()}"
+    try:
+        return await run_session_write(service, lambda: idempotent_session_write(
+            service, response, user_id, idempotency_key, fingerprint,
+            lambda: service.start_session(session_data, user_id), status_code=201
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=422 if "Idempotency key" in str(e) else 400, detail=str(e))
+
+@app.get("/sessions", response_model=SessionListResponse)
+async def list_sessions(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[SessionStatus] = None,
+    task_name: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    try:
+        sessions, next_cursor = service.list_sessions(
+            user_id, start=start, end=end, status=status, task_name=task_name, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SessionListResponse(
+        items=[SessionResponse.from_session(session) for session in sessions],
+        next_cursor=next_cursor
+    )
+
+TIMELINE_BUCKET_SIZES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+MAX_TIMELINE_BUCKETS = 1000
+
+@app.get("/sessions/timeline", response_model=TimelineResponse)
+async def get_session_timeline(
+    start: datetime,
+    end: datetime,
+    bucket: Optional[str] = Query(None, pattern="^(hour|day)$"),
+    task_name: Optional[str] = None,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    # タイムゾーンのない時刻は UTC とみなす（片方だけ指定されていても比べられるようにする）
+    start, end = ensure_utc(start), ensure_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    
+    buckets = []
+    if bucket is not None:
+        bucket_size = TIMELINE_BUCKET_SIZES[bucket]
+        if (end - start) / bucket_size > MAX_TIMELINE_BUCKETS:
+            raise HTTPException(status_code=400, detail="Too many buckets")
+        buckets = [
+            TimelineBucket(start=bucket_start, duration_ms=duration_ms)
+            for bucket_start, duration_ms in service.get_worked_duration_buckets(
+                start, end, bucket_size, user_id, task_name
+            )
+        ]
+    
+    return TimelineResponse(
+        start=start,
+        end=end,
+        total_duration_ms=service.get_worked_duration(start, end, user_id, task_name),
+        buckets=buckets
+    )
+
+@app.get("/sessions/totals", response_model=SessionTotalsResponse)
+async def get_session_totals(
+    day: Optional[date] = None,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    # day と by_day の日付は SESSION_DAY_UTC_OFFSET_HOURS の時差で区切った日（未指定なら UTC の日付）
+    # day を指定すると by_task・by_day・by_day_task のどれもその日の分だけになる
+    totals = service.get_totals(user_id, day)
+    return SessionTotalsResponse(
+        by_task=totals.by_task,
+        by_day=totals.by_day,
+        by_day_task=totals.by_day_task
+    )
+
+@app.get("/sessions/stats", response_model=SessionStoreStatsResponse)
+async def get_session_store_stats(service: SessionService = Depends(get_session_service)):
+    return SessionStoreStatsResponse(**service.get_store_stats())
+
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
+
+@app.get("/sessions/export")
+async def export_sessions(
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    # 1行1セッションの NDJSON を逐次生成して返す（全件をメモリに載せない）
+    def generate():
+        for session in service.iter_sessions(user_id):
+            yield session.model_dump_json() + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+async def iter_ndjson_batches(request: Request, batch_size: int):
+    # リクエストボディを読みながら (行番号, 行) のバッチに区切る
+    buffer = b""
+    batch = []
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                batch.append((line_number, line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if buffer.strip():
+        batch.append((line_number + 1, buffer))
+    if batch:
+        yield batch
+
+@app.post("/sessions/import", response_model=SessionImportResponse)
+async def import_sessions(
+    request: Request,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    imported = 0
+    failed = 0
+    errors = []
+    
+    def import_batch(batch) -> None:
+        nonlocal imported, failed
+        for line_number, line in batch:
+            try:
+                session = Session.model_validate_json(line)
+                # 取り込めるのは X-User-Id のユーザー自身のセッションだけ
+                if session.user_id != user_id:
+                    raise ValueError("Session belongs to another user")
+                service.import_session(session)
+                imported += 1
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append(SessionImportError(line=line_number, error=str(e)))
+    
+    async for batch in iter_ndjson_batches(request, IMPORT_BATCH_SIZE):
+        # バッチ単位で検証し、有効な行だけを取り込む
+        await run_session_write(service, lambda: import_batch(batch))
+    
+    return SessionImportResponse(imported=imported, failed=failed, errors=errors)
+
+def session_error_status(error: ValueError) -> int:
+    if "Session not found" in str(error):
+        return 404
+    elif "Session version mismatch" in str(error):
+        return 412
+    elif "Batch aborted" in str(error):
+        # アトミックなバッチで別の操作が失敗したため適用しなかった
+        return 424
+    return 400
+
+@app.post("/sessions/batch", response_model=BatchResponse)
+async def apply_session_batch(
+    request: BatchRequest,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    # 再接続時にまとめて送られた操作を 1 回のリクエストで順番に適用する
+    results = []
+    applied = await run_session_write(service, lambda: service.apply_batch(request.operations, user_id, request.atomic))
+    for operation, result in zip(request.operations, applied):
+        if isinstance(result, ValueError):
+            results.append(BatchOperationResult(status_code=session_error_status(result), error=str(result)))
+        else:
+            results.append(BatchOperationResult(
+                status_code=201 if operation.op == BatchOperationType.START else 200,
+                session=SessionResponse.from_session(result)
+            ))
+    return BatchResponse(results=results)
+
+SSE_HEARTBEAT_SECONDS = 15.0
+
+@app.get("/sessions/events")
+async def stream_session_events(
+    service: SessionService = Depends(get_session_service),
+    hub: SessionEventHub = Depends(get_session_event_hub),
+    user_id: str = Depends(get_user_id)
+):
+    # Server-Sent Events で状態変化だけを配信する。クライアントは server_time と
+    # elapsed_seconds を基準に手元で経過時間を進めればよく、毎秒のポーリングが不要になる
+    queue = hub.subscribe(user_id)
+    
+    async def stream():
+        try:
+            snapshot = hub.encode("snapshot", service.get_active_session(user_id))
+            yield f"event: snapshot\ndata: {snapshot}\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: session\ndata: {payload}\n\n"
+        finally:
+            hub.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/sessions/active", response_model=Optional[SessionResponse])
 async def get_active_session(
-    service: SessionService = Depends(get_session_service)
+    response: Response,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
 ):
-    session = service.get_active_session()
+    session = service.get_active_session(user_id)
     if session is None:
         return None
+    set_session_etag(response, session)
     return SessionResponse.from_session(session)
 
 @app.patch("/sessions/{session_id}/pause", response_model=SessionResponse)
 async def pause_session(
     session_id: str,
-    service: SessionService = Depends(get_session_service)
+    response: Response,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id),
+    expected_version: Optional[int] = Depends(get_expected_version),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key)
 ):
+    fingerprint = f"PATCH /sessions/{session_id}/pause {expected_version}"
     try:
-        session = service.pause_session(session_id)
-        return SessionResponse.from_session(session)
+        return await run_session_write(service, lambda: idempotent_session_write(
+            service, response, user_id, idempotency_key, fingerprint,
+            lambda: service.pause_session(session_id, user_id, expected_version)
+        ))
     except ValueError as e:
-        if "Session not found" in str(e):
+        if "Idempotency key" in str(e):
+            raise HTTPException(status_code=422, detail=str(e))
+        elif "Session not found" in str(e):
             raise HTTPException(status_code=404, detail="Session not found")
+        elif "Session version mismatch" in str(e):
+            raise HTTPException(status_code=412, detail="Precondition failed: session has been modified")
         elif "Cannot pause a stopped session" in str(e):
             raise HTTPException(status_code=400, detail="Cannot pause a stopped session")
         else:
@@ -98,17 +499,45 @@ async def pause_session(
 @app.post("/sessions/{session_id}/stop", response_model=SessionResponse)
 async def stop_session(
     session_id: str,
-    service: SessionService = Depends(get_session_service)
+    response: Response,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id),
+    expected_version: Optional[int] = Depends(get_expected_version),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key)
 ):
+    fingerprint = f"POST /sessions/{session_id}/stop {expected_version}"
     try:
-        session = service.stop_session(session_id)
-        return SessionResponse.from_session(session)
+        return await run_session_write(service, lambda: idempotent_session_write(
+            service, response, user_id, idempotency_key, fingerprint,
+            lambda: service.stop_session(session_id, user_id, expected_version)
+        ))
     except ValueError as e:
-        if "Session not found" in str(e):
+        if "Idempotency key" in str(e):
+            raise HTTPException(status_code=422, detail=str(e))
+        elif "Session not found" in str(e):
             raise HTTPException(status_code=404, detail="Session not found")
+        elif "Session version mismatch" in str(e):
+            raise HTTPException(status_code=412, detail="Precondition failed: session has been modified")
         else:
             raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/sessions/{session_id}/heartbeat", status_code=204)
+async def heartbeat_session(
+    session_id: str,
+    service: SessionService = Depends(get_session_service),
+    user_id: str = Depends(get_user_id)
+):
+    # 利用者が操作していることを伝え、アイドルによる自動一時停止を先に延ばす
+    try:
+        session = service.get_session(session_id, user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    auto_pauser = _session_auto_pauser_instance
+    if auto_pauser is not None:
+        # 最後の操作時刻を共有ストアに記録するので、どのワーカーのタイマーも延びる
+        await run_session_write(service, lambda: auto_pauser.touch(session))
+    return Response(status_code=204)
+
 @app.post("/summary/generate", response_model=SummaryResponse)
 async def generate_summary(
     request: SummaryRequest,
@@ -120,6 +549,33 @@ async def generate_summary(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summary generation failed: {str(e)}")
 
+@app.post("/summary/generate/stream")
+async def stream_summary(
+    request: SummaryRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service)
+):
+    # 分類できたカテゴリから順に Server-Sent Events で返す。category イベントはその時点の合計で、
+    # 同じ（カテゴリ, 小項目）が合計を増やして再送されるので、クライアントは最後の値で置き換える。
+    # 最後に done イベントで /summary/generate と同じ形の集計全体を返す
+    async def stream():
+        latest = {}
+        try:
+            async for item in gemini_service.stream_categories(request.sessions, request.projects):
+                latest[(item.category, item.subcategory)] = item
+                yield f"event: category\ndata: {item.model_dump_json()}\n\n"
+        except Exception as e:
+            error = json.dumps({"detail": f"Summary generation failed: {str(e)}"}, ensure_ascii=False)
+            yield f"event: error\ndata: {error}\n\n"
+            return
+        summary = SummaryResponse(categories=list(latest.values()))
+        yield f"event: done\ndata: {summary.model_dump_json()}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/summary/markdown", response_class=PlainTextResponse)
 async def generate_markdown_from_summary(
     request: SummaryRequest,
@@ -137,6 +593,55 @@ async def generate_markdown_from_summary(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Markdown generation failed: {str(e)}")
 
+def build_session_task_items(request: SessionSummaryRequest, service: SessionService, user_id: str):
+    try:
+        return service.build_task_items(user_id, request.start, request.end, request.session_ids)
+    except ValueError as e:
+        if "Session not found" in str(e):
+            raise HTTPException(status_code=404, detail="Session not found")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/summary/sessions", response_model=SummaryResponse)
+async def generate_summary_from_sessions(
+    request: SessionSummaryRequest,
+    service: SessionService = Depends(get_session_service),
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    user_id: str = Depends(get_user_id)
+):
+    # サーバーが保持するセッションから作業一覧を組み立てて分類する
+    tasks = build_session_task_items(request, service, user_id)
+    try:
+        return await gemini_service.categorize_tasks(tasks, request.projects)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Summary generation failed: {str(e)}")
+
+@app.post("/summary/sessions/markdown", response_class=PlainTextResponse)
+async def generate_markdown_from_sessions(
+    request: SessionSummaryRequest,
+    service: SessionService = Depends(get_session_service),
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    markdown_service: MarkdownService = Depends(get_markdown_service),
+    user_id: str = Depends(get_user_id)
+):
+    tasks = build_session_task_items(request, service, user_id)
+    try:
+        summary = await gemini_service.categorize_tasks(tasks, request.projects)
+        return markdown_service.generate_summary_markdown(summary.categories)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Markdown generation failed: {str(e)}")
+
+@app.get("/summary/cache/stats", response_model=ClassificationCacheStatsResponse)
+async def get_classification_cache_stats(gemini_service: GeminiService = Depends(get_gemini_service)):
+    return ClassificationCacheStatsResponse(**gemini_service.cache.stats())
+
+@app.get("/summary/upstream/stats", response_model=GeminiUpstreamStatsResponse)
+async def get_gemini_upstream_stats(gemini_service: GeminiService = Depends(get_gemini_service)):
+    return GeminiUpstreamStatsResponse(**gemini_service.upstream_stats())
+
+@app.get("/summary/local-model/stats", response_model=LocalClassifierStatsResponse)
+async def get_local_classifier_stats(gemini_service: GeminiService = Depends(get_gemini_service)):
+    return LocalClassifierStatsResponse(**gemini_service.local_stats())
+
 @app.get("/summary/markdown", response_class=PlainTextResponse)
 async def generate_markdown_from_categories(
     categories: str,
@@ -160,4 +665,6 @@ if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    # 複数ワーカーで動かすときは SESSION_STORE_DB を指定してワーカー間でセッションを共有する
+    workers = int(os.getenv("WORKERS", "1"))
+    uvicorn.run("main:app", host=host, port=port, workers=workers, http="uvicorn_protocol:NoDelayHTTPProtocol")
\ No newline at end of file
@@ -1,7 +1,10 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from enum import Enum
-from typing import Optional, List
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from typing import Dict, Optional, List
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
+
+
+DEFAULT_USER_ID = "default"
 
 
 class SessionStatus(str, Enum):
@@ -25,14 +28,23 @@ class SessionUpdate(BaseModel):
     status: Optional[SessionStatus] = None
 
 
+class SessionSegment(BaseModel):
+    start: datetime = Field(..., description="作業区間の開始時刻")
+    end: Optional[datetime] = Field(None, description="作業区間の終了時刻（作業中は None）")
+
+
 class Session(BaseModel):
     id: str = Field(..., description="セッションID")
+    user_id: str = Field(DEFAULT_USER_ID, description="ユーザーID")
     task_name: str = Field(..., description="作業名")
     status: SessionStatus = Field(..., description="セッションステータス")
     start_time: datetime = Field(..., description="開始時刻")
     pause_time: Optional[datetime] = Field(None, description="一時停止時刻")
     end_time: Optional[datetime] = Field(None, description="終了時刻")
     total_duration: int = Field(0, description="総経過時間（秒）")
+    version: int = Field(1, description="楽観的排他制御用のバージョン（更新のたびに増加）")
+    segments: List[SessionSegment] = Field(default_factory=list, description="実際に作業していた区間の一覧")
+    last_activity: Optional[datetime] = Field(None, description="最後のハートビートの時刻（アイドルによる自動一時停止の基準）")
     
     model_config = ConfigDict(
         json_encoders={datetime: lambda v: v.isoformat()}
@@ -47,6 +59,8 @@ class SessionResponse(BaseModel):
     pause_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     total_duration: int
+    version: int
+    segments: List[SessionSegment] = []
     elapsed_seconds: int = Field(..., description="現在の経過時間（秒）")
     
     @classmethod
@@ -67,6 +81,8 @@ class SessionResponse(BaseModel):
             pause_time=session.pause_time,
             end_time=session.end_time,
             total_duration=session.total_duration,
+            version=session.version,
+            segments=session.segments,
             elapsed_seconds=max(0, elapsed_seconds)
         )
     
@@ -75,6 +91,88 @@ class SessionResponse(BaseModel):
     )
 
 
+class SessionListResponse(BaseModel):
+    items: List[SessionResponse] = Field(..., description="セッション一覧（開始時刻の新しい順）")
+    next_cursor: Optional[str] = Field(None, description="次ページ取得用カーソル")
+
+
+class TimelineBucket(BaseModel):
+    start: datetime = Field(..., description="集計区間の開始時刻")
+    duration_ms: int = Field(..., description="区間内の作業時間（ミリ秒）")
+
+
+class TimelineResponse(BaseModel):
+    start: datetime
+    end: datetime
+    total_duration_ms: int = Field(..., description="期間内の作業時間（ミリ秒）")
+    buckets: List[TimelineBucket] = Field(default=[], description="時間/日ごとの作業時間")
+
+
+class SessionTotalsResponse(BaseModel):
+    by_task: Dict[str, int] = Field(..., description="作業名別の合計時間（ミリ秒）。day を指定するとその日の分だけ")
+    by_day: Dict[date, int] = Field(..., description="日別の合計時間（ミリ秒）。日は SESSION_DAY_UTC_OFFSET_HOURS の時差で区切る")
+    by_day_task: Dict[date, Dict[str, int]] = Field(..., description="日別・作業名別の合計時間（ミリ秒）")
+
+
+class SessionStoreStatsResponse(BaseModel):
+    live_sessions: int = Field(..., description="通常の形式で保持しているセッション数（進行中・一時停止中など）")
+    archived_sessions: int = Field(..., description="アーカイブに圧縮して保持している停止済みセッション数")
+    archived_total: int = Field(..., description="起動後にアーカイブへ移したセッションの累計")
+    evicted_total: int = Field(..., description="起動後に保持ポリシーで削除したセッションの累計")
+
+
+class SessionImportError(BaseModel):
+    line: int = Field(..., description="エラーとなった行番号（1始まり）")
+    error: str = Field(..., description="エラー内容")
+
+
+class SessionImportResponse(BaseModel):
+    imported: int = Field(..., description="取り込んだセッション数")
+    failed: int = Field(..., description="取り込めなかった行数")
+    errors: List[SessionImportError] = Field(default=[], description="エラー詳細（先頭の一部のみ）")
+
+
+class BatchOperationType(str, Enum):
+    START = "start"
+    PAUSE = "pause"
+    RESUME = "resume"
+    STOP = "stop"
+
+
+class BatchOperation(BaseModel):
+    op: BatchOperationType = Field(..., description="操作種別")
+    task_name: Optional[str] = Field(None, description="作業名（start のみ）")
+    session_id: Optional[str] = Field(None, description="対象セッションID")
+    session_ref: Optional[int] = Field(None, description="同じバッチ内の start 操作の番号（0始まり）でセッションを指定")
+    timestamp: Optional[datetime] = Field(None, description="クライアントで操作した時刻")
+    expected_version: Optional[int] = Field(None, description="If-Match 相当のバージョン")
+    
+    @model_validator(mode="after")
+    def validate_target(self) -> "BatchOperation":
+        if self.op == BatchOperationType.START:
+            if self.task_name is None or not self.task_name.strip():
+                raise ValueError("task_name is required for start")
+            self.task_name = self.task_name.strip()
+        elif self.session_id is None and self.session_ref is None:
+            raise ValueError("session_id or session_ref is required")
+        return self
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., max_length=500, description="順番に適用する操作一覧")
+    atomic: bool = Field(True, description="true なら 1 つでも失敗する操作があればどの操作も適用しない")
+
+
+class BatchOperationResult(BaseModel):
+    status_code: int = Field(..., description="個別操作の結果（HTTPステータス相当）")
+    session: Optional[SessionResponse] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchOperationResult]
+
+
 class TaskItem(BaseModel):
     task_name: str = Field(..., description="作業名")
     duration_ms: int = Field(..., description="作業時間（ミリ秒）")
@@ -91,5 +189,42 @@ class SummaryRequest(BaseModel):
     projects: List[str] = Field(default=[], description="プロジェクト一覧（カテゴリ候補）")
 
 
+class SessionSummaryRequest(BaseModel):
+    start: Optional[datetime] = Field(None, description="集計期間の開始時刻")
+    end: Optional[datetime] = Field(None, description="集計期間の終了時刻")
+    session_ids: Optional[List[str]] = Field(None, description="集計対象のセッションID（期間の代わりに指定）")
+    projects: List[str] = Field(default=[], description="プロジェクト一覧（カテゴリ候補）")
+
+
 class SummaryResponse(BaseModel):
-    categories: List[CategoryItem] = Field(..., description="カテゴリ別集計結果")
\ No newline at end of file
+    categories: List[CategoryItem] = Field(..., description="カテゴリ別集計結果")
+
+
+class ClassificationCacheStatsResponse(BaseModel):
+    size: int = Field(..., description="キャッシュしている作業名の数")
+    max_entries: int = Field(..., description="キャッシュする作業名の上限")
+    hits: int = Field(..., description="キャッシュから分類を返した回数")
+    misses: int = Field(..., description="キャッシュになく Gemini に問い合わせた回数")
+    evictions: int = Field(..., description="上限を超えて捨てた件数")
+    expirations: int = Field(..., description="期限切れで捨てた件数")
+    disk_hits: Optional[int] = Field(None, description="メモリになくファイルから読み込んだ回数（CLASSIFICATION_CACHE_DB 指定時）")
+    disk_size: Optional[int] = Field(None, description="ファイルに保存している件数（CLASSIFICATION_CACHE_DB 指定時）")
+
+
+class GeminiUpstreamStatsResponse(BaseModel):
+    circuit_state: str = Field(..., description="サーキットブレーカーの状態（closed / open / half_open）")
+    circuit_opened_total: int = Field(..., description="起動後にブレーカーが開いた回数")
+    retries: int = Field(..., description="起動後に Gemini API 呼び出しを再試行した回数")
+    fallbacks: int = Field(..., description="Gemini から結果を得られずローカルの規則で分類したチャンク数")
+    coalesced: int = Field(..., description="実行中の同じ問い合わせの結果を共有した要求数")
+    rule_classified: int = Field(..., description="キーワード規則で確信を持って分類し、Gemini に問い合わせなかった作業名の数")
+
+
+class LocalClassifierStatsResponse(BaseModel):
+    examples: int = Field(..., description="学習に使った作業名の数（Gemini の分類結果）")
+    labels: int = Field(..., description="学習した分類（カテゴリ, 小項目）の数")
+    dims: int = Field(..., description="特徴量の次元数")
+    threshold: Optional[float] = Field(None, description="手元で答える確信度の下限（未指定なら学習のみ）")
+    served: int = Field(..., description="手元の分類器で答え、Gemini に問い合わせなかった作業名の数")
+    deferred: int = Field(..., description="確信度が足りず Gemini に問い合わせた作業名の数")
+    served_fraction: float = Field(..., description="served / (served + deferred)")
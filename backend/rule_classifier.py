@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+from classification_cache import normalize_task_name
+
+
+# (カテゴリ, 小項目, 確信度)。確信度が閾値以上なら Gemini に問い合わせずにこの分類を使う
+RuleMatch = Tuple[str, str, float]
+
+DEFAULT_RULES = {
+    "default_category": "その他",
+    "default_subcategory": "一般作業",
+    # 上から順に優先する。複数の小項目のキーワードを含む作業名は先にある小項目に分類する
+    "subcategories": [
+        {"name": "開発", "keywords": ["開発", "コード", "実装", "プログラム"]},
+        {"name": "テスト", "keywords": ["テスト", "test", "デバッグ"]},
+        {"name": "会議", "keywords": ["会議", "ミーティング", "打ち合わせ"]},
+        {"name": "学習", "keywords": ["学習", "勉強", "調査", "研究"]},
+        {"name": "設計", "keywords": ["設計", "design", "仕様"]},
+        {"name": "ドキュメント作成", "keywords": ["ドキュメント", "資料", "文書"]},
+    ],
+    # プロジェクト名 → 作業名に現れる別名（プロジェクト名そのものは常に対象）
+    "project_aliases": {},
+}
+
+
+class _Automaton:
+    """パターン集合を 1 つの Aho-Corasick オートマトンにまとめ、失敗遷移を畳み込んだ DFA にしたもの。
+    
+    各状態の遷移は dict で持ち、根に戻る遷移は省く。出力を持つ状態は番号を末尾に集めてあり、
+    走査中は状態番号の比較だけで一致の有無が分かる。一致したパターンはグループごとのビットマスクで返す。
+    """
+    
+    def __init__(self, patterns: Sequence[Tuple[str, int, int]]):
+        # patterns: (パターン, 種類 0/1, グループ番号)。同じ種類の中ではグループ番号が小さいほど優先
+        goto: List[Dict[str, int]] = [{}]
+        masks: List[List[int]] = [[0, 0]]
+        for text, kind, group in patterns:
+            if not text:
+                continue
+            state = 0
+            for char in text:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    masks.append([0, 0])
+                state = next_state
+            masks[state][kind] |= 1 << group
+        
+        # 幅優先で失敗遷移を求め、遷移表と出力を失敗先から引き継ぐ
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            masks[state][0] |= masks[fail[state]][0]
+            masks[state][1] |= masks[fail[state]][1]
+            delta[state] = dict(delta[fail[state]])
+            for char, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(char, 0) if state else 0
+                delta[state][char] = next_state
+                queue.append(next_state)
+        
+        # 出力を持たない状態を先、持つ状態を後ろに並べ替える
+        order = sorted(range(len(goto)), key=lambda state: (masks[state] != [0, 0], state))
+        order.remove(0)
+        order.insert(0, 0)
+        renumber = {old: new for new, old in enumerate(order)}
+        self._transitions = [
+            {char: renumber[target] for char, target in delta[old].items()}.get for old in order
+        ]
+        self._masks = [tuple(masks[old]) for old in order]
+        self._first_output = next((new for new, old in enumerate(order) if masks[old] != [0, 0]), len(order))
+        # 作業名は何度も現れるので、走査結果を作業名ごとに覚えておく（RuleClassifier が使う）
+        self.memo: Dict[str, "RuleMatch"] = {}
+    
+    def scan(self, text: str) -> Tuple[int, int]:
+        transitions = self._transitions
+        first_output = self._first_output
+        masks = self._masks
+        found_first = found_second = 0
+        state = 0
+        for char in text:
+            state = transitions[state](char, 0)
+            if state >= first_output:
+                first, second = masks[state]
+                found_first |= first
+                found_second |= second
+        return found_first, found_second
+
+
+class RuleClassifier:
+    """プロジェクト名と小項目のキーワードで作業名を分類する、Gemini の手前の 1 段目。
+    
+    プロジェクト名（と別名）と全キーワードを 1 つのオートマトンにまとめ、作業名を 1 回走査するだけで分類する。
+    オートマトンはプロジェクト一覧ごとに作り、直近 max_compiled 件を使い回す。
+    確信度は次のように決める:
+      小項目: キーワードが 1 グループだけ一致すれば 1、複数グループなら 0.5、一致しなければ 0
+      カテゴリ: プロジェクトが 1 つだけ一致するかプロジェクト未指定なら 1、複数なら 0.5、一致しなければ 0
+      確信度はその平均
+    """
+    
+    MEMO_SIZE = 100000
+    
+    def __init__(self, rules: Optional[dict] = None, max_compiled: int = 32):
+        rules = rules or DEFAULT_RULES
+        self.default_category = rules.get("default_category", DEFAULT_RULES["default_category"])
+        self.default_subcategory = rules.get("default_subcategory", DEFAULT_RULES["default_subcategory"])
+        self.subcategories = [group["name"] for group in rules.get("subcategories", [])]
+        self._keywords = [
+            (normalize_task_name(keyword), 1, group)
+            for group, entry in enumerate(rules.get("subcategories", []))
+            for keyword in entry.get("keywords", [])
+        ]
+        self._aliases = {
+            normalize_task_name(project): [normalize_task_name(alias) for alias in aliases]
+            for project, aliases in rules.get("project_aliases", {}).items()
+        }
+        self.max_compiled = max_compiled
+        self._compiled: "OrderedDict[Tuple[str, ...], _Automaton]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def classify(self, normalized_name: str, projects: Sequence[str]) -> RuleMatch:
+        # normalized_name は normalize_task_name 済みの作業名
+        return self.classify_many([normalized_name], projects)[0]
+    
+    def classify_many(self, normalized_names: Sequence[str], projects: Sequence[str]) -> List[RuleMatch]:
+        automaton = self._automaton(projects)
+        scan = automaton.scan
+        memo = automaton.memo
+        decide = self._decide
+        results = []
+        for name in normalized_names:
+            match = memo.get(name)
+            if match is None:
+                match = decide(scan(name), projects)
+                if len(memo) >= self.MEMO_SIZE:
+                    memo.clear()
+                memo[name] = match
+            results.append(match)
+        return results
+    
+    def _decide(self, found: Tuple[int, int], projects: Sequence[str]) -> RuleMatch:
+        found_projects, found_groups = found
+        if found_projects:
+            # 最下位のビットが最も優先するもの（一覧で先にあるもの）
+            category = projects[(found_projects & -found_projects).bit_length() - 1]
+            category_confidence = 1.0 if found_projects & (found_projects - 1) == 0 else 0.5
+        else:
+            category = self.default_category
+            category_confidence = 0.0 if projects else 1.0
+        if found_groups:
+            subcategory = self.subcategories[(found_groups & -found_groups).bit_length() - 1]
+            subcategory_confidence = 1.0 if found_groups & (found_groups - 1) == 0 else 0.5
+        else:
+            subcategory = self.default_subcategory
+            subcategory_confidence = 0.0
+        return category, subcategory, (category_confidence + subcategory_confidence) / 2
+    
+    def _automaton(self, projects: Sequence[str]) -> _Automaton:
+        key = tuple(projects)
+        with self._lock:
+            automaton = self._compiled.get(key)
+            if automaton is not None:
+                self._compiled.move_to_end(key)
+                return automaton
+        patterns = list(self._keywords)
+        for index, project in enumerate(projects):
+            name = normalize_task_name(project)
+            for alias in [name] + self._aliases.get(name, []):
+                patterns.append((alias, 0, index))
+        automaton = _Automaton(patterns)
+        with self._lock:
+            self._compiled[key] = automaton
+            while len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+        return automaton
+
+
+def load_rules(path: str) -> dict:
+    # DEFAULT_RULES と同じ形の JSON。省略した項目は既定のルールを使う
+    with open(path, encoding="utf-8") as file:
+        rules = json.load(file)
+    return {**DEFAULT_RULES, **rules}
+
+
+def create_rule_classifier() -> RuleClassifier:
+    path = os.getenv("CLASSIFICATION_RULES_PATH")
+    return RuleClassifier(load_rules(path) if path else DEFAULT_RULES)
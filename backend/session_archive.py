@@ -0,0 +1,200 @@
+import threading
+import uuid
+from array import array
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterator, List, Optional
+from models import Session, SessionStatus, SessionSegment
+from session_index import to_timestamp_us
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NO_TIME = -(2 ** 63)
+_UINT64_MASK = (1 << 64) - 1
+
+
+def _from_timestamp_us(value: int) -> Optional[datetime]:
+    if value == _NO_TIME:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+class SessionArchive:
+    """停止済みセッションを列指向で保持するアーカイブ。
+    
+    1 セッションあたり Python オブジェクトを持たず、時刻・時間は array に、
+    作業名とユーザーIDは intern した文字列表の番号で、UUID は 2 つの 64bit 整数で保持する。
+    get() の呼び出し時にだけ Session モデルへ復元する。
+    remove() は最終行を移して列を縮めるので、別のユーザーの操作と同時に列を書き換えないよう全体を 1 つのロックで守る
+    （保持ポリシーの適用や自動停止はイベントループとは別のスレッドで動く）。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._row_by_id: Dict[int, int] = {}
+        self._id_high = array("Q")
+        self._id_low = array("Q")
+        self._user = array("I")
+        self._task = array("I")
+        self._start_time = array("q")
+        self._pause_time = array("q")
+        self._end_time = array("q")
+        self._total_duration = array("q")
+        self._version = array("I")
+        # 作業区間は全セッション分を平坦な配列に持ち、行ごとに先頭位置と件数を記録する
+        self._segment_offset = array("Q")
+        self._segment_count = array("I")
+        self._segment_start = array("q")
+        self._segment_end = array("q")
+        # 更新・削除で参照されなくなった区間の件数。半分を超えたら詰め直す
+        self._segment_garbage = 0
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._row_by_id)
+    
+    def __contains__(self, session_id: str) -> bool:
+        key = self._key(session_id)
+        with self._lock:
+            return key is not None and key in self._row_by_id
+    
+    def add(self, session: Session) -> bool:
+        with self._lock:
+            return self._add(session)
+    
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id)
+    
+    def get(self, session_id: str) -> Optional[Session]:
+        key = self._key(session_id)
+        with self._lock:
+            row = self._row_by_id.get(key) if key is not None else None
+            if row is None:
+                return None
+            return self._materialize(row)
+    
+    def __iter__(self) -> Iterator[Session]:
+        # ロックを持ったまま呼び出し側に制御を返さないよう、復元してから返す
+        with self._lock:
+            sessions = [self._materialize(row) for row in self._row_by_id.values()]
+        return iter(sessions)
+    
+    def _add(self, session: Session) -> bool:
+        # UUID 形式でないIDや停止していないセッションは圧縮できないので受け付けない
+        key = self._key(session.id)
+        if key is None or session.status != SessionStatus.STOPPED:
+            return False
+        
+        pause_time = to_timestamp_us(session.pause_time) if session.pause_time else _NO_TIME
+        end_time = to_timestamp_us(session.end_time) if session.end_time else _NO_TIME
+        columns = (
+            (self._user, self._intern(session.user_id)),
+            (self._task, self._intern(session.task_name)),
+            (self._start_time, to_timestamp_us(session.start_time)),
+            (self._pause_time, pause_time),
+            (self._end_time, end_time),
+            (self._total_duration, session.total_duration),
+            (self._version, session.version),
+            (self._segment_offset, len(self._segment_start)),
+            (self._segment_count, len(session.segments)),
+        )
+        # 更新時も区間は末尾に書き直す（古い領域は再利用しない）
+        for segment in session.segments:
+            self._segment_start.append(to_timestamp_us(segment.start))
+            self._segment_end.append(to_timestamp_us(segment.end) if segment.end else _NO_TIME)
+        
+        row = self._row_by_id.get(key)
+        if row is None:
+            self._row_by_id[key] = len(self._id_high)
+            self._id_high.append(key >> 64)
+            self._id_low.append(key & _UINT64_MASK)
+            for column, value in columns:
+                column.append(value)
+        else:
+            self._segment_garbage += self._segment_count[row]
+            for column, value in columns:
+                column[row] = value
+            self._maybe_compact_segments()
+        return True
+    
+    def _remove(self, session_id: str) -> bool:
+        key = self._key(session_id)
+        row = self._row_by_id.pop(key, None) if key is not None else None
+        if row is None:
+            return False
+        
+        self._segment_garbage += self._segment_count[row]
+        # 最終行を削除した行の位置へ移し、各列を O(1) で縮める
+        last = len(self._id_high) - 1
+        columns = self._row_columns()
+        if row != last:
+            for column in columns:
+                column[row] = column[last]
+            self._row_by_id[(self._id_high[row] << 64) | self._id_low[row]] = row
+        for column in columns:
+            column.pop()
+        self._maybe_compact_segments()
+        return True
+    
+    def _materialize(self, row: int) -> Session:
+        session_id = uuid.UUID(int=(self._id_high[row] << 64) | self._id_low[row])
+        return Session(
+            id=str(session_id),
+            user_id=self._strings[self._user[row]],
+            task_name=self._strings[self._task[row]],
+            status=SessionStatus.STOPPED,
+            start_time=_from_timestamp_us(self._start_time[row]),
+            pause_time=_from_timestamp_us(self._pause_time[row]),
+            end_time=_from_timestamp_us(self._end_time[row]),
+            total_duration=self._total_duration[row],
+            version=self._version[row],
+            segments=[
+                SessionSegment(
+                    start=_from_timestamp_us(self._segment_start[i]),
+                    end=_from_timestamp_us(self._segment_end[i])
+                )
+                for i in range(self._segment_offset[row], self._segment_offset[row] + self._segment_count[row])
+            ]
+        )
+    
+    def _row_columns(self) -> List[array]:
+        return [
+            self._id_high, self._id_low, self._user, self._task, self._start_time, self._pause_time,
+            self._end_time, self._total_duration, self._version, self._segment_offset, self._segment_count
+        ]
+    
+    def _maybe_compact_segments(self) -> None:
+        if self._segment_garbage * 2 <= len(self._segment_start):
+            return
+        segment_start = array("q")
+        segment_end = array("q")
+        for row in range(len(self._segment_offset)):
+            offset = self._segment_offset[row]
+            count = self._segment_count[row]
+            self._segment_offset[row] = len(segment_start)
+            segment_start.extend(self._segment_start[offset:offset + count])
+            segment_end.extend(self._segment_end[offset:offset + count])
+        self._segment_start = segment_start
+        self._segment_end = segment_end
+        self._segment_garbage = 0
+    
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+    
+    @staticmethod
+    def _key(session_id: str) -> Optional[int]:
+        try:
+            parsed = uuid.UUID(session_id)
+        except (ValueError, AttributeError, TypeError):
+            return None
+        # 文字列表現が一致しないIDは復元時に別の文字列になるため扱わない
+        if str(parsed) != session_id:
+            return None
+        return parsed.int
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+from models import Session, SessionResponse
+
+
+class SessionEventHub:
+    """セッションの状態変化をユーザーごとの購読者へ配信するハブ。
+    
+    イベントは 1 回だけ JSON に変換し、同じユーザーの全購読者のキューへそのまま入れる。
+    キューが溢れた購読者は古いイベントから捨てる（各イベントは状態全体を含むため最新だけで足りる）。
+    """
+    
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+    
+    def subscriber_count(self, user_id: Optional[str] = None) -> int:
+        if user_id is not None:
+            return len(self._subscribers.get(user_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+    
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        # イベントループ内から呼ぶこと。配信先のループとして記録する
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+    
+    def publish(self, event: str, session: Session) -> None:
+        # SessionService のリスナーとして登録する。購読者がいなければ何もしない。
+        # ハートビート（touch）は表示する内容が変わらないので配信しない
+        if event == "touch" or session.user_id not in self._subscribers or self._loop is None:
+            return
+        payload = self.encode(event, session)
+        if threading.get_ident() == self._loop_thread_id:
+            self._dispatch(session.user_id, payload)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, session.user_id, payload)
+    
+    @staticmethod
+    def encode(event: str, session: Optional[Session]) -> str:
+        return json.dumps({
+            "event": event,
+            "server_time": datetime.now(timezone.utc).isoformat(),
+            "session": SessionResponse.from_session(session).model_dump(mode="json") if session else None,
+        }, ensure_ascii=False)
+    
+    def _dispatch(self, user_id: str, payload: str) -> None:
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
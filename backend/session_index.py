@@ -0,0 +1,79 @@
+import base64
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+IndexKey = Tuple[int, str]
+
+
+def ensure_utc(value: datetime) -> datetime:
+    # タイムゾーン未指定の日時は UTC とみなす
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_timestamp_us(value: datetime) -> int:
+    return (ensure_utc(value) - _EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(key: IndexKey) -> str:
+    raw = f"{key[0]}:{key[1]}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, session_id = base64.urlsafe_b64decode(padded).decode("utf-8").split(":", 1)
+        return int(timestamp), session_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+class SessionTimeIndex:
+    """開始時刻順に (開始時刻[μs], セッションID) を保持するソート済みインデックス。
+    
+    セッションはほぼ時刻順に追加されるため insort は末尾への追加になり、
+    範囲検索とキーセットページングは二分探索で開始位置を求めて走査する。
+    """
+    
+    def __init__(self):
+        self._keys: List[IndexKey] = []
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def add(self, start_time: datetime, session_id: str) -> None:
+        insort(self._keys, (to_timestamp_us(start_time), session_id))
+    
+    def remove(self, start_time: datetime, session_id: str) -> None:
+        key = (to_timestamp_us(start_time), session_id)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+    
+    def iter_keys(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after: Optional[IndexKey] = None,
+        descending: bool = True
+    ) -> Iterator[IndexKey]:
+        # start 以上 end 未満の範囲を、after（前ページ最後のキー）の次から返す
+        low = bisect_left(self._keys, (to_timestamp_us(start), "")) if start else 0
+        high = bisect_left(self._keys, (to_timestamp_us(end), "")) if end else len(self._keys)
+        
+        if descending:
+            if after is not None:
+                high = min(high, bisect_left(self._keys, after))
+            for position in range(high - 1, low - 1, -1):
+                yield self._keys[position]
+        else:
+            if after is not None:
+                low = max(low, bisect_right(self._keys, after))
+            for position in range(low, high):
+                yield self._keys[position]
@@ -0,0 +1,53 @@
+import asyncio
+import os
+from datetime import timedelta
+from typing import Callable, Optional
+
+
+class SessionRetentionPolicy:
+    """停止済みセッションをどこまで保持するかの設定。
+
+    max_age: 終了から経過したら削除する期間
+    max_sessions: 全ユーザー合計の保持件数の上限（古いものから削除）
+    max_sessions_per_user: ユーザーごとの保持件数の上限
+    進行中・一時停止中のセッションは対象外で、件数の上限を超えていても削除しない。
+    """
+
+    def __init__(
+        self,
+        max_age: Optional[timedelta] = None,
+        max_sessions: Optional[int] = None,
+        max_sessions_per_user: Optional[int] = None
+    ):
+        self.max_age = max_age
+        self.max_sessions = max_sessions
+        self.max_sessions_per_user = max_sessions_per_user
+
+    @property
+    def enabled(self) -> bool:
+        return any(value is not None for value in (self.max_age, self.max_sessions, self.max_sessions_per_user))
+
+
+def create_retention_policy() -> SessionRetentionPolicy:
+    days = os.getenv("SESSION_RETENTION_DAYS")
+    max_sessions = os.getenv("SESSION_MAX_SESSIONS")
+    max_sessions_per_user = os.getenv("SESSION_MAX_SESSIONS_PER_USER")
+    return SessionRetentionPolicy(
+        max_age=timedelta(days=float(days)) if days else None,
+        max_sessions=int(max_sessions) if max_sessions else None,
+        max_sessions_per_user=int(max_sessions_per_user) if max_sessions_per_user else None
+    )
+
+
+async def run_compaction(
+    get_service: Callable,
+    policy: SessionRetentionPolicy,
+    interval_seconds: float = 60.0,
+    slice_size: int = 500
+) -> None:
+    # 1 回の compact() は slice_size 件までしか削除しないので、ロックの保持時間は一定に収まる。
+    # 処理はスレッドで行い、スライスの合間にイベントループへ制御を返す
+    while True:
+        while await asyncio.to_thread(get_service().compact, policy, slice_size) >= slice_size:
+            await asyncio.sleep(0)
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,69 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional
+from session_index import ensure_utc
+
+
+class SessionRollups:
+    """作業名別・日別・日×作業名別の合計時間（ミリ秒）を逐次更新で保持する集計表。
+    
+    作業区間が閉じたときに add() で加算するので、参照時に履歴を走査する必要がない。
+    日付は day_timezone（既定は UTC）の 0 時で区切り、日をまたぐ区間は日ごとに分けて加算する。
+    """
+    
+    def __init__(self, day_timezone: timezone = timezone.utc):
+        self.day_timezone = day_timezone
+        self.by_task: Dict[str, int] = {}
+        self.by_day: Dict[date, int] = {}
+        self.by_day_task: Dict[date, Dict[str, int]] = {}
+    
+    def add(self, task_name: str, start: datetime, end: datetime, only_day: Optional[date] = None) -> None:
+        # only_day を指定すると、その日に入る分だけを加算する（snapshot(day) で絞り込んだ集計表に足すとき）
+        for day, duration_ms in split_by_day(start, end, self.day_timezone):
+            if only_day is not None and day != only_day:
+                continue
+            self.by_task[task_name] = self.by_task.get(task_name, 0) + duration_ms
+            self.by_day[day] = self.by_day.get(day, 0) + duration_ms
+            day_tasks = self.by_day_task.setdefault(day, {})
+            day_tasks[task_name] = day_tasks.get(task_name, 0) + duration_ms
+    
+    def remove(self, task_name: str, start: datetime, end: datetime) -> None:
+        # add() の逆。合計が 0 になった項目は削除して表が増え続けないようにする
+        for day, duration_ms in split_by_day(start, end, self.day_timezone):
+            _subtract(self.by_task, task_name, duration_ms)
+            _subtract(self.by_day, day, duration_ms)
+            day_tasks = self.by_day_task.get(day)
+            if day_tasks is not None:
+                _subtract(day_tasks, task_name, duration_ms)
+                if not day_tasks:
+                    del self.by_day_task[day]
+    
+    def snapshot(self, day: Optional[date] = None) -> "SessionRollups":
+        # 呼び出し側が加算しても元の集計表が変わらないようにコピーを返す。
+        # day を指定すると、作業名別の合計もその日の分だけにする
+        copied = SessionRollups(self.day_timezone)
+        if day is None:
+            copied.by_task = dict(self.by_task)
+            copied.by_day = dict(self.by_day)
+            copied.by_day_task = {d: dict(tasks) for d, tasks in self.by_day_task.items()}
+        elif day in self.by_day:
+            copied.by_task = dict(self.by_day_task[day])
+            copied.by_day = {day: self.by_day[day]}
+            copied.by_day_task = {day: dict(self.by_day_task[day])}
+        return copied
+
+
+def _subtract(totals: dict, key, duration_ms: int) -> None:
+    remaining = totals.get(key, 0) - duration_ms
+    if remaining > 0:
+        totals[key] = remaining
+    else:
+        totals.pop(key, None)
+
+
+def split_by_day(start: datetime, end: datetime, day_timezone: timezone = timezone.utc):
+    start, end = ensure_utc(start).astimezone(day_timezone), ensure_utc(end).astimezone(day_timezone)
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), time.min, tzinfo=day_timezone)
+        piece_end = min(end, next_day)
+        yield start.date(), (piece_end - start) // timedelta(milliseconds=1)
+        start = piece_end
@@ -1,123 +1,880 @@
+import functools
+import heapq
+import threading
 import uuid
-from datetime import datetime, timezone
-from typing import Dict, Optional
-from models import Session, SessionCreate, SessionUpdate, SessionStatus
+from contextlib import contextmanager
+from datetime import date, datetime, timezone, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from models import (
+    Session, SessionCreate, SessionUpdate, SessionStatus, SessionSegment, TaskItem,
+    BatchOperation, BatchOperationType, DEFAULT_USER_ID
+)
+from session_store import SessionStore, InMemorySessionStore
+from session_index import SessionTimeIndex, encode_cursor, decode_cursor, ensure_utc, to_timestamp_us
+from session_archive import SessionArchive
+from session_timeline import SegmentTimeline
+from session_rollups import SessionRollups
+from session_retention import SessionRetentionPolicy
+
+
+class _UserShard:
+    # ユーザーごとのアクティブセッションとロック。ユーザー間で競合しないように分割する
+    __slots__ = (
+        "lock", "active_session_id", "last_event_time", "index", "task_indexes", "timeline", "task_timelines", "rollups"
+    )
+    
+    def __init__(self, day_timezone: timezone = timezone.utc):
+        self.lock = threading.RLock()
+        self.active_session_id: Optional[str] = None
+        # 最後に状態が変化した時刻。クライアント指定の時刻がこれより過去に戻らないようにする
+        self.last_event_time: Optional[datetime] = None
+        # 履歴検索用の開始時刻インデックス（全体と作業名別）
+        self.index = SessionTimeIndex()
+        self.task_indexes: Dict[str, SessionTimeIndex] = {}
+        # 終了済みの作業区間（全体と作業名別）
+        self.timeline = SegmentTimeline()
+        self.task_timelines: Dict[str, SegmentTimeline] = {}
+        # 作業名別・日別の合計時間
+        self.rollups = SessionRollups(day_timezone)
+    
+    def add_segment(self, task_name: str, segment: SessionSegment) -> None:
+        self.timeline.add(segment.start, segment.end)
+        self.task_timelines.setdefault(task_name, SegmentTimeline()).add(segment.start, segment.end)
+        self.rollups.add(task_name, segment.start, segment.end)
+    
+    def add_to_index(self, session: Session) -> None:
+        self.index.add(session.start_time, session.id)
+        self.task_indexes.setdefault(session.task_name, SessionTimeIndex()).add(session.start_time, session.id)
+    
+    def remove_from_index(self, session: Session) -> None:
+        self.index.remove(session.start_time, session.id)
+        task_index = self.task_indexes.get(session.task_name)
+        if task_index is not None:
+            task_index.remove(session.start_time, session.id)
+            if not len(task_index):
+                del self.task_indexes[session.task_name]
+    
+    def remove_segments(self, segments: List[Tuple[str, SessionSegment]]) -> None:
+        self.timeline.remove_many((segment.start, segment.end) for _, segment in segments)
+        by_task: Dict[str, List[SessionSegment]] = {}
+        for task_name, segment in segments:
+            by_task.setdefault(task_name, []).append(segment)
+            self.rollups.remove(task_name, segment.start, segment.end)
+        for task_name, task_segments in by_task.items():
+            timeline = self.task_timelines.get(task_name)
+            if timeline is None:
+                continue
+            timeline.remove_many((segment.start, segment.end) for segment in task_segments)
+            if not len(timeline):
+                del self.task_timelines[task_name]
+
+
+def _writes(method):
+    # 共有ストアでは他のワーカーの変更を取り込んでから書き込み、書き込みをワーカー間で直列化する
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class SessionService:
     
-    def __init__(self):
-        self._sessions: Dict[str, Session] = {}
-        self._active_session_id: Optional[str] = None
-    
-    def start_session(self, session_data: SessionCreate) -> Session:
-        if self._active_session_id:
-            self._stop_session_internal(self._active_session_id)
-        
-        session_id = str(uuid.uuid4())
-        start_time = datetime.now(timezone.utc)
-        
-        session = Session(
-            id=session_id,
-            task_name=session_data.task_name,
-            status=SessionStatus.ACTIVE,
-            start_time=start_time,
-            pause_time=None,
-            end_time=None,
-            total_duration=0
-        )
-        
-        self._sessions[session_id] = session
-        self._active_session_id = session_id
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        archive_stopped: bool = True,
+        day_timezone: timezone = timezone.utc
+    ):
+        self._store = store or InMemorySessionStore()
+        self._archive_stopped = archive_stopped
+        # 日別の集計で日を区切るタイムゾーン
+        self._day_timezone = day_timezone
+        self._shards_lock = threading.Lock()
+        self._sync_lock = threading.RLock()
+        self._listeners: List[Callable[[str, Session], None]] = []
+        # アーカイブ・削除した件数の累計（運用の監視用）
+        self._stats_lock = threading.Lock()
+        self._archived_total = 0
+        self._evicted_total = 0
+        self._load()
+    
+    @_writes
+    def start_session(
+        self,
+        session_data: SessionCreate,
+        user_id: str = DEFAULT_USER_ID,
+        current_time: Optional[datetime] = None
+    ) -> Session:
+        shard = self._shard(user_id)
+        with shard.lock:
+            start_time = self._event_time(shard, current_time)
+            if shard.active_session_id:
+                self._stop_session_internal(shard.active_session_id, start_time)
+            
+            session_id = str(uuid.uuid4())
+            
+            session = Session(
+                id=session_id,
+                user_id=user_id,
+                task_name=session_data.task_name,
+                status=SessionStatus.ACTIVE,
+                start_time=start_time,
+                pause_time=None,
+                end_time=None,
+                total_duration=0,
+                segments=[SessionSegment(start=start_time)]
+            )
+            
+            self._sessions[session_id] = session
+            shard.active_session_id = session_id
+            shard.last_event_time = start_time
+            shard.add_to_index(session)
+            self._record("start", session)
         
         return session
     
-    def update_session(self, session_id: str, update_data: SessionUpdate) -> Session:
-        session = self.get_session(session_id)
-        current_time = datetime.now(timezone.utc)
+    @_writes
+    def update_session(
+        self,
+        session_id: str,
+        update_data: SessionUpdate,
+        user_id: str = DEFAULT_USER_ID,
+        expected_version: Optional[int] = None,
+        current_time: Optional[datetime] = None
+    ) -> Session:
+        session = self.get_session(session_id, user_id)
+        shard = self._shard(user_id)
         
-        if update_data.status:
-            if update_data.status == SessionStatus.PAUSED:
-                session = self._pause_session(session, current_time)
-            elif update_data.status == SessionStatus.ACTIVE:
-                session = self._resume_session(session, current_time)
-            elif update_data.status == SessionStatus.STOPPED:
-                session = self._stop_session_internal(session_id)
+        with shard.lock:
+            self._check_version(session, expected_version)
+            current_time = self._event_time(shard, current_time)
+            
+            if update_data.status:
+                if update_data.status == SessionStatus.PAUSED:
+                    session = self._pause_session(session, current_time)
+                elif update_data.status == SessionStatus.ACTIVE:
+                    session = self._resume_session(session, current_time)
+                elif update_data.status == SessionStatus.STOPPED:
+                    session = self._stop_session_internal(session_id, current_time)
         
         return session
     
-    def pause_session(self, session_id: str) -> Session:
-        session = self.get_session(session_id)
-        
-        if session.status == SessionStatus.STOPPED:
-            raise ValueError("Cannot pause a stopped session")
+    @_writes
+    def pause_session(
+        self,
+        session_id: str,
+        user_id: str = DEFAULT_USER_ID,
+        expected_version: Optional[int] = None,
+        current_time: Optional[datetime] = None
+    ) -> Session:
+        session = self.get_session(session_id, user_id)
+        shard = self._shard(user_id)
         
-        current_time = datetime.now(timezone.utc)
+        with shard.lock:
+            self._check_version(session, expected_version)
+            if session.status == SessionStatus.STOPPED:
+                raise ValueError("Cannot pause a stopped session")
+            
+            current_time = self._event_time(shard, current_time)
+            
+            if session.status == SessionStatus.ACTIVE:
+                return self._pause_session(session, current_time)
+            elif session.status == SessionStatus.PAUSED:
+                return self._resume_session(session, current_time)
         
-        if session.status == SessionStatus.ACTIVE:
-            return self._pause_session(session, current_time)
-        elif session.status == SessionStatus.PAUSED:
-            return self._resume_session(session, current_time)
+        return session
+    
+    @_writes
+    def stop_session(
+        self,
+        session_id: str,
+        user_id: str = DEFAULT_USER_ID,
+        expected_version: Optional[int] = None,
+        current_time: Optional[datetime] = None
+    ) -> Session:
+        session = self.get_session(session_id, user_id)
+        shard = self._shard(user_id)
         
+        with shard.lock:
+            self._check_version(session, expected_version)
+            return self._stop_session_internal(session_id, self._event_time(shard, current_time))
+    
+    @_writes
+    def touch_session(
+        self,
+        session_id: str,
+        user_id: str = DEFAULT_USER_ID,
+        current_time: Optional[datetime] = None
+    ) -> Session:
+        # クライアントのハートビート。最後の操作時刻を記録し、全ワーカーの自動一時停止のタイマーに伝える。
+        # 作業内容は変わらないのでバージョンは上げない（If-Match に影響しない）
+        session = self.get_session(session_id, user_id)
+        shard = self._shard(user_id)
+        with shard.lock:
+            if session.status == SessionStatus.ACTIVE:
+                session.last_activity = self._event_time(shard, current_time)
+                self._record("touch", session)
         return session
     
-    def stop_session(self, session_id: str) -> Session:
-        return self._stop_session_internal(session_id)
+    @_writes
+    def expire_session(
+        self,
+        session_id: str,
+        status: SessionStatus,
+        user_id: str,
+        expected_version: int,
+        current_time: datetime,
+        last_activity: Optional[datetime] = None
+    ) -> Session:
+        # 自動一時停止・停止用。タイマーを掛けた後に操作（バージョンの変化）やハートビート（last_activity より
+        # 新しい記録）があれば、他のワーカーで受けたものでも書き込み前に取り込んでいるので ValueError になる
+        shard = self._shard(user_id)
+        with shard.lock:
+            session = self.get_session(session_id, user_id)
+            if last_activity is not None and session.last_activity is not None and session.last_activity > last_activity:
+                raise ValueError("Session has newer activity")
+            return self.update_session(session_id, SessionUpdate(status=status), user_id, expected_version, current_time)
+    
+    @_writes
+    def apply_batch(
+        self,
+        operations: List[BatchOperation],
+        user_id: str = DEFAULT_USER_ID,
+        atomic: bool = True
+    ) -> List[Union[Session, ValueError]]:
+        # オフライン中に溜めた操作を順番に適用する。ユーザーのロックを最後まで保持するので
+        # 途中に他のリクエストが割り込むことはない。
+        # atomic なら先にセッションの複製へ適用してみて、失敗する操作があればどれも適用しない
+        # （失敗した操作にはその例外、ほかの操作には "Batch aborted" を結果に入れる）。
+        # atomic でなければ失敗した操作は例外を結果に入れて続行する
+        with self._shard(user_id).lock:
+            if atomic:
+                trial = self._dry_run_batch(operations, user_id)
+                failed = next((i for i, result in enumerate(trial) if isinstance(result, ValueError)), None)
+                if failed is not None:
+                    return [result if i == failed else ValueError("Batch aborted") for i, result in enumerate(trial)]
+            return self._apply_batch_operations(operations, user_id)
+    
+    def _apply_batch_operations(
+        self,
+        operations: List[BatchOperation],
+        user_id: str
+    ) -> List[Union[Session, ValueError]]:
+        results: List[Union[Session, ValueError]] = []
+        for operation in operations:
+            try:
+                session = self._apply_batch_operation(operation, results, user_id)
+                # 後続の操作で書き換わるので、この時点の状態を結果として残す
+                results.append(session.model_copy(deep=True))
+            except ValueError as e:
+                results.append(e)
+        return results
+    
+    def _dry_run_batch(
+        self,
+        operations: List[BatchOperation],
+        user_id: str
+    ) -> List[Union[Session, ValueError]]:
+        # 操作の対象になるセッション（指定されたものと作業中のもの）の複製だけを持つ使い捨ての SessionService に
+        # 同じ操作を適用する。ストアにもこのサービスの状態にも書き込まない
+        shard = self._shard(user_id)
+        scratch = SessionService(archive_stopped=False)
+        targets = {operation.session_id for operation in operations if operation.session_id is not None}
+        if shard.active_session_id:
+            targets.add(shard.active_session_id)
+        for session_id in targets:
+            try:
+                session = self.get_session(session_id, user_id).model_copy(deep=True)
+            except ValueError:
+                continue
+            scratch._sessions[session.id] = session
+            scratch._register_session(session)
+        scratch_shard = scratch._shard(user_id)
+        scratch_shard.active_session_id = shard.active_session_id
+        scratch_shard.last_event_time = shard.last_event_time
+        return scratch._apply_batch_operations(operations, user_id)
+    
+    def _apply_batch_operation(
+        self,
+        operation: BatchOperation,
+        results: List[Union[Session, ValueError]],
+        user_id: str
+    ) -> Session:
+        if operation.op == BatchOperationType.START:
+            return self.start_session(SessionCreate(task_name=operation.task_name), user_id, operation.timestamp)
+        
+        session_id = operation.session_id
+        if operation.session_ref is not None:
+            if not 0 <= operation.session_ref < len(results) or not isinstance(results[operation.session_ref], Session):
+                raise ValueError("Invalid session_ref")
+            session_id = results[operation.session_ref].id
+        
+        session = self.get_session(session_id, user_id)
+        if operation.op != BatchOperationType.STOP and session.status == SessionStatus.STOPPED:
+            raise ValueError(f"Cannot {operation.op.value} a stopped session")
+        
+        status = {
+            BatchOperationType.PAUSE: SessionStatus.PAUSED,
+            BatchOperationType.RESUME: SessionStatus.ACTIVE,
+            BatchOperationType.STOP: SessionStatus.STOPPED,
+        }[operation.op]
+        return self.update_session(
+            session_id, SessionUpdate(status=status), user_id, operation.expected_version, operation.timestamp
+        )
     
-    def get_session(self, session_id: str) -> Session:
-        if session_id not in self._sessions:
+    def get_session(self, session_id: str, user_id: Optional[str] = None) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._archive.get(session_id)
+        # 他ユーザーのセッションは存在しないものとして扱う
+        if session is None or (user_id is not None and session.user_id != user_id):
             raise ValueError("Session not found")
         
-        return self._sessions[session_id]
+        return session
     
-    def get_active_session(self) -> Optional[Session]:
-        if self._active_session_id and self._active_session_id in self._sessions:
-            return self._sessions[self._active_session_id]
+    def get_active_session(self, user_id: str = DEFAULT_USER_ID) -> Optional[Session]:
+        shard = self._shards.get(user_id)
+        if shard and shard.active_session_id:
+            return self._sessions.get(shard.active_session_id)
         return None
     
+    def get_active_sessions(self) -> List[Session]:
+        return [
+            session for session in (self.get_active_session(user_id) for user_id in list(self._shards))
+            if session is not None
+        ]
+    
+    def list_sessions(
+        self,
+        user_id: str = DEFAULT_USER_ID,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[SessionStatus] = None,
+        task_name: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Session], Optional[str]]:
+        # 開始時刻の新しい順に返す。cursor には前ページ最後のキーを渡す（キーセットページング）
+        after = decode_cursor(cursor) if cursor else None
+        shard = self._shard(user_id)
+        
+        with shard.lock:
+            index = shard.task_indexes.get(task_name) if task_name is not None else shard.index
+            if index is None:
+                return [], None
+            
+            sessions: List[Session] = []
+            last_key = None
+            for key in index.iter_keys(start, end, after):
+                session = self._sessions.get(key[1])
+                if session is None:
+                    # アーカイブにあるのは停止済みのみなので、復元せずに除外できる
+                    if status is not None and status != SessionStatus.STOPPED:
+                        continue
+                    session = self._archive.get(key[1])
+                if session is None or (status is not None and session.status != status):
+                    continue
+                sessions.append(session)
+                last_key = key
+                if len(sessions) == limit:
+                    break
+            else:
+                return sessions, None
+        
+        return sessions, encode_cursor(last_key)
+    
+    def get_worked_duration(
+        self,
+        start: datetime,
+        end: datetime,
+        user_id: str = DEFAULT_USER_ID,
+        task_name: Optional[str] = None
+    ) -> int:
+        # 期間内に実際に作業していた時間（ミリ秒）。進行中の区間は現在時刻までを含める
+        start, end = ensure_utc(start), ensure_utc(end)
+        shard = self._shard(user_id)
+        with shard.lock:
+            timeline = shard.task_timelines.get(task_name) if task_name is not None else shard.timeline
+            total_us = timeline.duration_us(start, end) if timeline is not None else 0
+            
+            active_session = self.get_active_session(user_id)
+            if (
+                active_session is not None
+                and active_session.segments
+                and (task_name is None or active_session.task_name == task_name)
+            ):
+                open_start = max(active_session.segments[-1].start, start)
+                open_end = min(datetime.now(timezone.utc), end)
+                if open_end > open_start:
+                    total_us += (open_end - open_start) // timedelta(microseconds=1)
+        
+        return total_us // 1000
+    
+    def get_worked_duration_buckets(
+        self,
+        start: datetime,
+        end: datetime,
+        bucket_size: timedelta,
+        user_id: str = DEFAULT_USER_ID,
+        task_name: Optional[str] = None
+    ) -> List[Tuple[datetime, int]]:
+        buckets = []
+        bucket_start = start
+        while bucket_start < end:
+            bucket_end = min(bucket_start + bucket_size, end)
+            buckets.append((bucket_start, self.get_worked_duration(bucket_start, bucket_end, user_id, task_name)))
+            bucket_start = bucket_end
+        return buckets
+    
+    def iter_sessions(self, user_id: str = DEFAULT_USER_ID, chunk_size: int = 1000) -> Iterator[Session]:
+        # 開始時刻順に少しずつ取り出す。ロックはチャンク単位でしか保持しないので、
+        # 大量のエクスポート中も他の操作をブロックせず、メモリ使用量も一定に保たれる
+        shard = self._shard(user_id)
+        after = None
+        while True:
+            with shard.lock:
+                keys = list(islice(shard.index.iter_keys(after=after, descending=False), chunk_size))
+                sessions = [self._sessions.get(key[1]) or self._archive.get(key[1]) for key in keys]
+            for session in sessions:
+                if session is not None:
+                    yield session
+            if len(keys) < chunk_size:
+                return
+            after = keys[-1]
+    
+    @_writes
+    def import_session(self, session: Session) -> Session:
+        shard = self._shard(session.user_id)
+        with shard.lock:
+            if session.id in self._sessions or session.id in self._archive:
+                raise ValueError("Session already exists")
+            self._check_import_segments(shard, session)
+            if session.status == SessionStatus.ACTIVE:
+                if shard.active_session_id:
+                    raise ValueError("Another session is already active")
+                shard.active_session_id = session.id
+            
+            self._sessions[session.id] = session
+            self._register_session(session)
+            self._record("import", session)
+            self._archive_session(session)
+        
+        return session
+    
+    def _check_import_segments(self, shard: _UserShard, session: Session) -> None:
+        # タイムラインは同一ユーザーの作業区間が重ならないことを前提にしているので、
+        # 順序が崩れた区間や、既存の区間・作業中の区間と重なる区間を持つセッションは取り込まない
+        previous_end = None
+        for i, segment in enumerate(session.segments):
+            is_open = segment.end is None
+            if is_open and (session.status != SessionStatus.ACTIVE or i != len(session.segments) - 1):
+                raise ValueError("Only the last segment of an active session can be open")
+            if not is_open and segment.end < segment.start:
+                raise ValueError("Segment ends before it starts")
+            if previous_end is not None and segment.start < previous_end:
+                raise ValueError("Segments are not in chronological order")
+            previous_end = segment.end
+        
+        # 作業中の区間はまだタイムラインに入っていないので別に比べる
+        active_session = self.get_active_session(session.user_id)
+        active_start = None
+        if active_session is not None and active_session.segments and active_session.segments[-1].end is None:
+            active_start = active_session.segments[-1].start
+        for segment in session.segments:
+            if shard.timeline.overlaps(segment.start, segment.end) or (
+                active_start is not None and (segment.end is None or segment.end > active_start)
+            ):
+                raise ValueError("Segments overlap existing sessions")
+    
+    def get_totals(self, user_id: str = DEFAULT_USER_ID, day: Optional[date] = None) -> SessionRollups:
+        # 逐次更新している集計表に、進行中の区間の分だけを足して返す
+        shard = self._shard(user_id)
+        with shard.lock:
+            totals = shard.rollups.snapshot(day)
+            active_session = self.get_active_session(user_id)
+            if active_session is not None and active_session.segments:
+                totals.add(
+                    active_session.task_name,
+                    active_session.segments[-1].start,
+                    datetime.now(timezone.utc),
+                    only_day=day
+                )
+        return totals
+    
+    def build_task_items(
+        self,
+        user_id: str = DEFAULT_USER_ID,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        session_ids: Optional[List[str]] = None
+    ) -> List[TaskItem]:
+        # サマリー用に、保持しているセッションから作業名ごとの合計時間を組み立てる
+        durations: Dict[str, int] = {}
+        
+        if session_ids is not None:
+            current_time = datetime.now(timezone.utc)
+            for session_id in dict.fromkeys(session_ids):
+                session = self.get_session(session_id, user_id)
+                durations[session.task_name] = durations.get(session.task_name, 0) + self._elapsed_ms(session, current_time)
+        else:
+            if start is None or end is None:
+                raise ValueError("Either session_ids or start and end are required")
+            shard = self._shard(user_id)
+            with shard.lock:
+                task_names = list(shard.task_timelines)
+                active_session = self.get_active_session(user_id)
+                if active_session is not None and active_session.task_name not in shard.task_timelines:
+                    task_names.append(active_session.task_name)
+                # 作業名ごとのタイムラインを期間で切り出すので、セッション数に比例しない
+                for task_name in task_names:
+                    durations[task_name] = self.get_worked_duration(start, end, user_id, task_name)
+        
+        return [
+            TaskItem(task_name=task_name, duration_ms=duration_ms)
+            for task_name, duration_ms in durations.items()
+            if duration_ms > 0
+        ]
+    
+    @_writes
+    def compact(
+        self,
+        policy: SessionRetentionPolicy,
+        limit: int = 500,
+        current_time: Optional[datetime] = None
+    ) -> int:
+        # 保持ポリシーを超えた停止済みセッションを古い順に最大 limit 件削除し、削除件数を返す。
+        # ロックはユーザー単位で取るので、実行中も他ユーザーの操作は止まらない
+        if current_time is None:
+            current_time = datetime.now(timezone.utc)
+        cutoff = current_time - policy.max_age if policy.max_age is not None else None
+        
+        evicted = 0
+        for shard in list(self._shards.values()):
+            if evicted >= limit:
+                return evicted
+            with shard.lock:
+                excess = 0
+                if policy.max_sessions_per_user is not None:
+                    excess = len(shard.index) - policy.max_sessions_per_user
+                expired = self._select_expired(shard, cutoff, excess, limit - evicted)
+                evicted += self._evict_sessions(shard, expired)
+        
+        if policy.max_sessions is not None and evicted < limit:
+            evicted += self._evict_oldest(policy.max_sessions, limit - evicted)
+        return evicted
+    
+    def get_store_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "archived_sessions": len(self._archive),
+                "archived_total": self._archived_total,
+                "evicted_total": self._evicted_total,
+            }
+    
+    def _select_expired(
+        self,
+        shard: _UserShard,
+        cutoff: Optional[datetime],
+        excess: int,
+        limit: int
+    ) -> List[Session]:
+        # 開始時刻の古い順に見ていき、件数超過分と終了が cutoff より前のものを選ぶ
+        cutoff_us = to_timestamp_us(cutoff) if cutoff is not None else None
+        selected: List[Session] = []
+        for start_us, session_id in shard.index.iter_keys(descending=False):
+            if len(selected) >= limit:
+                break
+            if excess <= 0 and (cutoff_us is None or start_us >= cutoff_us):
+                break
+            if not self._is_stopped(session_id):
+                continue
+            session = self.get_session(session_id)
+            if excess > 0 or (cutoff is not None and session.end_time is not None and session.end_time < cutoff):
+                selected.append(session)
+                excess -= 1
+        return selected
+    
+    def _evict_oldest(self, max_sessions: int, limit: int) -> int:
+        # 全ユーザー合計の上限。各ユーザーの古い停止済みセッションを候補に集め、全体で古い順に削除する
+        shards = list(self._shards.items())
+        count = min(sum(len(shard.index) for _, shard in shards) - max_sessions, limit)
+        if count <= 0:
+            return 0
+        
+        candidates: List[Tuple[Tuple[int, str], str]] = []
+        for user_id, shard in shards:
+            with shard.lock:
+                keys = (key for key in shard.index.iter_keys(descending=False) if self._is_stopped(key[1]))
+                candidates.extend((key, user_id) for key in islice(keys, count))
+        
+        by_user: Dict[str, List[str]] = {}
+        for key, user_id in heapq.nsmallest(count, candidates):
+            by_user.setdefault(user_id, []).append(key[1])
+        
+        evicted = 0
+        for user_id, session_ids in by_user.items():
+            shard = self._shard(user_id)
+            with shard.lock:
+                # 候補を集めた後に状態が変わっていないか確かめてから削除する
+                sessions = [self.get_session(session_id) for session_id in session_ids if self._is_stopped(session_id)]
+                evicted += self._evict_sessions(shard, sessions)
+        return evicted
+    
+    def _is_stopped(self, session_id: str) -> bool:
+        if session_id in self._archive:
+            return True
+        session = self._sessions.get(session_id)
+        return session is not None and session.status == SessionStatus.STOPPED
+    
+    def _evict_sessions(self, shard: _UserShard, sessions: List[Session], record: bool = True) -> int:
+        # 検索インデックス・タイムライン・集計表からも取り除き、再起動後の状態と一致させる
+        segments: List[Tuple[str, SessionSegment]] = []
+        for session in sessions:
+            shard.remove_from_index(session)
+            if not self._archive.remove(session.id):
+                self._sessions.pop(session.id, None)
+            segments.extend((session.task_name, segment) for segment in session.segments if segment.end is not None)
+            if record:
+                self._record("evict", session)
+            else:
+                self._notify("evict", session)
+        shard.remove_segments(segments)
+        
+        if record:
+            with self._stats_lock:
+                self._evicted_total += len(sessions)
+        return len(sessions)
+    
+    def _elapsed_ms(self, session: Session, current_time: datetime) -> int:
+        elapsed = session.total_duration
+        if session.status == SessionStatus.ACTIVE and session.segments:
+            elapsed += int((current_time - session.segments[-1].start).total_seconds() * 1000)
+        return max(0, elapsed)
+    
     def _pause_session(self, session: Session, current_time: datetime) -> Session:
         if session.status == SessionStatus.ACTIVE:
             elapsed_time = int((current_time - session.start_time).total_seconds() * 1000)
             session.total_duration += elapsed_time
             session.pause_time = current_time
+            self._close_segment(session, current_time)
         
         session.status = SessionStatus.PAUSED
+        session.version += 1
         
-        if self._active_session_id == session.id:
-            self._active_session_id = None
+        shard = self._shard(session.user_id)
+        if shard.active_session_id == session.id:
+            shard.active_session_id = None
+        shard.last_event_time = current_time
         
         self._sessions[session.id] = session
+        self._record("pause", session)
         return session
     
     def _resume_session(self, session: Session, current_time: datetime) -> Session:
         if session.status == SessionStatus.PAUSED:
-            if self._active_session_id:
-                self._stop_session_internal(self._active_session_id)
+            shard = self._shard(session.user_id)
+            if shard.active_session_id:
+                self._stop_session_internal(shard.active_session_id, current_time)
             
+            # 開始時刻が変わるのでインデックスの位置も更新する
+            shard.remove_from_index(session)
             session.start_time = current_time
+            shard.add_to_index(session)
             session.pause_time = None
+            session.segments.append(SessionSegment(start=current_time))
             session.status = SessionStatus.ACTIVE
+            session.version += 1
             
-            self._active_session_id = session.id
+            shard.active_session_id = session.id
+            shard.last_event_time = current_time
+            self._record("resume", session)
         
         self._sessions[session.id] = session
         return session
     
-    def _stop_session_internal(self, session_id: str) -> Session:
+    def _stop_session_internal(self, session_id: str, current_time: Optional[datetime] = None) -> Session:
         session = self.get_session(session_id)
-        current_time = datetime.now(timezone.utc)
+        if current_time is None:
+            current_time = datetime.now(timezone.utc)
         
         if session.status == SessionStatus.ACTIVE:
             elapsed_time = int((current_time - session.start_time).total_seconds() * 1000)
             session.total_duration += elapsed_time
+            self._close_segment(session, current_time)
         elif session.status == SessionStatus.PAUSED and session.pause_time:
             pass
         
         session.status = SessionStatus.STOPPED
         session.end_time = current_time
+        session.version += 1
         
-        if self._active_session_id == session.id:
-            self._active_session_id = None
+        shard = self._shard(session.user_id)
+        if shard.active_session_id == session.id:
+            shard.active_session_id = None
+        shard.last_event_time = current_time
         
         self._sessions[session_id] = session
-        return session
\ No newline at end of file
+        self._record("stop", session)
+        self._archive_session(session)
+        return session
+    
+    def _close_segment(self, session: Session, current_time: datetime) -> None:
+        if session.segments and session.segments[-1].end is None:
+            session.segments[-1].end = current_time
+            self._shard(session.user_id).add_segment(session.task_name, session.segments[-1])
+    
+    def _archive_session(self, session: Session) -> None:
+        if not self._archive_stopped:
+            return
+        # 既にアーカイブ済みのセッションを停止し直したときは行を書き換えるだけなので、累計には数えない
+        archived = session.id in self._archive
+        if self._archive.add(session):
+            self._sessions.pop(session.id, None)
+            if not archived:
+                with self._stats_lock:
+                    self._archived_total += 1
+    
+    def _event_time(self, shard: _UserShard, requested: Optional[datetime]) -> datetime:
+        # クライアント指定の時刻は未来にならず、直前の状態変化より過去にも戻らないよう丸める。
+        # これにより同一ユーザーの作業区間が重ならないことを保証する
+        current_time = datetime.now(timezone.utc)
+        if requested is not None:
+            current_time = min(ensure_utc(requested), current_time)
+        if shard.last_event_time is not None and current_time < shard.last_event_time:
+            current_time = shard.last_event_time
+        return current_time
+    
+    def _check_version(self, session: Session, expected_version: Optional[int]) -> None:
+        # 呼び出し側が前提とするバージョンと異なれば、別の更新が先に反映されている
+        if expected_version is not None and session.version != expected_version:
+            raise ValueError("Session version mismatch")
+    
+    def add_listener(self, listener: Callable[[str, Session], None]) -> None:
+        # 状態変化のたびに listener(event, session) を呼ぶ（プッシュ配信などに使う）
+        self._listeners.append(listener)
+    
+    def _record(self, event: str, session: Session) -> None:
+        self._store.append(event, session)
+        self._notify(event, session)
+    
+    def _notify(self, event: str, session: Session) -> None:
+        for listener in self._listeners:
+            listener(event, session)
+    
+    @property
+    def shared(self) -> bool:
+        return self._store.shared
+    
+    def sync(self) -> None:
+        # 共有ストアから他のワーカーの変更を取り込む。リクエストの処理前に呼ぶ
+        if not self._store.shared:
+            return
+        with self._sync_lock:
+            self._apply_pending()
+    
+    def transaction(self):
+        # 複数の読み書き（Idempotency-Key の照会から保存まで）を、共有ストアではワーカー間で 1 つの書き込みとして直列化する
+        return self._write()
+    
+    def idempotency_cache(self, max_entries: int, ttl_seconds: float):
+        return self._store.idempotency_cache(max_entries, ttl_seconds)
+    
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        if not self._store.shared:
+            yield
+            return
+        # ロックは常に 同期ロック → ストア → ユーザーのロック の順に取る
+        with self._sync_lock, self._store.transaction():
+            self._apply_pending()
+            yield
+    
+    def _apply_pending(self) -> None:
+        events = self._store.poll()
+        if events is None:
+            self._load()
+            return
+        for event, session in events:
+            self._apply_remote(event, session)
+    
+    def _apply_remote(self, event: str, session: Session) -> None:
+        # 他のワーカーが記録した状態をそのまま反映する（イベントはセッションの状態全体を持つ）
+        shard = self._shard(session.user_id)
+        with shard.lock:
+            previous = self._sessions.get(session.id) or self._archive.get(session.id)
+            if event == "evict":
+                if previous is not None:
+                    self._evict_sessions(shard, [previous], record=False)
+                return
+            
+            if previous is not None:
+                shard.remove_from_index(previous)
+            self._register_session(session, previous)
+            if session.status == SessionStatus.ACTIVE:
+                shard.active_session_id = session.id
+            elif shard.active_session_id == session.id:
+                shard.active_session_id = None
+            
+            self._sessions[session.id] = session
+            if session.status == SessionStatus.STOPPED:
+                self._archive_session(session)
+            else:
+                self._archive.remove(session.id)
+            self._notify(event, session)
+    
+    def close(self) -> None:
+        self._store.close()
+    
+    def _shard(self, user_id: str) -> _UserShard:
+        shard = self._shards.get(user_id)
+        if shard is None:
+            # シャード生成時だけ全体ロックを取る（既存シャードの取得は辞書参照のみ）
+            with self._shards_lock:
+                shard = self._shards.setdefault(user_id, _UserShard(self._day_timezone))
+        return shard
+    
+    def _restore_active_sessions(self) -> None:
+        # 復元したセッションのうち、ユーザーごとに最後に開始されたアクティブなものを現在のセッションとする
+        latest: Dict[str, Session] = {}
+        for session in self._sessions.values():
+            if session.status != SessionStatus.ACTIVE:
+                continue
+            current = latest.get(session.user_id)
+            if current is None or session.start_time > current.start_time:
+                latest[session.user_id] = session
+        for user_id, session in latest.items():
+            self._shard(user_id).active_session_id = session.id
+    
+    def _load(self) -> None:
+        self._sessions: Dict[str, Session] = self._store.load()
+        # 停止済みセッションは列指向のアーカイブへ移し、メモリ使用量を抑える
+        self._archive = SessionArchive()
+        self._shards: Dict[str, _UserShard] = {}
+        self._restore_active_sessions()
+        self._restore_indexes()
+        for session in list(self._sessions.values()):
+            self._archive_session(session)
+    
+    def _restore_indexes(self) -> None:
+        for session in self._sessions.values():
+            self._register_session(session)
+    
+    def _register_session(self, session: Session, previous: Optional[Session] = None) -> None:
+        # 既存のセッションを検索インデックス・タイムライン・集計表へ反映する。
+        # previous があれば、その時点で既に閉じていた作業区間は反映済みとして飛ばす
+        shard = self._shard(session.user_id)
+        shard.add_to_index(session)
+        for i, segment in enumerate(session.segments):
+            if segment.end is None:
+                continue
+            if previous is not None and i < len(previous.segments) and previous.segments[i].end is not None:
+                continue
+            shard.add_segment(session.task_name, segment)
+        
+        event_times = [t for t in (session.start_time, session.pause_time, session.end_time) if t is not None]
+        latest = max(event_times)
+        if shard.last_event_time is None or latest > shard.last_event_time:
+            shard.last_event_time = latest
@@ -0,0 +1,379 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from models import Session
+from idempotency_cache import IdempotencyCache, SqliteIdempotencyCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class SessionStore:
+    """セッションの永続化バックエンド。デフォルトはメモリのみで何も保存しない。"""
+    
+    # 複数プロセスで共有するストアか。共有ストアでは他のワーカーの変更を poll() で取り込む
+    shared = False
+    
+    def load(self) -> Dict[str, Session]:
+        return {}
+    
+    def append(self, event: str, session: Session) -> None:
+        pass
+    
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        yield
+    
+    def poll(self) -> Optional[List[Tuple[str, Session]]]:
+        # 前回以降に他のプロセスが書き込んだイベント。取りこぼしがあり全件の読み直しが必要なら None
+        return []
+    
+    def flush(self) -> None:
+        pass
+    
+    def idempotency_cache(self, max_entries: int, ttl_seconds: float) -> IdempotencyCache:
+        # Idempotency-Key ごとのレスポンスの保存先。共有ストアでは全ワーカーから見える場所に置く
+        return IdempotencyCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    
+    def close(self) -> None:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    pass
+
+
+_STOP = object()
+
+
+class WalSessionStore(SessionStore):
+    """追記専用ログ (WAL) とスナップショットでセッションを永続化するストア。
+    
+    書き込みはバックグラウンドスレッドがまとめて fsync する（グループコミット）ため、
+    リクエスト処理はキューへの投入だけで戻る。一定件数ごとにスナップショットを作成して
+    ログを切り詰めるので、起動時の再生はスナップショット以降の末尾だけで済む。
+    スナップショットを書くために全セッション（アーカイブ済みを含む）の JSON をメモリに持つので、
+    停止済みセッション 1 件あたり数百バイトがアーカイブとは別に必要になる（benchmarks/bench_session_archive.py で測れる）。
+    """
+    
+    WAL_FILENAME = "sessions.wal"
+    SNAPSHOT_FILENAME = "sessions.snapshot.json"
+    
+    def __init__(self, directory: str, snapshot_interval: int = 1000, fsync: bool = True):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.wal_path = os.path.join(directory, self.WAL_FILENAME)
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILENAME)
+        
+        os.makedirs(directory, exist_ok=True)
+        
+        # スナップショット作成用に、ライタースレッドが最新状態を UTF-8 の JSON で保持する。
+        # アーカイブ済みのセッションも含む 2 つ目の複製なので、str（日本語を含むと 1 文字 2 バイト）ではなく bytes で持つ
+        self._state: Dict[str, bytes] = {}
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._records_since_snapshot = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._append_lock = threading.Lock()
+        self._wal_file = None
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+    
+    def load(self) -> Dict[str, Session]:
+        sessions, self._snapshot_seq = self._read_snapshot()
+        self._seq = self._snapshot_seq
+        
+        for seq, event, session_data in self._read_wal():
+            if seq <= self._snapshot_seq:
+                continue
+            if event == "evict":
+                sessions.pop(session_data["id"], None)
+            else:
+                sessions[session_data["id"]] = session_data
+            self._seq = seq
+            self._records_since_snapshot += 1
+        
+        self._state = {
+            session_id: json.dumps(data, ensure_ascii=False).encode("utf-8")
+            for session_id, data in sessions.items()
+        }
+        self._start_writer()
+        return {
+            session_id: Session.model_validate(data)
+            for session_id, data in sessions.items()
+        }
+    
+    def append(self, event: str, session: Session) -> None:
+        if self._closed:
+            raise RuntimeError("Session store is closed")
+        if self._writer is None:
+            self._start_writer()
+        # セッションは後で書き換えられるので、この時点の状態をシリアライズしておく
+        session_data = session.model_dump(mode="json")
+        with self._append_lock:
+            self._seq += 1
+            self._queue.put((self._seq, event, session_data))
+    
+    def flush(self) -> None:
+        if self._writer is not None:
+            self._queue.join()
+    
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        if self._wal_file is not None:
+            self._wal_file.close()
+            self._wal_file = None
+    
+    def _start_writer(self) -> None:
+        self._wal_file = open(self.wal_path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._run_writer, name="session-wal-writer", daemon=True)
+        self._writer.start()
+    
+    def _run_writer(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # 溜まっているレコードをまとめて書き込み、fsync は 1 回にする
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            records = [item for item in batch if item is not _STOP]
+            stopping = len(records) != len(batch)
+            
+            if records:
+                self._write_batch(records)
+            
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _write_batch(self, records: List[Tuple[int, str, dict]]) -> None:
+        lines = []
+        for seq, event, session_data in records:
+            session_json = json.dumps(session_data, ensure_ascii=False)
+            lines.append(f'{{"seq": {seq}, "event": {json.dumps(event)}, "session": {session_json}}}')
+            # 保持期間を過ぎて削除されたセッションは次のスナップショットに含めない
+            if event == "evict":
+                self._state.pop(session_data["id"], None)
+            else:
+                self._state[session_data["id"]] = session_json.encode("utf-8")
+        
+        self._wal_file.write("\n".join(lines) + "\n")
+        self._wal_file.flush()
+        if self.fsync:
+            os.fsync(self._wal_file.fileno())
+        
+        self._records_since_snapshot += len(records)
+        if self._records_since_snapshot >= self.snapshot_interval:
+            self._write_snapshot(records[-1][0])
+    
+    def _write_snapshot(self, seq: int) -> None:
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            entries = (json.dumps(session_id).encode("utf-8") + b": " + data for session_id, data in self._state.items())
+            f.write(f'{{"seq": {seq}, "sessions": {{'.encode("utf-8") + b", ".join(entries) + b"}}")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        
+        # スナップショットに含まれたログは不要なので切り詰める
+        self._wal_file.close()
+        self._wal_file = open(self.wal_path, "w", encoding="utf-8")
+        if self.fsync:
+            os.fsync(self._wal_file.fileno())
+        
+        self._snapshot_seq = seq
+        self._records_since_snapshot = 0
+    
+    def _read_snapshot(self) -> Tuple[Dict[str, dict], int]:
+        if not os.path.exists(self.snapshot_path):
+            return {}, 0
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("sessions", {}), data.get("seq", 0)
+    
+    def _read_wal(self) -> List[Tuple[int, str, dict]]:
+        if not os.path.exists(self.wal_path):
+            return []
+        records = []
+        valid_length = 0
+        with open(self.wal_path, "rb") as f:
+            for raw_line in f:
+                try:
+                    record = json.loads(raw_line.decode("utf-8")) if raw_line.strip() else None
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # クラッシュ時に書きかけだった末尾の行は無視する
+                    break
+                if not raw_line.endswith(b"\n"):
+                    break
+                if record is not None:
+                    records.append((record["seq"], record.get("event", ""), record["session"]))
+                valid_length += len(raw_line)
+        # 壊れた末尾を切り捨て、以降の追記が正しい行として始まるようにする
+        if valid_length != os.path.getsize(self.wal_path):
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(valid_length)
+        return records
+
+
+class SqliteSessionStore(SessionStore):
+    """複数のワーカープロセスで共有する SQLite（WAL モード）のセッションストア。
+    
+    sessions テーブルに最新状態を、session_events テーブルに連番付きのイベントを同じトランザクションで書く。
+    各ワーカーはメモリ上の SessionService をキャッシュとして持ち、自分が読んだ最後の連番より後の
+    イベントを poll() で取り込んで追いつく。書き込みは BEGIN IMMEDIATE でワーカー間で直列化する。
+    """
+    
+    shared = True
+    PRUNE_INTERVAL = 1000
+    
+    def __init__(self, path: str, retained_events: int = 10000):
+        self.path = path
+        # これより古いイベントは削除する。遅れすぎたワーカーは sessions テーブルから読み直す
+        self.retained_events = retained_events
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, session TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_events ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT NOT NULL, session TEXT NOT NULL)"
+        )
+        self._lock = threading.RLock()
+        # SQLite はロック待ちをミリ秒単位のスリープで再試行するため、書き込みが競合すると待ち時間が支配的になる。
+        # ロックファイルの flock で待てば、解放と同時に次のワーカーが起きる
+        self._lock_file = open(path + ".lock", "a") if fcntl is not None else None
+        self._depth = 0
+        self._last_seq = 0
+        self._writes_since_prune = 0
+    
+    def load(self) -> Dict[str, Session]:
+        with self._lock:
+            # 最新状態と連番を同じ読み取りトランザクションで取り、以降のイベントだけを poll() で読む。
+            # 書き込みのトランザクション中（遅れたワーカーが書き込み前に読み直すとき）は、その中で読む
+            in_transaction = self._depth > 0
+            if not in_transaction:
+                self._conn.execute("BEGIN")
+            try:
+                rows = self._conn.execute("SELECT session FROM sessions").fetchall()
+                self._last_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM session_events").fetchone()[0]
+            finally:
+                if not in_transaction:
+                    self._conn.execute("COMMIT")
+        sessions = (Session.model_validate_json(row[0]) for row in rows)
+        return {session.id: session for session in sessions}
+    
+    def append(self, event: str, session: Session) -> None:
+        session_json = session.model_dump_json()
+        with self.transaction():
+            cursor = self._conn.execute(
+                "INSERT INTO session_events (event, session) VALUES (?, ?)", (event, session_json)
+            )
+            self._last_seq = cursor.lastrowid
+            if event == "evict":
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session.id,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, session) VALUES (?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET session = excluded.session",
+                    (session.id, session_json)
+                )
+            self._writes_since_prune += 1
+    
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # 入れ子にできる。ValueError は業務上の拒否で、それまでの変更はメモリにも反映済みなのでコミットする
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._depth = 1
+                last_seq = self._last_seq
+                try:
+                    yield
+                except ValueError:
+                    self._commit()
+                    raise
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    self._last_seq = last_seq
+                    raise
+                else:
+                    self._commit()
+                finally:
+                    self._depth = 0
+            finally:
+                if self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+    
+    def poll(self) -> Optional[List[Tuple[str, Session]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event, session FROM session_events WHERE seq > ? ORDER BY seq", (self._last_seq,)
+            ).fetchall()
+            if not rows:
+                return []
+            if rows[0][0] != self._last_seq + 1:
+                # 読んでいないイベントが削除済み
+                return None
+            self._last_seq = rows[-1][0]
+        return [(event, Session.model_validate_json(session_json)) for _, event, session_json in rows]
+    
+    def idempotency_cache(self, max_entries: int, ttl_seconds: float) -> SqliteIdempotencyCache:
+        # セッションの書き込みと同じトランザクションで照会・保存できるよう、同じ接続を使う
+        return SqliteIdempotencyCache(self._conn, self._lock, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+    
+    def _commit(self) -> None:
+        if self._writes_since_prune >= self.PRUNE_INTERVAL:
+            self._conn.execute("DELETE FROM session_events WHERE seq <= ?", (self._last_seq - self.retained_events,))
+            self._writes_since_prune = 0
+        self._conn.execute("COMMIT")
+
+
+def create_session_store() -> SessionStore:
+    # 複数ワーカーで動かすときは共有の SQLite ストアを使う
+    database = os.getenv("SESSION_STORE_DB")
+    if database:
+        return SqliteSessionStore(database)
+    directory = os.getenv("SESSION_STORE_DIR")
+    if not directory:
+        return InMemorySessionStore()
+    snapshot_interval = int(os.getenv("SESSION_SNAPSHOT_INTERVAL", "1000"))
+    return WalSessionStore(directory, snapshot_interval=snapshot_interval)
@@ -0,0 +1,86 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from session_index import to_timestamp_us
+
+
+class SegmentTimeline:
+    """作業区間（開始〜終了）を開始時刻順に保持し、任意の期間の作業時間を O(log n) で求める。
+    
+    同一ユーザーの作業区間は重ならない（アクティブなセッションは常に 1 つ）ため、
+    開始時刻順に並べると終了時刻も昇順になる。累積和を持っておけば、
+    期間と重なる区間の範囲を二分探索で求めて両端だけを切り詰めればよい。
+    """
+    
+    def __init__(self):
+        self._starts = array("q")
+        self._ends = array("q")
+        # _prefix[i] は先頭 i 区間の長さの合計（μs）
+        self._prefix = array("q", [0])
+    
+    def __len__(self) -> int:
+        return len(self._starts)
+    
+    def add(self, start: datetime, end: datetime) -> None:
+        start_us = to_timestamp_us(start)
+        end_us = to_timestamp_us(end)
+        if end_us <= start_us:
+            return
+        
+        if not self._starts or start_us >= self._starts[-1]:
+            # 通常は時刻順に届くので末尾への追加で済む
+            self._starts.append(start_us)
+            self._ends.append(end_us)
+            self._prefix.append(self._prefix[-1] + end_us - start_us)
+            return
+        
+        position = bisect_right(self._starts, start_us)
+        self._starts.insert(position, start_us)
+        self._ends.insert(position, end_us)
+        del self._prefix[position + 1:]
+        for i in range(position, len(self._starts)):
+            self._prefix.append(self._prefix[-1] + self._ends[i] - self._starts[i])
+    
+    def overlaps(self, start: datetime, end: Optional[datetime] = None) -> bool:
+        # 開始〜終了（None なら以降すべて）と重なる区間があるか。区間は重ならず終了時刻も昇順なので二分探索で済む
+        start_us = to_timestamp_us(start)
+        first = bisect_right(self._ends, start_us)
+        if first >= len(self._starts):
+            return False
+        return end is None or self._starts[first] < to_timestamp_us(end)
+    
+    def remove_many(self, segments: Iterable[Tuple[datetime, datetime]]) -> None:
+        # 削除は保持期間の整理でまとめて行うので、累積和の再計算は 1 回で済ませる
+        targets = {(to_timestamp_us(start), to_timestamp_us(end)) for start, end in segments}
+        if not targets:
+            return
+        kept = [(s, e) for s, e in zip(self._starts, self._ends) if (s, e) not in targets]
+        if len(kept) == len(self._starts):
+            return
+        self._starts = array("q", (s for s, _ in kept))
+        self._ends = array("q", (e for _, e in kept))
+        self._prefix = array("q", [0])
+        for s, e in kept:
+            self._prefix.append(self._prefix[-1] + e - s)
+    
+    def duration_us(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        if not self._starts:
+            return 0
+        start_us = to_timestamp_us(start) if start else self._starts[0]
+        end_us = to_timestamp_us(end) if end else self._ends[-1]
+        if end_us <= start_us:
+            return 0
+        
+        # first: 期間開始より後に終わる最初の区間、last: 期間終了より前に始まる最後の区間の次
+        first = bisect_right(self._ends, start_us)
+        last = bisect_left(self._starts, end_us)
+        if first >= last:
+            return 0
+        
+        total = self._prefix[last] - self._prefix[first]
+        if self._starts[first] < start_us:
+            total -= start_us - self._starts[first]
+        if self._ends[last - 1] > end_us:
+            total -= self._ends[last - 1] - end_us
+        return total
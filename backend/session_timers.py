@@ -0,0 +1,202 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Hashable, List, Optional
+from models import Session, SessionStatus
+
+
+class TimerWheel:
+    """ハッシュ化タイマーホイール。期限をティック単位に丸め、ティック番号 % スロット数 のスロットへ入れる。
+    
+    登録・取り消しはスロット内の辞書操作だけなので O(1)。advance() は経過したティックのスロットだけを見て、
+    期限に達したキーを返す（ホイール 1 周より先の期限は同じスロットに残り、周回後に発火する）。
+    """
+    
+    def __init__(self, tick_seconds: float = 1.0, slot_count: int = 4096, now: Optional[float] = None):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slot_count)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current_tick = self._tick(time.time() if now is None else now)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._slot_of)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+    
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        # 早く発火しないよう期限は切り上げる。既に登録済みのキーは置き換える
+        with self._lock:
+            self._remove(key)
+            tick = max(math.ceil(deadline / self.tick_seconds), self._current_tick + 1)
+            slot = tick % len(self._slots)
+            self._slots[slot][key] = tick
+            self._slot_of[key] = slot
+    
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._remove(key)
+    
+    def advance(self, now: float) -> List[Hashable]:
+        with self._lock:
+            target = self._tick(now)
+            if target <= self._current_tick:
+                return []
+            # イベントループが止まっていて 1 周以上遅れた場合も、各スロットを 1 回ずつ見れば足りる
+            first = max(self._current_tick + 1, target - len(self._slots) + 1)
+            expired = []
+            for tick in range(first, target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                due = [key for key, deadline in slot.items() if deadline <= target]
+                for key in due:
+                    del slot[key]
+                    del self._slot_of[key]
+                expired.extend(due)
+            self._current_tick = target
+            return expired
+    
+    def _remove(self, key: Hashable) -> bool:
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+    
+    def _tick(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.tick_seconds)
+
+
+class _ArmedSession:
+    __slots__ = ("user_id", "version", "last_activity", "max_deadline")
+    
+    def __init__(self, user_id: str, version: int, last_activity: datetime, max_deadline: Optional[datetime]):
+        self.user_id = user_id
+        self.version = version
+        self.last_activity = last_activity
+        self.max_deadline = max_deadline
+
+
+class SessionAutoPauser:
+    """放置されたセッションを自動で一時停止・停止する。
+    
+    idle_timeout: 最後の操作（開始・再開・ハートビート）からこの時間が経つと、最後の操作時刻で一時停止する
+    max_duration: 作業時間の合計がこの時間に達すると、その時刻で停止する
+    SessionService のリスナーとして状態変化のたびにタイマーを掛け直し、1 つのタイマーホイールで全セッションを管理する。
+    """
+    
+    def __init__(
+        self,
+        service,
+        idle_timeout: Optional[timedelta] = None,
+        max_duration: Optional[timedelta] = None,
+        wheel: Optional[TimerWheel] = None
+    ):
+        self.service = service
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self._armed: Dict[str, _ArmedSession] = {}
+        self._lock = threading.Lock()
+        if not self.enabled:
+            return
+        service.add_listener(self.on_event)
+        # 再起動前から進行中のセッションにもタイマーを掛ける
+        for session in service.get_active_sessions():
+            self._arm(session, self._last_activity(session))
+    
+    @property
+    def enabled(self) -> bool:
+        return self.idle_timeout is not None or self.max_duration is not None
+    
+    def on_event(self, event: str, session: Session) -> None:
+        # 他のワーカーで受けたハートビート（touch）も共有ストア経由でここに届く
+        if session.status == SessionStatus.ACTIVE and event != "evict":
+            self._arm(session, self._last_activity(session))
+        else:
+            self._disarm(session.id)
+    
+    def touch(self, session: Session, current_time: Optional[datetime] = None) -> None:
+        # クライアントのハートビート。ストアに記録し、on_event を通じて全ワーカーのアイドル期限を延ばす
+        if self.enabled and session.status == SessionStatus.ACTIVE:
+            self.service.touch_session(session.id, session.user_id, current_time)
+    
+    def run_expired(self, now: Optional[float] = None) -> int:
+        # 期限に達したセッションを処理し、処理した件数を返す
+        if now is None:
+            now = time.time()
+        current_time = datetime.fromtimestamp(now, timezone.utc)
+        handled = 0
+        for session_id in self.wheel.advance(now):
+            with self._lock:
+                # 取り出した直後に掛け直されていれば、新しい期限まで待つ
+                if session_id in self.wheel:
+                    continue
+                armed = self._armed.pop(session_id, None)
+            if armed is not None and self._expire(session_id, armed, current_time):
+                handled += 1
+        return handled
+    
+    async def run(self) -> None:
+        # 共有ストアへの書き込みはワーカー間のロックを待つことがあるので、イベントループを止めないようスレッドで行う。
+        # プロセス内だけのストアでは、他の書き込みと同じくイベントループ上で処理する
+        while True:
+            await asyncio.sleep(self.wheel.tick_seconds)
+            if self.service.shared:
+                await asyncio.to_thread(self.run_expired)
+            else:
+                self.run_expired()
+    
+    def _arm(self, session: Session, last_activity: datetime) -> None:
+        max_deadline = None
+        if self.max_duration is not None:
+            # 再開後の区間は start_time から始まり、それ以前の作業時間は total_duration に入っている
+            remaining = self.max_duration - timedelta(milliseconds=session.total_duration)
+            max_deadline = session.start_time + max(remaining, timedelta(0))
+        deadlines = [d for d in (max_deadline, self._idle_deadline(last_activity)) if d is not None]
+        with self._lock:
+            self._armed[session.id] = _ArmedSession(session.user_id, session.version, last_activity, max_deadline)
+            self.wheel.schedule(session.id, min(deadlines).timestamp())
+    
+    def _last_activity(self, session: Session) -> datetime:
+        # 再開後は start_time が新しいので、それより前のハートビートは数えない
+        if session.last_activity is not None and session.last_activity > session.start_time:
+            return session.last_activity
+        return session.start_time
+    
+    def _disarm(self, session_id: str) -> None:
+        with self._lock:
+            if self._armed.pop(session_id, None) is not None:
+                self.wheel.cancel(session_id)
+    
+    def _idle_deadline(self, last_activity: datetime) -> Optional[datetime]:
+        if self.idle_timeout is None:
+            return None
+        return last_activity + self.idle_timeout
+    
+    def _expire(self, session_id: str, armed: _ArmedSession, current_time: datetime) -> bool:
+        # 上限に達していれば上限の時刻で停止し、そうでなければ最後の操作時刻で一時停止する。
+        # タイマーを掛けた後に別の操作が入っていれば、バージョンが変わっているので何もしない
+        # （ハートビートはバージョンを変えないので、一時停止では最後の操作時刻が新しくなっていないかも確かめる）
+        if armed.max_deadline is not None and armed.max_deadline <= current_time:
+            status, at, last_activity = SessionStatus.STOPPED, armed.max_deadline, None
+        else:
+            status, at, last_activity = SessionStatus.PAUSED, armed.last_activity, armed.last_activity
+        try:
+            self.service.expire_session(session_id, status, armed.user_id, armed.version, at, last_activity)
+        except ValueError:
+            return False
+        return True
+
+
+def create_session_auto_pauser(service) -> SessionAutoPauser:
+    idle_minutes = os.getenv("SESSION_IDLE_TIMEOUT_MINUTES")
+    max_hours = os.getenv("SESSION_MAX_DURATION_HOURS")
+    return SessionAutoPauser(
+        service,
+        idle_timeout=timedelta(minutes=float(idle_minutes)) if idle_minutes else None,
+        max_duration=timedelta(hours=float(max_hours)) if max_hours else None
+    )
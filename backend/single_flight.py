@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+    
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同じキーの処理が実行中なら、新しく始めずにその結果を待つ。
+    
+    処理は呼び出し元とは別のタスクで動かすので、最初の呼び出し元が切断（キャンセル）されても
+    ほかの待機者には結果が届く。待機者が全員いなくなったときだけ処理そのものをキャンセルする。
+    完了した処理は結果を残さない（結果の再利用はキャッシュの役割）。
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.started = 0
+        self.coalesced = 0
+    
+    def __len__(self) -> int:
+        return len(self._calls)
+    
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            # shield で包むので、この待機者がキャンセルされても処理は続く
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # キャンセル中の処理に後から来た呼び出しが合流しないよう、先に登録を外す
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+    
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 待機者が全員キャンセルされた後の例外は誰も受け取らないので、ここで取り出して警告を抑える
+        if not call.task.cancelled():
+            call.task.exception()
@@ -267,4 +267,332 @@ class TestSessionsAPI:
         
         active_after = client.get("/sessions/active")
         assert active_after.status_code == 200
-        assert active_after.json() is None
\ No newline at end of file
+        assert active_after.json() is None
+    
+    def test_active_session_is_scoped_by_user_header(self, client):
+        alice_response = client.post(
+            "/sessions/start",
+            json={"task_name": "Aliceのタスク"},
+            headers={"X-User-Id": "alice"}
+        )
+        assert alice_response.status_code == 201
+        alice_session_id = alice_response.json()["id"]
+        
+        bob_response = client.post(
+            "/sessions/start",
+            json={"task_name": "Bobのタスク"},
+            headers={"X-User-Id": "bob"}
+        )
+        assert bob_response.status_code == 201
+        
+        alice_active = client.get("/sessions/active", headers={"X-User-Id": "alice"})
+        assert alice_active.json()["id"] == alice_session_id
+        
+        other_user_pause = client.patch(
+            f"/sessions/{alice_session_id}/pause",
+            headers={"X-User-Id": "bob"}
+        )
+        assert other_user_pause.status_code == 404
+        
+        assert client.get("/sessions/active").json() is None
+    
+    def test_session_responses_carry_etag(self, client):
+        start_response = client.post(
+            "/sessions/start",
+            json={"task_name": "ETagテスト"}
+        )
+        assert start_response.status_code == 201
+        assert start_response.headers["ETag"] == '"1"'
+        assert start_response.json()["version"] == 1
+        session_id = start_response.json()["id"]
+        
+        pause_response = client.patch(f"/sessions/{session_id}/pause", headers={"If-Match": '"1"'})
+        assert pause_response.status_code == 200
+        assert pause_response.headers["ETag"] == '"2"'
+        assert pause_response.json()["version"] == 2
+    
+    def test_retried_pause_with_stale_if_match_returns_412(self, client):
+        start_response = client.post(
+            "/sessions/start",
+            json={"task_name": "ダブルクリックテスト"}
+        )
+        session_id = start_response.json()["id"]
+        etag = start_response.headers["ETag"]
+        
+        first_pause = client.patch(f"/sessions/{session_id}/pause", headers={"If-Match": etag})
+        assert first_pause.status_code == 200
+        assert first_pause.json()["status"] == SessionStatus.PAUSED
+        
+        # 同じ前提での再送は再開として解釈されず、412で拒否される
+        retried_pause = client.patch(f"/sessions/{session_id}/pause", headers={"If-Match": etag})
+        assert retried_pause.status_code == 412
+        
+        session_after = client.post(f"/sessions/{session_id}/stop", headers={"If-Match": first_pause.headers["ETag"]})
+        assert session_after.status_code == 200
+        assert session_after.json()["total_duration"] == first_pause.json()["total_duration"]
+    
+    def test_stop_with_stale_if_match_returns_412(self, client):
+        start_response = client.post(
+            "/sessions/start",
+            json={"task_name": "停止競合テスト"}
+        )
+        session_id = start_response.json()["id"]
+        
+        client.patch(f"/sessions/{session_id}/pause")
+        
+        stop_response = client.post(f"/sessions/{session_id}/stop", headers={"If-Match": '"1"'})
+        assert stop_response.status_code == 412
+        
+        wildcard_stop = client.post(f"/sessions/{session_id}/stop", headers={"If-Match": "*"})
+        assert wildcard_stop.status_code == 200
+    
+    def test_list_sessions_with_cursor_pagination(self, client):
+        for i in range(3):
+            client.post("/sessions/start", json={"task_name": f"履歴{i}"})
+        client.post("/sessions/start", json={"task_name": "他ユーザー"}, headers={"X-User-Id": "other"})
+        
+        first_page = client.get("/sessions", params={"limit": 2})
+        assert first_page.status_code == 200
+        first_data = first_page.json()
+        assert [item["task_name"] for item in first_data["items"]] == ["履歴2", "履歴1"]
+        assert first_data["next_cursor"] is not None
+        
+        second_page = client.get("/sessions", params={"limit": 2, "cursor": first_data["next_cursor"]})
+        second_data = second_page.json()
+        assert [item["task_name"] for item in second_data["items"]] == ["履歴0"]
+        assert second_data["next_cursor"] is None
+        
+        active_only = client.get("/sessions", params={"status": "active"})
+        assert [item["task_name"] for item in active_only.json()["items"]] == ["履歴2"]
+    
+    def test_list_sessions_invalid_cursor(self, client):
+        response = client.get("/sessions", params={"cursor": "!!!"})
+        assert response.status_code == 400
+    
+    def test_session_timeline_buckets(self, client):
+        from datetime import datetime, timezone, timedelta
+        
+        now = datetime.now(timezone.utc)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start_response = client.post("/sessions/start", json={"task_name": "タイムライン"})
+        client.post(f"/sessions/{start_response.json()['id']}/stop")
+        
+        response = client.get("/sessions/timeline", params={
+            "start": day_start.isoformat(),
+            "end": (day_start + timedelta(days=1)).isoformat(),
+            "bucket": "hour"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["buckets"]) == 24
+        assert abs(sum(bucket["duration_ms"] for bucket in data["buckets"]) - data["total_duration_ms"]) <= 1
+    
+    def test_session_timeline_accepts_mixed_naive_and_aware_bounds(self, client):
+        response = client.get("/sessions/timeline", params={
+            "start": "2025-01-01T00:00:00",
+            "end": "2025-01-01T05:00:00Z",
+            "bucket": "hour"
+        })
+        
+        assert response.status_code == 200
+        assert response.json()["start"].startswith("2025-01-01T00:00:00")
+        assert len(response.json()["buckets"]) == 5
+    
+    def test_session_timeline_rejects_too_many_buckets(self, client):
+        response = client.get("/sessions/timeline", params={
+            "start": "2025-01-01T00:00:00Z",
+            "end": "2026-01-01T00:00:00Z",
+            "bucket": "hour"
+        })
+        assert response.status_code == 400
+    
+    def test_session_totals(self, client):
+        import time
+        from datetime import datetime, timezone
+        
+        first = client.post("/sessions/start", json={"task_name": "集計A"}).json()
+        time.sleep(0.02)
+        second = client.post("/sessions/start", json={"task_name": "集計B"}).json()
+        time.sleep(0.01)
+        
+        response = client.get("/sessions/totals")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["by_task"]["集計A"] >= 20
+        assert data["by_task"]["集計B"] >= 10
+        
+        today = datetime.now(timezone.utc).date().isoformat()
+        day_response = client.get("/sessions/totals", params={"day": today})
+        assert set(day_response.json()["by_day_task"][today]) == {"集計A", "集計B"}
+        
+        client.post(f"/sessions/{second['id']}/stop")
+        stopped_totals = client.get("/sessions/totals").json()
+        first_total = client.get("/sessions", params={"task_name": "集計A"}).json()["items"][0]["total_duration"]
+        assert abs(stopped_totals["by_task"]["集計A"] - first_total) <= 1
+    
+    def test_export_and_import_round_trip(self, client):
+        import json
+        
+        for task_name in ["移行A", "移行B", "移行C"]:
+            client.post("/sessions/start", json={"task_name": task_name})
+        
+        export_response = client.get("/sessions/export")
+        assert export_response.status_code == 200
+        assert export_response.headers["content-type"] == "application/x-ndjson"
+        lines = export_response.text.strip().split("\n")
+        assert [json.loads(line)["task_name"] for line in lines] == ["移行A", "移行B", "移行C"]
+        
+        reset_session_service()
+        
+        import_response = client.post("/sessions/import", content=export_response.content)
+        assert import_response.status_code == 200
+        assert import_response.json() == {"imported": 3, "failed": 0, "errors": []}
+        
+        active = client.get("/sessions/active").json()
+        assert active["task_name"] == "移行C"
+        assert len(client.get("/sessions").json()["items"]) == 3
+    
+    def test_import_reports_invalid_lines(self, client):
+        start_response = client.post("/sessions/start", json={"task_name": "既存"})
+        existing = client.get("/sessions/export").text.strip()
+        
+        body = "\n".join([existing, "{not json", '{"id": "x"}', ""])
+        response = client.post("/sessions/import", content=body.encode("utf-8"))
+        
+        data = response.json()
+        assert data["imported"] == 0
+        assert data["failed"] == 3
+        assert [error["line"] for error in data["errors"]] == [1, 2, 3]
+        assert "already exists" in data["errors"][0]["error"]
+    
+    def test_import_rejects_sessions_of_other_users(self, client):
+        client.post("/sessions/start", json={"task_name": "他人の作業"}, headers={"X-User-Id": "victim"})
+        exported = client.get("/sessions/export", headers={"X-User-Id": "victim"}).text
+        reset_session_service()
+        
+        response = client.post("/sessions/import", content=exported.encode("utf-8"), headers={"X-User-Id": "attacker"})
+        
+        assert response.json()["imported"] == 0
+        assert "another user" in response.json()["errors"][0]["error"]
+        assert client.get("/sessions", headers={"X-User-Id": "victim"}).json()["items"] == []
+    
+    def test_batch_replays_offline_operations(self, client):
+        from datetime import datetime, timezone, timedelta
+        
+        base = datetime.now(timezone.utc) - timedelta(minutes=30)
+        operations = [
+            {"op": "start", "task_name": "オフライン作業", "timestamp": base.isoformat()},
+            {"op": "pause", "session_ref": 0, "timestamp": (base + timedelta(minutes=10)).isoformat()},
+            {"op": "resume", "session_ref": 0, "timestamp": (base + timedelta(minutes=15)).isoformat()},
+            {"op": "start", "task_name": "次の作業", "timestamp": (base + timedelta(minutes=20)).isoformat()},
+            {"op": "pause", "session_id": "unknown-id"},
+        ]
+        
+        response = client.post("/sessions/batch", json={"operations": operations, "atomic": False})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        
+        assert [result["status_code"] for result in results] == [201, 200, 200, 201, 404]
+        assert results[1]["session"]["status"] == SessionStatus.PAUSED
+        assert results[1]["session"]["total_duration"] == 10 * 60 * 1000
+        
+        first_id = results[0]["session"]["id"]
+        first = client.get("/sessions", params={"task_name": "オフライン作業"}).json()["items"][0]
+        assert first["id"] == first_id
+        assert first["status"] == SessionStatus.STOPPED
+        assert first["total_duration"] == 15 * 60 * 1000
+        
+        active = client.get("/sessions/active").json()
+        assert active["id"] == results[3]["session"]["id"]
+    
+    def test_atomic_batch_applies_nothing_when_an_operation_fails(self, client):
+        current = client.post("/sessions/start", json={"task_name": "作業中"}).json()
+        operations = [
+            {"op": "pause", "session_id": current["id"]},
+            {"op": "start", "task_name": "次の作業"},
+            {"op": "stop", "session_id": current["id"], "expected_version": current["version"]},
+        ]
+        
+        response = client.post("/sessions/batch", json={"operations": operations})
+        
+        assert [result["status_code"] for result in response.json()["results"]] == [424, 424, 412]
+        active = client.get("/sessions/active").json()
+        assert (active["id"], active["status"], active["version"]) == (current["id"], "active", current["version"])
+        assert len(client.get("/sessions").json()["items"]) == 1
+        
+        response = client.post("/sessions/batch", json={"operations": operations[:2]})
+        
+        assert [result["status_code"] for result in response.json()["results"]] == [200, 201]
+        assert client.get("/sessions/active").json()["task_name"] == "次の作業"
+    
+    def test_batch_rejects_invalid_operations(self, client):
+        response = client.post("/sessions/batch", json={"operations": [{"op": "pause"}]})
+        assert response.status_code == 422
+        
+        response = client.post("/sessions/batch", json={"operations": [{"op": "stop", "session_ref": 5}]})
+        assert response.json()["results"][0]["status_code"] == 400
+    
+    def test_session_store_stats(self, client):
+        first = client.post("/sessions/start", json={"task_name": "作業A"}).json()
+        client.post("/sessions/start", json={"task_name": "作業B"})
+        
+        response = client.get("/sessions/stats")
+        
+        assert response.status_code == 200
+        assert response.json() == {
+            "live_sessions": 1,
+            "archived_sessions": 1,
+            "archived_total": 1,
+            "evicted_total": 0,
+        }
+        assert client.get(f"/sessions/{first['id']}/stop").status_code == 405
+    
+    def test_start_with_idempotency_key_is_not_repeated(self, client):
+        headers = {"Idempotency-Key": "start-1"}
+        first = client.post("/sessions/start", json={"task_name": "作業A"}, headers=headers)
+        retry = client.post("/sessions/start", json={"task_name": "作業A"}, headers=headers)
+        
+        assert retry.status_code == 201
+        assert retry.json() == first.json()
+        assert retry.headers["ETag"] == first.headers["ETag"]
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        active = client.get("/sessions/active").json()
+        assert active["id"] == first.json()["id"]
+        assert active["status"] == SessionStatus.ACTIVE
+        assert len(client.get("/sessions").json()["items"]) == 1
+    
+    def test_stop_and_pause_replay_cached_result(self, client):
+        session_id = client.post("/sessions/start", json={"task_name": "作業A"}).json()["id"]
+        
+        paused = client.patch(f"/sessions/{session_id}/pause", headers={"Idempotency-Key": "pause-1"})
+        replayed = client.patch(f"/sessions/{session_id}/pause", headers={"Idempotency-Key": "pause-1"})
+        
+        assert replayed.json() == paused.json()
+        assert replayed.json()["status"] == SessionStatus.PAUSED
+        
+        stopped = client.post(f"/sessions/{session_id}/stop", headers={"Idempotency-Key": "stop-1"})
+        replayed = client.post(f"/sessions/{session_id}/stop", headers={"Idempotency-Key": "stop-1"})
+        
+        assert replayed.status_code == 200
+        assert replayed.json()["version"] == stopped.json()["version"]
+    
+    def test_idempotency_key_reused_for_other_request(self, client):
+        headers = {"Idempotency-Key": "same-key"}
+        client.post("/sessions/start", json={"task_name": "作業A"}, headers=headers)
+        
+        response = client.post("/sessions/start", json={"task_name": "作業B"}, headers=headers)
+        
+        assert response.status_code == 422
+    
+    def test_failed_requests_are_not_cached(self, client):
+        headers = {"Idempotency-Key": "stop-missing"}
+        
+        assert client.post("/sessions/missing/stop", headers=headers).status_code == 404
+        assert client.post("/sessions/missing/stop", headers=headers).status_code == 404
+    
+    def test_heartbeat(self, client):
+        session_id = client.post("/sessions/start", json={"task_name": "作業A"}).json()["id"]
+        
+        assert client.post(f"/sessions/{session_id}/heartbeat").status_code == 204
+        assert client.post("/sessions/missing/heartbeat").status_code == 404
+        assert client.post(f"/sessions/{session_id}/heartbeat", headers={"X-User-Id": "bob"}).status_code == 404
@@ -0,0 +1,177 @@
+import pytest
+from classification_cache import ClassificationCache, SqliteClassificationCache, create_classification_cache, normalize_task_name
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestNormalizeTaskName:
+    
+    def test_width_case_and_whitespace_are_ignored(self):
+        assert normalize_task_name("  ＡＰＩ　 実装 ") == normalize_task_name("api 実装")
+    
+    def test_different_names_stay_different(self):
+        assert normalize_task_name("API実装") != normalize_task_name("API設計")
+
+
+class TestClassificationCache:
+    
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+    
+    @pytest.fixture
+    def cache(self, clock):
+        return ClassificationCache(max_entries=2, ttl_seconds=60, clock=clock)
+    
+    def test_get_counts_hits_and_misses(self, cache):
+        assert cache.get("a") is None
+        cache.put("a", ("プロジェクトA", "開発"))
+        
+        assert cache.get("a") == ("プロジェクトA", "開発")
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    
+    def test_least_recently_used_entry_is_evicted(self, cache):
+        cache.put("a", ("A", "開発"))
+        cache.put("b", ("B", "開発"))
+        cache.get("a")
+        cache.put("c", ("C", "開発"))
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == ("A", "開発")
+        assert cache.get("c") == ("C", "開発")
+        assert cache.stats()["evictions"] == 1
+    
+    def test_entries_expire_after_ttl(self, cache, clock):
+        cache.put("a", ("A", "開発"))
+        clock.now = 59
+        assert cache.get("a") == ("A", "開発")
+        
+        clock.now = 60
+        assert cache.get("a") is None
+        assert len(cache) == 0
+        assert cache.stats()["expirations"] == 1
+    
+    def test_put_refreshes_expiry(self, cache, clock):
+        cache.put("a", ("A", "開発"))
+        clock.now = 50
+        cache.put("a", ("A", "会議"))
+        clock.now = 100
+        
+        assert cache.get("a") == ("A", "会議")
+
+
+class TestSqliteClassificationCache:
+    
+    KEY = ("gemini-2.5-flash", ("プロジェクトA",), "api実装")
+    
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "cache" / "classifications.db")
+    
+    @pytest.fixture
+    def clock(self):
+        clock = FakeClock()
+        clock.now = 1_000_000.0
+        return clock
+    
+    def open_cache(self, path, clock, **options):
+        return SqliteClassificationCache(path, ttl_seconds=60, clock=clock, **options)
+    
+    def test_entries_survive_restart(self, path, clock):
+        cache = self.open_cache(path, clock)
+        cache.put(self.KEY, ("プロジェクトA", "開発"))
+        cache.close()
+        
+        reopened = self.open_cache(path, clock)
+        
+        assert len(reopened) == 1
+        assert reopened.get(self.KEY) == ("プロジェクトA", "開発")
+        assert reopened.stats()["disk_hits"] == 0
+        reopened.close()
+    
+    def test_entries_written_by_another_process_are_read_from_disk(self, path, clock):
+        writer = self.open_cache(path, clock)
+        reader = self.open_cache(path, clock)
+        
+        writer.put(self.KEY, ("プロジェクトA", "開発"))
+        
+        assert reader.get(self.KEY) == ("プロジェクトA", "開発")
+        assert reader.get(self.KEY) == ("プロジェクトA", "開発")
+        stats = reader.stats()
+        assert (stats["hits"], stats["disk_hits"], stats["disk_size"]) == (2, 1, 1)
+        writer.close()
+        reader.close()
+    
+    def test_batched_reads_and_writes(self, path, clock, monkeypatch):
+        monkeypatch.setattr(SqliteClassificationCache, "QUERY_BATCH", 2)
+        writer = self.open_cache(path, clock)
+        reader = self.open_cache(path, clock)
+        keys = [("model", (), name) for name in ["a", "b", "c"]]
+        
+        writer.put_many({key: (key[-1], "開発") for key in keys})
+        found = reader.get_many(keys + [("model", (), "d")])
+        
+        assert found == {key: (key[-1], "開発") for key in keys}
+        stats = reader.stats()
+        assert (stats["misses"], stats["disk_hits"], stats["disk_size"]) == (1, 3, 3)
+        writer.close()
+        reader.close()
+    
+    def test_expired_entries_are_not_loaded(self, path, clock):
+        writer = self.open_cache(path, clock)
+        writer.put(self.KEY, ("プロジェクトA", "開発"))
+        writer.close()
+        
+        clock.now += 60
+        cache = self.open_cache(path, clock)
+        
+        assert len(cache) == 0
+        assert cache.get(self.KEY) is None
+        cache.close()
+    
+    def test_warm_start_loads_most_recently_used_in_lru_order(self, path, clock):
+        cache = self.open_cache(path, clock)
+        for name in ["a", "b", "c"]:
+            clock.now += 1
+            cache.put(("model", (), name), (name, "開発"))
+        cache.close()
+        
+        warm = self.open_cache(path, clock, max_entries=2)
+        
+        assert warm.stats()["size"] == 2
+        warm.put(("model", (), "d"), ("d", "開発"))
+        # 最も古く使われた b がメモリから追い出される（ファイルには残っている）
+        assert list(warm._entries) == [("model", (), "c"), ("model", (), "d")]
+        assert warm.get(("model", (), "b")) == ("b", "開発")
+        warm.close()
+    
+    def test_prune_keeps_most_recently_used_entries(self, path, clock, monkeypatch):
+        monkeypatch.setattr(SqliteClassificationCache, "PRUNE_INTERVAL", 3)
+        cache = self.open_cache(path, clock, max_disk_entries=2)
+        for name in ["a", "b", "c"]:
+            clock.now += 1
+            cache.put(("model", (), name), (name, "開発"))
+        
+        rows = cache._conn.execute("SELECT key FROM classifications ORDER BY last_used").fetchall()
+        
+        assert [row[0] for row in rows] == [cache._encode_key(("model", [], name)) for name in ["b", "c"]]
+        cache.close()
+    
+    def test_factory_uses_database_when_configured(self, path, monkeypatch):
+        monkeypatch.setenv("CLASSIFICATION_CACHE_DB", path)
+        monkeypatch.setenv("CLASSIFICATION_CACHE_SIZE", "50")
+        
+        cache = create_classification_cache()
+        
+        assert isinstance(cache, SqliteClassificationCache)
+        assert cache.max_entries == 50
+        cache.close()
+        monkeypatch.delenv("CLASSIFICATION_CACHE_DB")
+        assert type(create_classification_cache()) is ClassificationCache
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+import httpx
+import pytest
+from gemini_resilience import CircuitBreaker, RetryPolicy, create_circuit_breaker, create_retry_policy, parse_retry_after
+from gemini_service import GeminiRequestError, GeminiService
+from gemini_stub import create_stub_app
+from models import TaskItem
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestParseRetryAfter:
+    
+    def test_seconds(self):
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after("-1") == 0.0
+    
+    def test_http_date(self):
+        now = datetime(2025, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+        assert parse_retry_after("Wed, 01 Jan 2025 00:00:05 GMT", now) == 5.0
+    
+    def test_missing_or_invalid(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+
+class TestRetryPolicy:
+    
+    def test_delay_is_jittered_up_to_capped_exponential_backoff(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0, random_source=lambda: 1.0)
+        
+        assert [policy.delay(attempt) for attempt in range(4)] == [0.5, 1.0, 2.0, 2.0]
+        assert RetryPolicy(random_source=lambda: 0.0).delay(3) == 0.0
+    
+    def test_retry_after_is_a_lower_bound(self):
+        policy = RetryPolicy(base_delay=0.5, random_source=lambda: 1.0)
+        
+        assert policy.delay(0, retry_after=3.0) == 3.0
+        assert policy.delay(0, retry_after=0.1) == 0.5
+    
+    def test_settings_from_environment(self, monkeypatch):
+        monkeypatch.setenv("GEMINI_MAX_RETRIES", "1")
+        monkeypatch.setenv("GEMINI_BREAKER_FAILURES", "2")
+        
+        assert create_retry_policy().max_retries == 1
+        assert create_circuit_breaker().failure_threshold == 2
+
+
+class TestCircuitBreaker:
+    
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+    
+    @pytest.fixture
+    def breaker(self, clock):
+        return CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    
+    def test_opens_after_consecutive_failures(self, breaker):
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        
+        breaker.record_failure()
+        
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+        assert breaker.opened_total == 1
+    
+    def test_half_open_allows_one_trial(self, breaker, clock):
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now = 10
+        
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+    
+    def test_failed_trial_reopens(self, breaker, clock):
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now = 10
+        breaker.allow()
+        
+        breaker.record_failure()
+        
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.opened_total == 2
+        clock.now = 19
+        assert not breaker.allow()
+    
+    def test_abandoned_trial_is_replaced_after_reset_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        assert breaker.allow()
+        
+        clock.now = 19
+        assert not breaker.allow()
+        clock.now = 20
+        assert breaker.allow()
+
+
+class TestGeminiServiceResilience:
+    
+    TASKS = [TaskItem(task_name="API実装", duration_ms=100), TaskItem(task_name="定例会議", duration_ms=50)]
+    
+    def run(self, stub, tasks=None, **options):
+        options.setdefault("retry_policy", RetryPolicy(base_delay=0.001, max_delay=0.01))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta", **options)
+            summaries = [await service.categorize_tasks(batch, []) for batch in (tasks or [self.TASKS])]
+            await client.aclose()
+            return service, summaries
+        
+        return asyncio.run(scenario())
+    
+    def test_transient_failures_are_retried(self):
+        stub = create_stub_app(script=["503", "429"])
+        
+        service, [summary] = self.run(stub)
+        
+        assert stub.state.requests == 3
+        assert service.retries == 2
+        assert service.fallbacks == 0
+        assert len(service.cache) == 2
+        assert sum(c.total_duration_ms for c in summary.categories) == 150
+    
+    def test_retry_after_is_honored(self):
+        stub = create_stub_app(script=["503", "503"], retry_after=0.05)
+        
+        started = time.perf_counter()
+        self.run(stub)
+        
+        assert time.perf_counter() - started >= 0.1
+        assert stub.state.requests == 3
+    
+    def test_exhausted_retries_fall_back_to_local_rules_without_caching(self):
+        stub = create_stub_app(failure_rate=1.0)
+        
+        service, [summary] = self.run(stub, retry_policy=RetryPolicy(max_retries=2, base_delay=0.001))
+        
+        assert stub.state.requests == 3
+        assert service.fallbacks == 1
+        assert len(service.cache) == 0
+        assert [(c.subcategory, c.total_duration_ms) for c in summary.categories] == [("開発", 100), ("会議", 50)]
+    
+    def test_open_circuit_skips_upstream(self):
+        stub = create_stub_app(failure_rate=1.0)
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        batches = [self.TASKS, [TaskItem(task_name="資料作成", duration_ms=10)]]
+        
+        service, summaries = self.run(stub, batches, breaker=breaker)
+        
+        assert stub.state.requests == 3
+        assert breaker.state == CircuitBreaker.OPEN
+        assert service.fallbacks == 2
+        assert summaries[1].categories[0].subcategory == "ドキュメント作成"
+    
+    @pytest.mark.parametrize("status", ["400", "401", "403"])
+    def test_client_errors_are_raised_without_retry_or_fallback(self, status):
+        stub = create_stub_app(script=[status])
+        breaker = CircuitBreaker()
+        
+        with pytest.raises(GeminiRequestError, match=status):
+            self.run(stub, breaker=breaker)
+        
+        assert stub.state.requests == 1
+        assert breaker.state == CircuitBreaker.CLOSED
+    
+    def test_client_error_cancels_remaining_chunks(self):
+        stub = create_stub_app(script=["401"], latency=0.02)
+        tasks = [TaskItem(task_name=f"作業{i}", duration_ms=10) for i in range(3)]
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+            service = GeminiService(
+                "key", "test-model", client, api_base="http://stub/v1beta", chunk_tokens=1, max_concurrency=1
+            )
+            with pytest.raises(GeminiRequestError):
+                await service.categorize_tasks(tasks, [])
+            # 要求が失敗した後に、残りのチャンクが問い合わせを続けていないこと
+            failed_at = stub.state.requests
+            await asyncio.sleep(0.1)
+            await client.aclose()
+            return service, failed_at
+        
+        service, failed_at = asyncio.run(scenario())
+        
+        assert stub.state.requests == failed_at < len(tasks)
+        assert len(service.cache) == 0
+    
+    def test_deadline_bounds_total_wait(self):
+        stub = create_stub_app(latency=0.5)
+        
+        started = time.perf_counter()
+        service, [summary] = self.run(stub, deadline_seconds=0.05)
+        
+        assert time.perf_counter() - started < 0.4
+        assert service.fallbacks == 1
+        assert sum(c.total_duration_ms for c in summary.categories) == 150
+    
+    def test_truncated_reply_falls_back(self):
+        stub = create_stub_app(script=["malformed"])
+        
+        service, [summary] = self.run(stub)
+        
+        assert service.fallbacks == 1
+        assert len(service.cache) == 0
+        assert sum(c.total_duration_ms for c in summary.categories) == 150
+    
+    def test_streaming_endpoint_is_retried_and_truncation_falls_back(self):
+        stub = create_stub_app(script=["503", "malformed"], piece_size=8)
+        batches = [self.TASKS, [TaskItem(task_name="資料作成", duration_ms=10)]]
+        
+        service, summaries = self.run(stub, batches, streaming=True)
+        
+        assert stub.state.requests == 3
+        assert service.retries == 1
+        assert sum(c.total_duration_ms for c in summaries[0].categories) == 150
+        assert summaries[1].categories[0].subcategory == "ドキュメント作成"
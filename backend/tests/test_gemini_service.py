@@ -0,0 +1,488 @@
+import asyncio
+import json
+import httpx
+import pytest
+from gemini_service import GeminiService, aggregate_tasks, create_gemini_http_client
+from classification_cache import ClassificationCache
+from local_classifier import LocalClassifier
+from models import TaskItem
+
+
+def gemini_reply(categories):
+    text = json.dumps({"categories": categories}, ensure_ascii=False)
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class TestGeminiService:
+    
+    @pytest.fixture
+    def requests(self):
+        return []
+    
+    @pytest.fixture
+    def transport(self, requests):
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "プロジェクトA", "subcategory": "開発", "tasks": ["API実装"]}
+            ]))
+        return httpx.MockTransport(handler)
+    
+    def test_shared_client_is_reused_and_left_open(self, transport, requests):
+        async def scenario():
+            client = httpx.AsyncClient(transport=transport)
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            tasks = [TaskItem(task_name="API実装", duration_ms=1000)]
+            
+            first = await service.categorize_tasks(tasks, ["プロジェクトA"])
+            await service.categorize_tasks([TaskItem(task_name="API設計", duration_ms=500)], ["プロジェクトA"])
+            await service.aclose()
+            
+            assert not client.is_closed
+            await client.aclose()
+            return first
+        
+        summary = asyncio.run(scenario())
+        
+        assert summary.categories[0].total_duration_ms == 1000
+        assert len(requests) == 2
+        assert str(requests[0].url) == "http://stub/v1beta/models/test-model:generateContent?key=key"
+    
+    def test_service_without_client_creates_and_closes_its_own(self):
+        async def scenario():
+            service = GeminiService("key")
+            client = service._get_client()
+            assert service._get_client() is client
+            await service.aclose()
+            return client
+        
+        assert asyncio.run(scenario()).is_closed
+    
+    def test_http_client_limits_from_environment(self, monkeypatch):
+        monkeypatch.setenv("GEMINI_MAX_CONNECTIONS", "7")
+        monkeypatch.setenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "3")
+        
+        client = create_gemini_http_client()
+        
+        pool = client._transport._pool
+        assert pool._max_connections == 7
+        assert pool._max_keepalive_connections == 3
+        asyncio.run(client.aclose())
+    
+    def test_cached_names_are_not_sent_again(self, requests):
+        replies = [
+            [{"category": "プロジェクトA", "subcategory": "開発", "tasks": ["API実装 (1000ms)"]}],
+            [{"category": "プロジェクトA", "subcategory": "設計", "tasks": ["API設計"]}],
+        ]
+        
+        def handler(request):
+            requests.append(json.loads(request.content)["contents"][0]["parts"][0]["text"])
+            return httpx.Response(200, json=gemini_reply(replies[len(requests) - 1]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            await service.categorize_tasks([TaskItem(task_name="API実装", duration_ms=1000)], ["プロジェクトA"])
+            summary = await service.categorize_tasks([
+                TaskItem(task_name="ＡＰＩ実装", duration_ms=2000),
+                TaskItem(task_name="API設計", duration_ms=500),
+                TaskItem(task_name="API実装", duration_ms=300),
+            ], ["プロジェクトA"])
+            await client.aclose()
+            return service, summary
+        
+        service, summary = asyncio.run(scenario())
+        
+        assert len(requests) == 2
+        assert "API実装" not in requests[1]
+        assert [(c.subcategory, c.total_duration_ms) for c in summary.categories] == [("開発", 2300), ("設計", 500)]
+        assert service.cache.stats()["hits"] == 1
+    
+    def test_unparseable_reply_is_not_cached(self, requests):
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "分類できません"}]}}]})
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            tasks = [TaskItem(task_name="資料作成", duration_ms=1000)]
+            first = await service.categorize_tasks(tasks, [])
+            await service.categorize_tasks(tasks, [])
+            await client.aclose()
+            return first
+        
+        summary = asyncio.run(scenario())
+        
+        assert len(requests) == 2
+        assert (summary.categories[0].category, summary.categories[0].total_duration_ms) == ("その他", 1000)
+
+
+def prompt_tasks(request):
+    # プロンプトの作業リスト（"- 作業名" の行）から作業名を取り出す
+    prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+    return [line[2:] for line in prompt.splitlines() if line.startswith("- ")]
+
+
+class TestChunkedClassification:
+    
+    def test_large_inputs_are_split_into_budgeted_chunks(self):
+        service = GeminiService("key", chunk_tokens=20)
+        tasks = [TaskItem(task_name=f"作業{index:02d}", duration_ms=100) for index in range(10)]
+        
+        chunks = service._chunk(tasks)
+        
+        # 1 件あたり 4 文字 + 4 トークンなので 2 件ずつ
+        assert [len(chunk) for chunk in chunks] == [2, 2, 2, 2, 2]
+        assert [task for chunk in chunks for task in chunk] == tasks
+    
+    def test_task_longer_than_budget_gets_its_own_chunk(self):
+        service = GeminiService("key", chunk_tokens=10)
+        tasks = [TaskItem(task_name="とても長い作業名の作業", duration_ms=100), TaskItem(task_name="短い", duration_ms=100)]
+        
+        assert [len(chunk) for chunk in service._chunk(tasks)] == [1, 1]
+    
+    def test_chunks_run_concurrently_up_to_limit_and_merge(self):
+        in_flight = []
+        peak = []
+        
+        async def handler(request):
+            names = prompt_tasks(request)
+            in_flight.append(request)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(request)
+            # チャンクごとに表記が揺れても 1 つの項目にまとまる
+            spelling = "プロジェクトａ" if len(peak) % 2 else "プロジェクトA"
+            return httpx.Response(200, json=gemini_reply([
+                {"category": spelling, "subcategory": "開発", "tasks": names}
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService(
+                "key", "test-model", client, api_base="http://stub/v1beta", chunk_tokens=40, max_concurrency=3
+            )
+            tasks = [TaskItem(task_name=f"作業{index:03d}", duration_ms=10) for index in range(60)]
+            summary = await service.categorize_tasks(tasks, ["プロジェクトA"])
+            await client.aclose()
+            return summary
+        
+        summary = asyncio.run(scenario())
+        
+        assert len(peak) == 15
+        assert max(peak) == 3
+        assert [(c.category, c.subcategory, c.total_duration_ms) for c in summary.categories] == [
+            ("プロジェクトA", "開発", 600)
+        ]
+    
+    def test_unparseable_chunk_falls_back_without_affecting_others(self):
+        def handler(request):
+            names = prompt_tasks(request)
+            if "会議" in names:
+                return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": '{"categories": [{"cat'}]}}]})
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "プロジェクトA", "subcategory": "開発", "tasks": names}
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta", chunk_tokens=6)
+            summary = await service.categorize_tasks([
+                TaskItem(task_name="API実装", duration_ms=100),
+                TaskItem(task_name="会議", duration_ms=50),
+            ], ["プロジェクトA"])
+            await client.aclose()
+            return summary
+        
+        summary = asyncio.run(scenario())
+        
+        assert [(c.category, c.subcategory, c.total_duration_ms) for c in summary.categories] == [
+            ("プロジェクトA", "開発", 100), ("その他", "会議", 50)
+        ]
+
+
+class TestTaskAggregation:
+    
+    def test_durations_are_summed_per_normalized_name(self):
+        tasks = [
+            TaskItem(task_name="API実装", duration_ms=100),
+            TaskItem(task_name="会議", duration_ms=30),
+            TaskItem(task_name="ＡＰＩ実装", duration_ms=200),
+        ]
+        
+        aggregated = aggregate_tasks(tasks)
+        
+        assert [(task.task_name, task.duration_ms) for task in aggregated] == [("API実装", 300), ("会議", 30)]
+        assert tasks[0].duration_ms == 100
+    
+    def test_prompt_lists_each_name_once_without_durations(self):
+        prompts = []
+        
+        def handler(request):
+            prompts.append(prompt_tasks(request))
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "プロジェクトA", "subcategory": "開発", "tasks": ["API実装 (300ms)"]},
+                {"category": "その他", "subcategory": "会議", "tasks": ["定例 (週次)"]},
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            summary = await service.categorize_tasks([
+                TaskItem(task_name="API実装", duration_ms=100),
+                TaskItem(task_name="定例 (週次)", duration_ms=30),
+                TaskItem(task_name="API実装", duration_ms=200),
+                TaskItem(task_name="定例 (週次)", duration_ms=30),
+            ], ["プロジェクトA"])
+            await client.aclose()
+            return summary
+        
+        summary = asyncio.run(scenario())
+        
+        assert prompts == [["API実装", "定例 (週次)"]]
+        assert [(c.category, c.subcategory, c.total_duration_ms) for c in summary.categories] == [
+            ("プロジェクトA", "開発", 300), ("その他", "会議", 60)
+        ]
+    
+    def test_mock_totals_include_every_occurrence(self):
+        summary = asyncio.run(GeminiService().categorize_tasks([
+            TaskItem(task_name="API実装", duration_ms=100),
+            TaskItem(task_name="API実装", duration_ms=200),
+            TaskItem(task_name="API開発", duration_ms=50),
+        ]))
+        
+        assert [(c.subcategory, c.total_duration_ms) for c in summary.categories] == [("開発", 350)]
+
+
+class TestCoalescing:
+    
+    def test_identical_concurrent_requests_share_one_upstream_call(self):
+        prompts = []
+        
+        async def handler(request):
+            names = prompt_tasks(request)
+            prompts.append(names)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "プロジェクトA", "subcategory": "開発", "tasks": names}
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            summaries = await asyncio.gather(
+                service.categorize_tasks([
+                    TaskItem(task_name="API実装", duration_ms=100), TaskItem(task_name="API設計", duration_ms=10)
+                ], ["プロジェクトA"]),
+                service.categorize_tasks([
+                    TaskItem(task_name="api設計", duration_ms=20), TaskItem(task_name="API実装", duration_ms=200)
+                ], ["プロジェクトA"]),
+            )
+            await client.aclose()
+            return service, summaries
+        
+        service, summaries = asyncio.run(scenario())
+        
+        assert len(prompts) == 1
+        assert service._in_flight.coalesced == 1
+        assert [summary.categories[0].total_duration_ms for summary in summaries] == [110, 220]
+    
+    def test_disconnected_client_does_not_fail_other_waiters(self):
+        async def handler(request):
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "その他", "subcategory": "会議", "tasks": prompt_tasks(request)}
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta")
+            tasks = [TaskItem(task_name="定例", duration_ms=30)]
+            first = asyncio.ensure_future(service.categorize_tasks(tasks, []))
+            second = asyncio.ensure_future(service.categorize_tasks(tasks, []))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            summary = await second
+            await client.aclose()
+            return first, summary
+        
+        first, summary = asyncio.run(scenario())
+        
+        assert first.cancelled()
+        assert summary.categories[0].total_duration_ms == 30
+
+
+def sse_candidate(text):
+    return f"data: {json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]}, ensure_ascii=False)}\r\n\r\n".encode()
+
+
+class TestStreamingClassification:
+    
+    REPLY = json.dumps({"categories": [
+        {"category": "プロジェクトA", "subcategory": "開発", "tasks": ["API実装"]},
+        {"category": "その他", "subcategory": "会議", "tasks": ["定例"]},
+    ]}, ensure_ascii=False)
+    TASKS = [TaskItem(task_name="API実装", duration_ms=100), TaskItem(task_name="定例", duration_ms=30)]
+    
+    def service(self, handler, **options):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return GeminiService("key", "test-model", client, api_base="http://stub/v1beta", streaming=True, **options)
+    
+    def test_categories_are_reported_before_generation_finishes(self):
+        requests = []
+        first_reported = asyncio.Event()
+        split = self.REPLY.index('{"category": "その他"')
+        
+        async def body():
+            yield sse_candidate(self.REPLY[:split])
+            # 1 つ目のカテゴリが呼び出し元に届くまで、残りの生成を止めておく
+            await asyncio.wait_for(first_reported.wait(), timeout=1)
+            yield sse_candidate(self.REPLY[split:])
+        
+        async def handler(request):
+            requests.append(request)
+            return httpx.Response(200, content=body(), headers={"Content-Type": "text/event-stream"})
+        
+        async def scenario():
+            service = self.service(handler)
+            batches = []
+            
+            def on_classified(batch):
+                batches.append(batch)
+                first_reported.set()
+            
+            summary = await service.categorize_tasks(self.TASKS, ["プロジェクトA"], on_classified)
+            return service, batches, summary
+        
+        service, batches, summary = asyncio.run(scenario())
+        
+        assert str(requests[0].url) == "http://stub/v1beta/models/test-model:streamGenerateContent?alt=sse&key=key"
+        config = json.loads(requests[0].content)["generationConfig"]
+        assert config["responseMimeType"] == "application/json"
+        assert config["responseSchema"]["properties"]["categories"]["items"]["properties"]["category"]["enum"] == [
+            "プロジェクトA", "その他"
+        ]
+        assert batches == [{"api実装": ("プロジェクトA", "開発")}, {"定例": ("その他", "会議")}]
+        assert [(c.category, c.total_duration_ms) for c in summary.categories] == [("プロジェクトA", 100), ("その他", 30)]
+        assert len(service.cache) == 2
+    
+    def test_interrupted_stream_keeps_received_categories(self):
+        split = self.REPLY.index('{"category": "その他"')
+        
+        async def body():
+            yield sse_candidate(self.REPLY[:split])
+            raise httpx.ReadError("connection reset")
+        
+        async def handler(request):
+            return httpx.Response(200, content=body())
+        
+        async def scenario():
+            service = self.service(handler)
+            return service, await service.categorize_tasks(self.TASKS, ["プロジェクトA"])
+        
+        service, summary = asyncio.run(scenario())
+        
+        assert [(c.category, c.subcategory) for c in summary.categories] == [("プロジェクトA", "開発"), ("その他", "一般作業")]
+        assert service.fallbacks == 1
+        assert len(service.cache) == 1
+    
+    def test_stream_categories_yields_running_totals(self):
+        async def handler(request):
+            return httpx.Response(200, content=sse_candidate(self.REPLY))
+        
+        async def scenario():
+            service = self.service(handler)
+            service.cache.put(service._cache_key("api設計", ["プロジェクトA"]), ("プロジェクトA", "開発"))
+            tasks = self.TASKS + [TaskItem(task_name="API設計", duration_ms=5)]
+            return [item async for item in service.stream_categories(tasks, ["プロジェクトA"])]
+        
+        items = asyncio.run(scenario())
+        
+        # キャッシュにあった分が先に届き、同じ項目は合計が増えて再送される
+        assert [(item.subcategory, item.total_duration_ms) for item in items] == [("開発", 5), ("開発", 105), ("会議", 30)]
+
+
+class TestRuleTier:
+    
+    def test_confident_names_are_not_sent_to_gemini(self):
+        prompts = []
+        
+        def handler(request):
+            prompts.append(prompt_tasks(request))
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "その他", "subcategory": "一般作業", "tasks": ["メール返信"]}
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService("key", "test-model", client, api_base="http://stub/v1beta", rule_confidence=1.0)
+            summary = await service.categorize_tasks([
+                TaskItem(task_name="プロジェクトAのAPI実装", duration_ms=100),
+                TaskItem(task_name="メール返信", duration_ms=30),
+            ], ["プロジェクトA"])
+            await client.aclose()
+            return service, summary
+        
+        service, summary = asyncio.run(scenario())
+        
+        assert prompts == [["メール返信"]]
+        assert [(c.category, c.subcategory, c.total_duration_ms) for c in summary.categories] == [
+            ("プロジェクトA", "開発", 100), ("その他", "一般作業", 30)
+        ]
+        assert service.upstream_stats()["rule_classified"] == 1
+        assert len(service.cache) == 1
+
+
+class TestLocalClassifierTier:
+    
+    def test_learns_from_gemini_and_answers_similar_names_locally(self):
+        prompts = []
+        
+        def handler(request):
+            names = prompt_tasks(request)
+            prompts.append(names)
+            return httpx.Response(200, json=gemini_reply([
+                {"category": "プロジェクトA", "subcategory": "開発", "tasks": [name for name in names if "実装" in name]},
+                {"category": "その他", "subcategory": "会議", "tasks": [name for name in names if "実装" not in name]},
+            ]))
+        
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            service = GeminiService(
+                "key", "test-model", client, api_base="http://stub/v1beta",
+                learner=LocalClassifier(dims=1024), local_confidence=0.1
+            )
+            await service.categorize_tasks([
+                TaskItem(task_name=name, duration_ms=10)
+                for name in ["API実装", "画面実装", "ログイン実装", "週次ミーティング", "定例ミーティング", "顧客ミーティング"]
+            ], ["プロジェクトA"])
+            summary = await service.categorize_tasks([
+                TaskItem(task_name="バッチ実装", duration_ms=100),
+                TaskItem(task_name="月次ミーティング", duration_ms=30),
+                TaskItem(task_name="経費精算", duration_ms=20),
+            ], ["プロジェクトA"])
+            await client.aclose()
+            return service, summary
+        
+        service, summary = asyncio.run(scenario())
+        
+        assert len(prompts) == 2
+        assert "バッチ実装" not in prompts[1] and "月次ミーティング" not in prompts[1]
+        assert ("プロジェクトA", "開発", 100) in [(c.category, c.subcategory, c.total_duration_ms) for c in summary.categories]
+        stats = service.local_stats()
+        assert stats["examples"] == 6 + len(prompts[1])
+        assert stats["served"] == 2
+        assert stats["served_fraction"] == pytest.approx(2 / (6 + 3))
+        # 手元の予測はキャッシュしない
+        assert len(service.cache) == 6 + len(prompts[1])
+    
+    def test_learner_starts_from_cached_results(self):
+        cache = ClassificationCache()
+        for name in ["api実装", "画面実装", "ログイン実装"]:
+            cache.put(("test-model", (), name), ("その他", "開発"))
+        
+        service = GeminiService("key", "test-model", cache=cache, learner=LocalClassifier(dims=1024))
+        
+        assert service.local_stats()["examples"] == 3
+        assert service.local_stats()["threshold"] is None
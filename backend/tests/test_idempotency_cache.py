@@ -0,0 +1,57 @@
+import pytest
+from idempotency_cache import IdempotencyCache
+
+
+class FakeClock:
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyCache:
+    
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+    
+    @pytest.fixture
+    def cache(self, clock):
+        return IdempotencyCache(max_entries=2, ttl_seconds=10, clock=clock)
+    
+    def test_returns_stored_response(self, cache):
+        cache.put("alice", "key-1", "POST /sessions/start", 201, {"id": "s1"}, {"ETag": '"1"'})
+        
+        cached = cache.get("alice", "key-1", "POST /sessions/start")
+        
+        assert cached.status_code == 201
+        assert cached.body == {"id": "s1"}
+        assert cached.headers == {"ETag": '"1"'}
+    
+    def test_keys_are_scoped_per_user(self, cache):
+        cache.put("alice", "key-1", "POST /sessions/start", 201, {"id": "s1"})
+        
+        assert cache.get("bob", "key-1", "POST /sessions/start") is None
+    
+    def test_reused_key_with_different_request_raises(self, cache):
+        cache.put("alice", "key-1", "POST /sessions/start", 201, {"id": "s1"})
+        
+        with pytest.raises(ValueError, match="Idempotency key reused"):
+            cache.get("alice", "key-1", "POST /sessions/s1/stop")
+    
+    def test_entries_expire_after_ttl(self, cache, clock):
+        cache.put("alice", "key-1", "fp", 201, {})
+        clock.now = 10
+        
+        assert cache.get("alice", "key-1", "fp") is None
+        assert len(cache) == 0
+    
+    def test_oldest_entries_are_dropped_beyond_max_entries(self, cache):
+        for key in ("key-1", "key-2", "key-3"):
+            cache.put("alice", key, "fp", 201, {})
+        
+        assert len(cache) == 2
+        assert cache.get("alice", "key-1", "fp") is None
+        assert cache.get("alice", "key-3", "fp") is not None
@@ -0,0 +1,38 @@
+import json
+import pytest
+from json_stream import JsonArrayItemParser
+
+
+DOCUMENT = json.dumps({"categories": [
+    {"category": "プロジェクトA", "subcategory": "開発", "tasks": ["API実装", "括弧 { [ を含む \"作業\""]},
+    {"category": "その他", "subcategory": "会議", "tasks": ["定例\\議事録"]},
+]}, ensure_ascii=False)
+
+
+class TestJsonArrayItemParser:
+    
+    @pytest.mark.parametrize("piece_size", [1, 3, 7, len(DOCUMENT)])
+    def test_items_are_returned_as_they_close(self, piece_size):
+        parser = JsonArrayItemParser()
+        items = []
+        for start in range(0, len(DOCUMENT), piece_size):
+            items.extend(parser.feed(DOCUMENT[start:start + piece_size]))
+        
+        assert items == json.loads(DOCUMENT)["categories"]
+    
+    def test_first_item_is_available_before_document_ends(self):
+        parser = JsonArrayItemParser()
+        second = DOCUMENT.index('{"category": "その他"')
+        
+        assert parser.feed(DOCUMENT[:second]) == [json.loads(DOCUMENT)["categories"][0]]
+        assert len(parser.feed(DOCUMENT[second:])) == 1
+    
+    def test_truncated_document_keeps_closed_items(self):
+        parser = JsonArrayItemParser()
+        
+        items = parser.feed(DOCUMENT[:-20])
+        
+        assert [item["subcategory"] for item in items] == ["開発"]
+    
+    def test_text_without_array_yields_nothing(self):
+        assert JsonArrayItemParser().feed("分類できません {}") == []
@@ -0,0 +1,82 @@
+import pytest
+from local_classifier import LocalClassifier, create_local_classifier, hash_ngrams
+
+
+TRAINING = {
+    "api実装": ("プロジェクトa", "開発"),
+    "画面実装": ("プロジェクトa", "開発"),
+    "ログイン実装": ("プロジェクトa", "開発"),
+    "週次ミーティング": ("その他", "会議"),
+    "定例ミーティング": ("その他", "会議"),
+    "顧客ミーティング": ("その他", "会議"),
+}
+
+
+class TestHashNgrams:
+    
+    def test_features_are_stable_and_normalized(self):
+        indices, weights = hash_ngrams("api実装", 4096)
+        again, _ = hash_ngrams("api実装", 4096)
+        
+        assert indices.tolist() == again.tolist()
+        assert len(set(indices.tolist())) == len(indices)
+        assert indices.max() < 4096
+        assert (weights ** 2).sum() == pytest.approx(1.0)
+
+
+class TestLocalClassifier:
+    
+    @pytest.fixture
+    def learner(self):
+        learner = LocalClassifier(dims=1024)
+        learner.add_many(TRAINING)
+        return learner
+    
+    def test_predicts_label_of_similar_names(self, learner):
+        (development, meeting) = learner.predict_many(["バッチ実装", "月次ミーティング"], ["プロジェクトA"])
+        
+        assert development[:2] == ("プロジェクトa", "開発")
+        assert meeting[:2] == ("その他", "会議")
+        assert 0 < development[2] <= 1
+    
+    def test_confidence_is_lower_for_ambiguous_names(self, learner):
+        clear, ambiguous = learner.predict_many(["画面実装", "実装ミーティング"], ["プロジェクトA"])
+        
+        assert ambiguous[2] < clear[2]
+    
+    def test_labels_need_min_examples(self):
+        learner = LocalClassifier(dims=1024, min_examples=3)
+        learner.add_many({name: ("その他", "会議") for name in ("週次ミーティング", "定例ミーティング", "顧客ミーティング")})
+        learner.add_many({"api実装": ("その他", "開発"), "画面実装": ("その他", "開発")})
+        
+        assert learner.predict_many(["バッチ実装"], []) == [None]
+        
+        learner.add("ログイン実装", ("その他", "開発"))
+        assert learner.predict_many(["バッチ実装"], [])[0][:2] == ("その他", "開発")
+    
+    def test_projects_outside_the_request_are_not_candidates(self, learner):
+        learner.add_many({"api調査": ("その他", "調査"), "画面調査": ("その他", "調査"), "ログイン調査": ("その他", "調査")})
+        
+        prediction, = learner.predict_many(["バッチ実装"], ["プロジェクトB"])
+        
+        assert prediction[:2] in {("その他", "会議"), ("その他", "調査")}
+        assert learner.predict_many([], ["プロジェクトB"]) == []
+    
+    def test_single_candidate_is_not_predicted(self, learner):
+        # 比べる相手がないと、似ていない作業名でも類似度がそのまま確信度になってしまう
+        assert learner.predict_many(["会議室予約システムの実装"], ["プロジェクトB"]) == [None]
+    
+    def test_relabeled_name_moves_to_new_label(self, learner):
+        learner.add("api実装", ("その他", "会議"))
+        learner.add("api実装", ("その他", "会議"))
+        
+        assert learner.stats() == {"examples": 6, "labels": 2, "dims": 1024}
+        assert learner._counts.tolist() == [2, 4]
+    
+    def test_create_from_environment(self, monkeypatch):
+        monkeypatch.setenv("LOCAL_CLASSIFIER_DIMS", "256")
+        monkeypatch.setenv("LOCAL_CLASSIFIER_MIN_EXAMPLES", "5")
+        
+        learner = create_local_classifier()
+        
+        assert (learner.dims, learner.min_examples) == (256, 5)
@@ -23,4 +23,70 @@ def test_health_check(client):
 def test_docs_endpoint(client):
     response = client.get("/docs")
     assert response.status_code == 200
-    assert "text/html" in response.headers["content-type"]
\ No newline at end of file
+    assert "text/html" in response.headers["content-type"]
+
+
+def test_lifespan_shares_and_closes_gemini_client():
+    import main
+    
+    with TestClient(app):
+        shared_client = main._gemini_http_client
+        assert shared_client is not None
+        assert main.get_gemini_service()._client is shared_client
+    
+    assert shared_client.is_closed
+    assert main._gemini_http_client is None
+
+
+def test_classification_cache_stats(client, monkeypatch):
+    import main
+    
+    monkeypatch.setenv("CLASSIFICATION_CACHE_SIZE", "5")
+    monkeypatch.delenv("CLASSIFICATION_CACHE_DB", raising=False)
+    main.reset_gemini_service()
+    response = client.get("/summary/cache/stats")
+    main.reset_gemini_service()
+    
+    assert response.status_code == 200
+    assert response.json() == {
+        "size": 0, "max_entries": 5, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+        "disk_hits": None, "disk_size": None
+    }
+
+
+def test_gemini_upstream_stats(client):
+    response = client.get("/summary/upstream/stats")
+    
+    assert response.status_code == 200
+    assert response.json()["circuit_state"] == "closed"
+
+
+def test_local_classifier_stats(client):
+    response = client.get("/summary/local-model/stats")
+    
+    assert response.status_code == 200
+    assert set(response.json()) == {"examples", "labels", "dims", "threshold", "served", "deferred", "served_fraction"}
+
+
+def test_stream_summary_sends_categories_then_done(client, monkeypatch):
+    import json
+    import main
+    
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    main.reset_gemini_service()
+    response = client.post("/summary/generate/stream", json={
+        "sessions": [
+            {"task_name": "API実装", "duration_ms": 100},
+            {"task_name": "定例会議", "duration_ms": 30},
+            {"task_name": "API実装", "duration_ms": 50},
+        ],
+        "projects": []
+    })
+    main.reset_gemini_service()
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n", 1) for block in response.text.strip().split("\n\n")]
+    assert [name for name, _ in events] == ["event: category", "event: category", "event: done"]
+    done = json.loads(events[-1][1][len("data: "):])
+    assert [(c["subcategory"], c["total_duration_ms"]) for c in done["categories"]] == [("開発", 150), ("会議", 30)]
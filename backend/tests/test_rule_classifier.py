@@ -0,0 +1,80 @@
+import json
+import pytest
+from rule_classifier import DEFAULT_RULES, RuleClassifier, create_rule_classifier, load_rules
+
+
+class TestRuleClassifier:
+    
+    @pytest.fixture
+    def rules(self):
+        return RuleClassifier()
+    
+    @pytest.mark.parametrize("name, expected", [
+        ("api実装", ("その他", "開発")),
+        ("プロジェクトaのテスト", ("プロジェクトa", "テスト")),
+        ("週次ミーティング", ("その他", "会議")),
+        ("新技術の調査", ("その他", "学習")),
+        ("画面design", ("その他", "設計")),
+        ("資料作成", ("その他", "ドキュメント作成")),
+        ("メール返信", ("その他", "一般作業")),
+    ])
+    def test_matches_keyword_rules(self, rules, name, expected):
+        category, subcategory, _ = rules.classify(name, ["プロジェクトa"] if "プロジェクトa" in name else [])
+        
+        assert (category, subcategory) == expected
+    
+    def test_earlier_subcategory_and_project_win(self, rules):
+        # 「テスト」と「開発」の両方を含む場合は一覧で先にある「開発」、複数のプロジェクトなら先にあるもの
+        assert rules.classify("bのテストコード aの作業", ["a", "b"])[:2] == ("a", "開発")
+    
+    def test_overlapping_patterns_are_all_found(self):
+        rules = RuleClassifier({
+            "subcategories": [
+                {"name": "長い", "keywords": ["abcd"]},
+                {"name": "短い", "keywords": ["bc"]},
+            ],
+        })
+        
+        assert rules.classify("xabcdx", [])[1] == "長い"
+        assert rules.classify("xabcx", [])[1] == "短い"
+    
+    def test_project_aliases(self):
+        rules = RuleClassifier({**DEFAULT_RULES, "project_aliases": {"Task Tracker": ["TT"]}})
+        
+        assert rules.classify("ttの実装", ["Task Tracker"])[:2] == ("Task Tracker", "開発")
+        assert rules.classify("task trackerの実装", ["Task Tracker"])[:2] == ("Task Tracker", "開発")
+    
+    def test_confidence(self, rules):
+        assert rules.classify("aの実装", ["a"])[2] == 1.0
+        assert rules.classify("実装", [])[2] == 1.0
+        assert rules.classify("実装", ["a"])[2] == 0.5
+        assert rules.classify("aのテストコード", ["a"])[2] == 0.75
+        assert rules.classify("メール返信", ["a"])[2] == 0.0
+    
+    def test_classify_many_matches_classify(self, rules):
+        names = ["aの実装", "会議", "aの実装", "メール返信"]
+        
+        assert rules.classify_many(names, ["a"]) == [rules.classify(name, ["a"]) for name in names]
+    
+    def test_automata_are_reused_per_project_list(self):
+        rules = RuleClassifier(max_compiled=2)
+        first = rules._automaton(["a"])
+        
+        assert rules._automaton(["a"]) is first
+        rules._automaton(["b"])
+        rules._automaton(["c"])
+        assert rules._automaton(["a"]) is not first
+    
+    def test_load_rules_merges_with_defaults(self, tmp_path, monkeypatch):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({
+            "subcategories": [{"name": "レビュー", "keywords": ["レビュー", "review"]}],
+        }, ensure_ascii=False), encoding="utf-8")
+        
+        rules = load_rules(str(path))
+        assert rules["default_subcategory"] == "一般作業"
+        
+        monkeypatch.setenv("CLASSIFICATION_RULES_PATH", str(path))
+        classifier = create_rule_classifier()
+        assert classifier.classify("コードreview", [])[1] == "レビュー"
+        assert classifier.classify("実装", [])[1] == "一般作業"
@@ -0,0 +1,92 @@
+import uuid
+import pytest
+from datetime import datetime, timezone, timedelta
+from models import Session, SessionCreate, SessionStatus, SessionSegment
+from session_archive import SessionArchive
+from session_service import SessionService
+
+
+def make_stopped_session(task_name="アーカイブ対象", **overrides):
+    start_time = datetime(2025, 7, 1, 9, 0, 0, 123456, tzinfo=timezone.utc)
+    values = dict(
+        id=str(uuid.uuid4()),
+        user_id="alice",
+        task_name=task_name,
+        status=SessionStatus.STOPPED,
+        start_time=start_time,
+        pause_time=start_time + timedelta(minutes=30),
+        end_time=start_time + timedelta(hours=1),
+        total_duration=1800000,
+        version=3
+    )
+    values.update(overrides)
+    return Session(**values)
+
+
+class TestSessionArchive:
+    
+    @pytest.fixture
+    def archive(self):
+        return SessionArchive()
+    
+    def test_round_trip(self, archive):
+        session = make_stopped_session()
+        
+        assert archive.add(session)
+        
+        assert session.id in archive
+        assert archive.get(session.id) == session
+    
+    def test_add_existing_session_updates_row(self, archive):
+        session = make_stopped_session()
+        archive.add(session)
+        
+        session.version += 1
+        session.end_time = session.end_time + timedelta(minutes=5)
+        archive.add(session)
+        
+        assert len(archive) == 1
+        assert archive.get(session.id) == session
+    
+    def test_task_names_are_interned(self, archive):
+        for _ in range(100):
+            archive.add(make_stopped_session(task_name="同じ作業"))
+        
+        assert len(archive) == 100
+        assert archive._strings == ["alice", "同じ作業"]
+    
+    def test_rejects_non_uuid_or_running_sessions(self, archive):
+        assert not archive.add(make_stopped_session(id="legacy-id"))
+        assert not archive.add(make_stopped_session(status=SessionStatus.PAUSED))
+        assert len(archive) == 0
+        assert archive.get("legacy-id") is None
+    
+    def test_service_moves_stopped_sessions_to_archive(self):
+        service = SessionService()
+        first = service.start_session(SessionCreate(task_name="最初"))
+        second = service.start_session(SessionCreate(task_name="次"))
+        
+        assert first.id not in service._sessions
+        assert first.id in service._archive
+        assert service.get_session(first.id).status == SessionStatus.STOPPED
+        assert service.get_session(second.id) is second
+        
+        stopped, _ = service.list_sessions(status=SessionStatus.STOPPED)
+        assert [s.id for s in stopped] == [first.id]
+    
+    def test_remove_moves_last_row_and_compacts_segments(self, archive):
+        start = datetime(2025, 7, 1, 9, 0, tzinfo=timezone.utc)
+        sessions = [
+            make_stopped_session(segments=[SessionSegment(start=start, end=start + timedelta(minutes=30))])
+            for _ in range(3)
+        ]
+        for session in sessions:
+            archive.add(session)
+        
+        assert archive.remove(sessions[0].id)
+        assert archive.remove(sessions[1].id)
+        
+        assert not archive.remove(sessions[0].id)
+        assert len(archive) == 1
+        assert archive.get(sessions[2].id) == sessions[2]
+        assert len(archive._segment_start) == 1
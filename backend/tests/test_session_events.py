@@ -0,0 +1,79 @@
+import asyncio
+import json
+import threading
+from models import SessionCreate, SessionStatus
+from session_events import SessionEventHub
+from session_service import SessionService
+
+
+class TestSessionEventHub:
+    
+    def test_state_changes_are_pushed_to_user_subscribers(self):
+        async def scenario():
+            hub = SessionEventHub()
+            service = SessionService()
+            service.add_listener(hub.publish)
+            
+            alice_queue = hub.subscribe("alice")
+            bob_queue = hub.subscribe("bob")
+            
+            session = service.start_session(SessionCreate(task_name="配信テスト"), user_id="alice")
+            service.pause_session(session.id, user_id="alice")
+            
+            started = json.loads(alice_queue.get_nowait())
+            paused = json.loads(alice_queue.get_nowait())
+            assert started["event"] == "start"
+            assert paused["event"] == "pause"
+            assert paused["session"]["status"] == SessionStatus.PAUSED
+            assert "server_time" in paused
+            assert bob_queue.empty()
+        
+        asyncio.run(scenario())
+    
+    def test_slow_subscriber_keeps_latest_events(self):
+        async def scenario():
+            hub = SessionEventHub(queue_size=2)
+            service = SessionService()
+            service.add_listener(hub.publish)
+            queue = hub.subscribe("default")
+            
+            for i in range(5):
+                service.start_session(SessionCreate(task_name=f"作業{i}"))
+            
+            events = [json.loads(queue.get_nowait()) for _ in range(queue.qsize())]
+            assert len(events) == 2
+            assert events[-1]["session"]["task_name"] == "作業4"
+        
+        asyncio.run(scenario())
+    
+    def test_publish_from_worker_thread_is_delivered_on_loop(self):
+        async def scenario():
+            hub = SessionEventHub()
+            service = SessionService()
+            service.add_listener(hub.publish)
+            queue = hub.subscribe("default")
+            
+            thread = threading.Thread(target=service.start_session, args=(SessionCreate(task_name="別スレッド"),))
+            thread.start()
+            thread.join()
+            
+            payload = await asyncio.wait_for(queue.get(), timeout=1.0)
+            assert json.loads(payload)["session"]["task_name"] == "別スレッド"
+        
+        asyncio.run(scenario())
+    
+    def test_unsubscribe_fans_out_to_many_subscribers(self):
+        async def scenario():
+            hub = SessionEventHub()
+            service = SessionService()
+            service.add_listener(hub.publish)
+            queues = [hub.subscribe("default") for _ in range(1000)]
+            
+            service.start_session(SessionCreate(task_name="一斉配信"))
+            assert all(queue.qsize() == 1 for queue in queues)
+            
+            for queue in queues:
+                hub.unsubscribe("default", queue)
+            assert hub.subscriber_count() == 0
+        
+        asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+from session_index import SessionTimeIndex, encode_cursor, decode_cursor
+
+
+class TestSessionTimeIndex:
+    
+    @pytest.fixture
+    def base_time(self):
+        return datetime(2025, 7, 1, 9, 0, tzinfo=timezone.utc)
+    
+    @pytest.fixture
+    def index(self, base_time):
+        index = SessionTimeIndex()
+        for i in range(10):
+            index.add(base_time + timedelta(hours=i), f"session-{i}")
+        return index
+    
+    def test_iterates_newest_first(self, index):
+        ids = [key[1] for key in index.iter_keys()]
+        assert ids == [f"session-{i}" for i in range(9, -1, -1)]
+    
+    def test_time_range_is_half_open(self, index, base_time):
+        keys = list(index.iter_keys(start=base_time + timedelta(hours=2), end=base_time + timedelta(hours=5)))
+        assert [key[1] for key in keys] == ["session-4", "session-3", "session-2"]
+    
+    def test_keyset_pagination_resumes_after_cursor(self, index):
+        first_page = list(index.iter_keys())[:3]
+        after = decode_cursor(encode_cursor(first_page[-1]))
+        
+        second_page = list(index.iter_keys(after=after))[:3]
+        assert [key[1] for key in second_page] == ["session-6", "session-5", "session-4"]
+    
+    def test_ascending_iteration_after_cursor(self, index):
+        first_page = list(index.iter_keys(descending=False))[:2]
+        rest = list(index.iter_keys(after=first_page[-1], descending=False))
+        assert rest[0][1] == "session-2"
+        assert len(rest) == 8
+    
+    def test_remove(self, index, base_time):
+        index.remove(base_time, "session-0")
+        assert len(index) == 9
+        assert all(key[1] != "session-0" for key in index.iter_keys())
+    
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor("not-a-cursor")
@@ -0,0 +1,145 @@
+import sys
+import threading
+import pytest
+from datetime import datetime, timezone, timedelta
+from models import SessionCreate, SessionStatus
+from session_retention import SessionRetentionPolicy
+from session_service import SessionService
+from session_store import WalSessionStore
+
+
+BASE_TIME = datetime(2025, 7, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def add_sessions(service, count, user_id="alice", task_name="開発", first_hour=0):
+    # 1 時間おきに 30 分ずつ作業したセッションを作る
+    sessions = []
+    for i in range(count):
+        start = BASE_TIME + timedelta(hours=first_hour + i)
+        session = service.start_session(SessionCreate(task_name=task_name), user_id, start)
+        sessions.append(service.stop_session(session.id, user_id, current_time=start + timedelta(minutes=30)))
+    return sessions
+
+
+class TestSessionRetention:
+    
+    @pytest.fixture
+    def service(self):
+        return SessionService()
+    
+    def test_disabled_policy_keeps_everything(self, service):
+        add_sessions(service, 3)
+        
+        assert not SessionRetentionPolicy().enabled
+        assert service.compact(SessionRetentionPolicy()) == 0
+        assert len(service.list_sessions("alice")[0]) == 3
+    
+    def test_max_age_evicts_sessions_that_ended_before_cutoff(self, service):
+        sessions = add_sessions(service, 4)
+        now = BASE_TIME + timedelta(hours=3, minutes=40)
+        
+        evicted = service.compact(SessionRetentionPolicy(max_age=timedelta(hours=2)), current_time=now)
+        
+        assert evicted == 2
+        remaining, _ = service.list_sessions("alice")
+        assert [s.id for s in remaining] == [sessions[3].id, sessions[2].id]
+        with pytest.raises(ValueError, match="Session not found"):
+            service.get_session(sessions[0].id)
+    
+    def test_per_user_cap_keeps_newest_and_running_sessions(self, service):
+        add_sessions(service, 3, user_id="alice")
+        add_sessions(service, 2, user_id="bob")
+        active = service.start_session(SessionCreate(task_name="進行中"), "alice")
+        
+        service.compact(SessionRetentionPolicy(max_sessions_per_user=2))
+        
+        alice_sessions, _ = service.list_sessions("alice")
+        assert len(alice_sessions) == 2
+        assert alice_sessions[0].id == active.id
+        assert len(service.list_sessions("bob")[0]) == 2
+    
+    def test_global_cap_evicts_oldest_across_users(self, service):
+        alice = add_sessions(service, 3, user_id="alice")
+        bob = add_sessions(service, 3, user_id="bob")
+        
+        service.compact(SessionRetentionPolicy(max_sessions=4))
+        
+        remaining = service.list_sessions("alice")[0] + service.list_sessions("bob")[0]
+        assert {s.id for s in remaining} == {alice[1].id, alice[2].id, bob[1].id, bob[2].id}
+    
+    def test_compaction_runs_in_bounded_slices(self, service):
+        add_sessions(service, 5)
+        policy = SessionRetentionPolicy(max_sessions_per_user=0)
+        
+        assert service.compact(policy, limit=2) == 2
+        assert service.compact(policy, limit=2) == 2
+        assert service.compact(policy, limit=2) == 1
+        assert service.compact(policy, limit=2) == 0
+    
+    def test_eviction_updates_aggregates_and_counters(self, service):
+        add_sessions(service, 2, task_name="開発")
+        add_sessions(service, 1, task_name="会議", first_hour=2)
+        
+        service.compact(SessionRetentionPolicy(max_sessions_per_user=1))
+        
+        totals = service.get_totals("alice")
+        assert totals.by_task == {"会議": 30 * 60 * 1000}
+        assert service.get_worked_duration(BASE_TIME, BASE_TIME + timedelta(days=1), "alice") == 30 * 60 * 1000
+        assert "開発" not in service._shards["alice"].task_indexes
+        assert service.get_store_stats() == {
+            "live_sessions": 0,
+            "archived_sessions": 1,
+            "archived_total": 3,
+            "evicted_total": 2,
+        }
+    
+    def test_restopping_archived_session_is_counted_once(self, service):
+        first, _ = add_sessions(service, 2)
+        
+        service.stop_session(first.id, "alice")
+        
+        stats = service.get_store_stats()
+        assert (stats["archived_sessions"], stats["archived_total"]) == (2, 2)
+    
+    def test_compaction_in_another_thread_keeps_archive_consistent(self, service):
+        # 保持ポリシーの適用はスレッドで動き、イベントループ側の停止と同時にアーカイブを書き換える
+        add_sessions(service, 300, user_id="bob")
+        policy = SessionRetentionPolicy(max_age=timedelta(days=1))
+        stopped, errors = [], []
+        
+        def start_and_stop():
+            try:
+                for _ in range(300):
+                    session = service.start_session(SessionCreate(task_name="並行"), "alice")
+                    stopped.append(service.stop_session(session.id, "alice").id)
+            except Exception as error:
+                errors.append(error)
+        
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            worker = threading.Thread(target=start_and_stop)
+            worker.start()
+            while worker.is_alive():
+                service.compact(policy, limit=1)
+            worker.join()
+            service.compact(policy)
+        finally:
+            sys.setswitchinterval(interval)
+        
+        assert errors == []
+        assert [service.get_session(session_id, "alice").id for session_id in stopped] == stopped
+        assert service.list_sessions("bob")[0] == []
+    
+    def test_evicted_sessions_stay_gone_after_restart(self, tmp_path):
+        directory = str(tmp_path / "store")
+        service = SessionService(WalSessionStore(directory, fsync=False))
+        sessions = add_sessions(service, 3)
+        service.compact(SessionRetentionPolicy(max_sessions_per_user=1))
+        service.close()
+        
+        restored = SessionService(WalSessionStore(directory, fsync=False))
+        
+        assert [s.id for s in restored.list_sessions("alice")[0]] == [sessions[2].id]
+        assert restored.get_session(sessions[2].id).status == SessionStatus.STOPPED
+        restored.close()
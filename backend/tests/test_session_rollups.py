@@ -0,0 +1,63 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from session_rollups import SessionRollups, split_by_day
+
+
+def at(day, hour, minute=0):
+    return datetime(2025, 7, day, hour, minute, tzinfo=timezone.utc)
+
+
+HOUR_MS = 3600000
+
+
+class TestSessionRollups:
+    
+    @pytest.fixture
+    def rollups(self):
+        rollups = SessionRollups()
+        rollups.add("開発", at(1, 9), at(1, 11))
+        rollups.add("会議", at(1, 13), at(1, 14))
+        rollups.add("開発", at(2, 10), at(2, 11))
+        return rollups
+    
+    def test_totals_per_task_and_day(self, rollups):
+        assert rollups.by_task == {"開発": 3 * HOUR_MS, "会議": HOUR_MS}
+        assert rollups.by_day == {date(2025, 7, 1): 3 * HOUR_MS, date(2025, 7, 2): HOUR_MS}
+        assert rollups.by_day_task[date(2025, 7, 1)] == {"開発": 2 * HOUR_MS, "会議": HOUR_MS}
+    
+    def test_segment_crossing_midnight_is_split(self):
+        pieces = list(split_by_day(at(1, 23), at(2, 1, 30)))
+        assert pieces == [(date(2025, 7, 1), HOUR_MS), (date(2025, 7, 2), int(1.5 * HOUR_MS))]
+    
+    def test_days_follow_configured_timezone(self):
+        jst = timezone(timedelta(hours=9))
+        rollups = SessionRollups(jst)
+        # UTC 14:00〜16:00 は日本時間の 7/1 23:00〜7/2 1:00
+        rollups.add("開発", at(1, 14), at(1, 16))
+        
+        assert rollups.by_day == {date(2025, 7, 1): HOUR_MS, date(2025, 7, 2): HOUR_MS}
+        assert rollups.snapshot(date(2025, 7, 2)).by_day == {date(2025, 7, 2): HOUR_MS}
+    
+    def test_snapshot_for_single_day_is_independent_copy(self, rollups):
+        snapshot = rollups.snapshot(date(2025, 7, 2))
+        snapshot.add("開発", at(2, 12), at(2, 13), only_day=date(2025, 7, 2))
+        
+        assert snapshot.by_day == {date(2025, 7, 2): 2 * HOUR_MS}
+        assert snapshot.by_task == {"開発": 2 * HOUR_MS}
+        assert rollups.by_day[date(2025, 7, 2)] == HOUR_MS
+        assert rollups.by_task["開発"] == 3 * HOUR_MS
+    
+    def test_snapshot_for_single_day_only_counts_that_day(self, rollups):
+        snapshot = rollups.snapshot(date(2025, 7, 1))
+        # 日をまたいで進行中の区間も、その日に入る分だけを足す
+        snapshot.add("会議", at(1, 23), at(2, 2), only_day=date(2025, 7, 1))
+        
+        assert snapshot.by_task == {"開発": 2 * HOUR_MS, "会議": 2 * HOUR_MS}
+        assert snapshot.by_task == snapshot.by_day_task[date(2025, 7, 1)]
+        assert rollups.snapshot(date(2025, 7, 3)).by_task == {}
+    
+    def test_remove_subtracts_and_drops_empty_entries(self, rollups):
+        rollups.remove("会議", at(1, 13), at(1, 14))
+        
+        assert rollups.by_task == {"開発": 3 * HOUR_MS}
+        assert rollups.by_day_task[date(2025, 7, 1)] == {"開発": 2 * HOUR_MS}
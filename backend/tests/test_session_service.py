@@ -141,4 +141,213 @@ class TestSessionService:
         
         for session in sessions[:-1]:
             stored_session = service.get_session(session.id)
-            assert stored_session.status == SessionStatus.STOPPED
\ No newline at end of file
+            assert stored_session.status == SessionStatus.STOPPED
+    
+    def test_sessions_are_isolated_per_user(self, service):
+        alice_session = service.start_session(SessionCreate(task_name="Aliceの作業"), user_id="alice")
+        bob_session = service.start_session(SessionCreate(task_name="Bobの作業"), user_id="bob")
+        
+        assert service.get_active_session("alice").id == alice_session.id
+        assert service.get_active_session("bob").id == bob_session.id
+        assert service.get_session(alice_session.id).status == SessionStatus.ACTIVE
+        assert service.get_active_session() is None
+        
+        with pytest.raises(ValueError, match="Session not found"):
+            service.pause_session(alice_session.id, user_id="bob")
+    
+    def test_concurrent_users_keep_their_own_active_session(self, service):
+        import threading
+        
+        user_ids = [f"user-{i}" for i in range(50)]
+        
+        def work(user_id):
+            for i in range(20):
+                session = service.start_session(SessionCreate(task_name=f"{user_id}-{i}"), user_id=user_id)
+                service.pause_session(session.id, user_id=user_id)
+                service.pause_session(session.id, user_id=user_id)
+        
+        threads = [threading.Thread(target=work, args=(user_id,)) for user_id in user_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        for user_id in user_ids:
+            active_session = service.get_active_session(user_id)
+            assert active_session.task_name == f"{user_id}-19"
+            assert active_session.status == SessionStatus.ACTIVE
+    
+    def test_version_increments_on_each_mutation(self, service):
+        session = service.start_session(SessionCreate(task_name="バージョンテスト"))
+        assert session.version == 1
+        
+        service.pause_session(session.id)
+        assert session.version == 2
+        
+        service.pause_session(session.id)
+        assert session.version == 3
+        
+        service.stop_session(session.id)
+        assert session.version == 4
+    
+    def test_stale_expected_version_raises(self, service):
+        session = service.start_session(SessionCreate(task_name="競合テスト"))
+        service.pause_session(session.id, expected_version=1)
+        
+        with pytest.raises(ValueError, match="Session version mismatch"):
+            service.pause_session(session.id, expected_version=1)
+        
+        assert session.status == SessionStatus.PAUSED
+    
+    def test_list_sessions_paginates_and_filters(self, service):
+        for i in range(5):
+            service.start_session(SessionCreate(task_name="開発" if i % 2 == 0 else "会議"))
+        
+        first_page, cursor = service.list_sessions(limit=2)
+        assert len(first_page) == 2
+        assert first_page[0].status == SessionStatus.ACTIVE
+        assert cursor is not None
+        
+        second_page, _ = service.list_sessions(limit=10, cursor=cursor)
+        assert len(second_page) == 3
+        assert {s.id for s in first_page}.isdisjoint({s.id for s in second_page})
+        
+        meetings, next_cursor = service.list_sessions(task_name="会議")
+        assert len(meetings) == 2
+        assert next_cursor is None
+        
+        stopped, _ = service.list_sessions(status=SessionStatus.STOPPED)
+        assert len(stopped) == 4
+    
+    def test_list_sessions_reindexes_resumed_session(self, service):
+        first = service.start_session(SessionCreate(task_name="先に開始"))
+        service.pause_session(first.id)
+        second = service.start_session(SessionCreate(task_name="後に開始"))
+        service.stop_session(second.id)
+        
+        service.pause_session(first.id)
+        
+        sessions, _ = service.list_sessions()
+        assert [s.id for s in sessions] == [first.id, second.id]
+    
+    def test_pause_and_resume_record_segments(self, service):
+        import time
+        
+        session = service.start_session(SessionCreate(task_name="区間テスト"))
+        time.sleep(0.02)
+        service.pause_session(session.id)
+        time.sleep(0.05)
+        service.pause_session(session.id)
+        time.sleep(0.02)
+        service.stop_session(session.id)
+        
+        stored = service.get_session(session.id)
+        assert len(stored.segments) == 2
+        assert all(segment.end is not None for segment in stored.segments)
+        
+        window_start = stored.segments[0].start
+        window_end = stored.segments[-1].end
+        worked = service.get_worked_duration(window_start, window_end)
+        # 一時停止中の約50msは含まれない
+        assert abs(worked - stored.total_duration) <= 2
+        assert worked < int((window_end - window_start).total_seconds() * 1000) - 30
+        
+        assert service.get_worked_duration(window_start, window_end, task_name="別の作業") == 0
+    
+    def test_worked_duration_includes_running_segment(self, service):
+        import time
+        from datetime import datetime, timezone, timedelta
+        
+        window_start = datetime.now(timezone.utc)
+        service.start_session(SessionCreate(task_name="進行中"))
+        time.sleep(0.03)
+        
+        worked = service.get_worked_duration(window_start, window_start + timedelta(hours=1))
+        assert worked >= 30
+    
+    def test_build_task_items_aggregates_per_task_name(self, service):
+        import time
+        from datetime import datetime, timezone, timedelta
+        
+        window_start = datetime.now(timezone.utc)
+        ids = []
+        for task_name in ["実装", "会議", "実装"]:
+            ids.append(service.start_session(SessionCreate(task_name=task_name)).id)
+            time.sleep(0.01)
+        service.stop_session(ids[-1])
+        
+        items = service.build_task_items(start=window_start, end=window_start + timedelta(hours=1))
+        durations = {item.task_name: item.duration_ms for item in items}
+        assert set(durations) == {"実装", "会議"}
+        assert durations["実装"] >= 20
+        
+        by_id = service.build_task_items(session_ids=[ids[0], ids[0]])
+        assert len(by_id) == 1
+        assert by_id[0].duration_ms == service.get_session(ids[0]).total_duration
+        
+        with pytest.raises(ValueError):
+            service.build_task_items()
+    
+    def test_iter_sessions_streams_in_start_order(self, service):
+        started = [service.start_session(SessionCreate(task_name=f"出力{i}")).id for i in range(5)]
+        
+        exported = service.iter_sessions(chunk_size=2)
+        first = next(exported)
+        # 取り出し途中で追加されたセッションも、キー順で後ろにあれば取りこぼさない
+        added = service.start_session(SessionCreate(task_name="途中追加")).id
+        
+        assert [first.id] + [s.id for s in exported] == started + [added]
+    
+    def test_import_session_restores_indexes(self, service):
+        source = SessionService()
+        original = source.start_session(SessionCreate(task_name="移行元"))
+        source.stop_session(original.id)
+        exported = list(source.iter_sessions())
+        
+        service.import_session(exported[0])
+        
+        assert service.get_session(original.id).task_name == "移行元"
+        assert service.get_totals().by_task == source.get_totals().by_task
+        with pytest.raises(ValueError, match="Session already exists"):
+            service.import_session(exported[0])
+    
+    def test_import_rejects_overlapping_or_unordered_segments(self, service):
+        from datetime import datetime, timezone
+        from models import Session, SessionSegment
+        
+        def at(hour, minute=0):
+            return datetime(2025, 1, 1, hour, minute, tzinfo=timezone.utc)
+        
+        def stopped(session_id, *segments):
+            return Session(
+                id=session_id, task_name="移行", status=SessionStatus.STOPPED,
+                start_time=segments[0][0], end_time=segments[-1][1],
+                segments=[SessionSegment(start=start, end=end) for start, end in segments]
+            )
+        
+        service.import_session(stopped("a", (at(10), at(12))))
+        with pytest.raises(ValueError, match="overlap"):
+            service.import_session(stopped("b", (at(9), at(13))))
+        with pytest.raises(ValueError, match="before it starts"):
+            service.import_session(stopped("c", (at(14), at(13))))
+        with pytest.raises(ValueError, match="chronological"):
+            service.import_session(stopped("d", (at(15), at(16)), (at(14), at(14, 30))))
+        service.import_session(stopped("e", (at(12), at(13))))
+        
+        assert service.get_worked_duration(at(11), at(11, 30)) == 30 * 60 * 1000
+        assert service.get_worked_duration(at(12, 30), at(12, 45)) == 15 * 60 * 1000
+    
+    def test_client_timestamps_are_clamped(self, service):
+        from datetime import datetime, timezone, timedelta
+        
+        now = datetime.now(timezone.utc)
+        session = service.start_session(SessionCreate(task_name="時刻補正"), current_time=now - timedelta(minutes=5))
+        
+        # 直前の状態変化より過去の時刻は、その時刻まで繰り上げる
+        paused = service.pause_session(session.id, current_time=now - timedelta(minutes=10))
+        assert paused.pause_time == session.start_time
+        assert paused.total_duration == 0
+        
+        # 未来の時刻は現在時刻に丸める
+        resumed = service.pause_session(session.id, current_time=now + timedelta(hours=1))
+        assert resumed.start_time <= datetime.now(timezone.utc)
@@ -0,0 +1,193 @@
+import os
+import pytest
+from datetime import datetime, timezone, timedelta
+from session_service import SessionService
+from session_timers import SessionAutoPauser, TimerWheel
+from session_store import WalSessionStore, InMemorySessionStore, SqliteSessionStore
+from models import SessionCreate, SessionStatus, SessionUpdate
+
+
+class TestWalSessionStore:
+    
+    @pytest.fixture
+    def store_dir(self, tmp_path):
+        return str(tmp_path / "store")
+    
+    def test_default_store_is_in_memory(self):
+        service = SessionService()
+        assert isinstance(service._store, InMemorySessionStore)
+    
+    def test_recover_sessions_after_restart(self, store_dir):
+        service = SessionService(WalSessionStore(store_dir))
+        first = service.start_session(SessionCreate(task_name="設計"))
+        second = service.start_session(SessionCreate(task_name="実装"))
+        service.pause_session(second.id)
+        service.pause_session(second.id)
+        service.close()
+        
+        recovered = SessionService(WalSessionStore(store_dir))
+        
+        assert recovered.get_session(first.id).status == SessionStatus.STOPPED
+        assert recovered.get_session(second.id).status == SessionStatus.ACTIVE
+        assert recovered.get_session(second.id).total_duration == service.get_session(second.id).total_duration
+        assert recovered.get_active_session().id == second.id
+        recovered.close()
+    
+    def test_snapshot_truncates_log(self, store_dir):
+        store = WalSessionStore(store_dir, snapshot_interval=3)
+        service = SessionService(store)
+        for i in range(4):
+            service.start_session(SessionCreate(task_name=f"タスク{i}"))
+        store.flush()
+        
+        assert os.path.exists(store.snapshot_path)
+        with open(store.wal_path, encoding="utf-8") as f:
+            remaining = [line for line in f if line.strip()]
+        assert len(remaining) < 7
+        service.close()
+        
+        recovered = SessionService(WalSessionStore(store_dir, snapshot_interval=3))
+        assert len(recovered.list_sessions(limit=10)[0]) == 4
+        assert recovered.get_active_session().task_name == "タスク3"
+        recovered.close()
+    
+    def test_torn_tail_record_is_ignored(self, store_dir):
+        service = SessionService(WalSessionStore(store_dir))
+        session = service.start_session(SessionCreate(task_name="クラッシュテスト"))
+        service.close()
+        
+        with open(os.path.join(store_dir, WalSessionStore.WAL_FILENAME), "a", encoding="utf-8") as f:
+            f.write('{"seq": 99, "event": "st')
+        
+        recovered = SessionService(WalSessionStore(store_dir))
+        assert recovered.get_session(session.id).task_name == "クラッシュテスト"
+        next_session = recovered.start_session(SessionCreate(task_name="復旧後"))
+        recovered.close()
+        
+        reopened = SessionService(WalSessionStore(store_dir))
+        assert reopened.get_active_session().id == next_session.id
+        reopened.close()
+    
+    def test_append_after_close_raises(self, store_dir):
+        store = WalSessionStore(store_dir)
+        service = SessionService(store)
+        service.close()
+        
+        with pytest.raises(RuntimeError):
+            service.start_session(SessionCreate(task_name="閉じた後"))
+
+
+class TestSqliteSessionStore:
+    
+    @pytest.fixture
+    def database(self, tmp_path):
+        return str(tmp_path / "sessions.db")
+    
+    @pytest.fixture
+    def workers(self, database):
+        # 同じデータベースを共有する 2 つのワーカープロセスに相当する
+        services = [SessionService(SqliteSessionStore(database)) for _ in range(2)]
+        yield services
+        for service in services:
+            service.close()
+    
+    def test_changes_are_visible_to_other_workers(self, workers):
+        first, second = workers
+        session = first.start_session(SessionCreate(task_name="共有"))
+        
+        second.sync()
+        
+        assert second.get_active_session().id == session.id
+        assert second.get_session(session.id).version == session.version
+    
+    def test_start_on_another_worker_stops_previous_session(self, workers):
+        first, second = workers
+        earlier = first.start_session(SessionCreate(task_name="作業A"))
+        
+        later = second.start_session(SessionCreate(task_name="作業B"))
+        first.sync()
+        
+        assert first.get_session(earlier.id).status == SessionStatus.STOPPED
+        assert first.get_active_session().id == later.id
+        assert [s.id for s in first.list_sessions()[0]] == [later.id, earlier.id]
+        assert first.get_totals().by_task["作業A"] == second.get_totals().by_task["作業A"]
+    
+    def test_writes_catch_up_before_checking_versions(self, workers):
+        first, second = workers
+        session = first.start_session(SessionCreate(task_name="競合"))
+        second.sync()
+        first.pause_session(session.id, expected_version=session.version)
+        
+        # second は古い状態のままだが、書き込み前に追いつくので競合を検出できる
+        with pytest.raises(ValueError, match="Session version mismatch"):
+            second.update_session(session.id, SessionUpdate(status=SessionStatus.STOPPED), expected_version=1)
+    
+    def test_new_worker_loads_current_state(self, workers, database):
+        first, _ = workers
+        stopped = first.start_session(SessionCreate(task_name="完了"))
+        active = first.start_session(SessionCreate(task_name="進行中"))
+        
+        late = SessionService(SqliteSessionStore(database))
+        
+        assert late.get_session(stopped.id).status == SessionStatus.STOPPED
+        assert late.get_active_session().id == active.id
+        late.close()
+    
+    def test_heartbeat_on_another_worker_extends_idle_timeout(self, workers):
+        first, second = workers
+        start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=2)
+        pausers = [
+            SessionAutoPauser(worker, idle_timeout=timedelta(minutes=30), wheel=TimerWheel(now=start.timestamp()))
+            for worker in workers
+        ]
+        session = first.start_session(SessionCreate(task_name="放置"), current_time=start)
+        second.sync()
+        
+        # ハートビートは second にしか届いていないが、first のタイマーもそれに従う
+        pausers[1].touch(second.get_session(session.id), start + timedelta(minutes=45))
+        
+        assert pausers[0].run_expired((start + timedelta(minutes=31)).timestamp()) == 0
+        assert first.get_session(session.id).status == SessionStatus.ACTIVE
+        assert pausers[0].run_expired((start + timedelta(minutes=75)).timestamp()) == 1
+        assert first.get_session(session.id).pause_time == start + timedelta(minutes=45)
+    
+    def test_idempotency_keys_are_shared_between_workers(self, workers):
+        first, second = workers
+        first.idempotency_cache(max_entries=10, ttl_seconds=60).put("alice", "key-1", "fp", 201, {"id": "s1"})
+        
+        cached = second.idempotency_cache(max_entries=10, ttl_seconds=60).get("alice", "key-1", "fp")
+        
+        assert (cached.status_code, cached.body) == (201, {"id": "s1"})
+        with pytest.raises(ValueError, match="Idempotency key reused"):
+            second.idempotency_cache(max_entries=10, ttl_seconds=60).get("alice", "key-1", "other")
+    
+    def test_worker_reloads_after_missing_pruned_events(self, database):
+        first = SessionService(SqliteSessionStore(database, retained_events=2))
+        second = SessionService(SqliteSessionStore(database, retained_events=2))
+        first._store.PRUNE_INTERVAL = 1
+        for i in range(5):
+            first.start_session(SessionCreate(task_name=f"タスク{i}"))
+        
+        second.sync()
+        
+        assert second.get_active_session().task_name == "タスク4"
+        assert len(second.list_sessions(limit=10)[0]) == 5
+        first.close()
+        second.close()
+    
+    def test_lagging_worker_reloads_before_writing(self, database):
+        first = SessionService(SqliteSessionStore(database, retained_events=2))
+        second = SessionService(SqliteSessionStore(database, retained_events=2))
+        first._store.PRUNE_INTERVAL = 1
+        for i in range(5):
+            first.start_session(SessionCreate(task_name=f"タスク{i}"))
+        
+        # sync() を挟まずに書き込んでも、書き込みのトランザクションの中で読み直して追いつく
+        latest = second.start_session(SessionCreate(task_name="遅れたワーカー"))
+        
+        first.sync()
+        assert first.get_active_session().id == latest.id
+        statuses = [session.status for session in second.list_sessions(limit=10)[0]]
+        assert (len(statuses), statuses.count(SessionStatus.ACTIVE)) == (6, 1)
+        first.close()
+        second.close()
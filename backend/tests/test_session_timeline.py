@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime, timezone
+from session_timeline import SegmentTimeline
+
+
+def at(hour, minute=0):
+    return datetime(2025, 7, 1, hour, minute, tzinfo=timezone.utc)
+
+
+HOUR_US = 3600 * 1000000
+
+
+class TestSegmentTimeline:
+    
+    @pytest.fixture
+    def timeline(self):
+        timeline = SegmentTimeline()
+        # 9:00-10:00, 11:00-12:30, 13:00-15:00
+        timeline.add(at(9), at(10))
+        timeline.add(at(11), at(12, 30))
+        timeline.add(at(13), at(15))
+        return timeline
+    
+    def test_total_duration(self, timeline):
+        assert timeline.duration_us() == int(4.5 * HOUR_US)
+    
+    def test_window_clips_partial_segments(self, timeline):
+        assert timeline.duration_us(at(9, 30), at(14)) == int(3 * HOUR_US)
+    
+    def test_window_inside_single_segment(self, timeline):
+        assert timeline.duration_us(at(13, 15), at(13, 45)) == HOUR_US // 2
+    
+    def test_window_without_segments(self, timeline):
+        assert timeline.duration_us(at(10), at(11)) == 0
+        assert timeline.duration_us(at(16), at(17)) == 0
+    
+    def test_out_of_order_insert_keeps_prefix_sums(self, timeline):
+        timeline.add(at(7), at(8))
+        
+        assert len(timeline) == 4
+        assert timeline.duration_us() == int(5.5 * HOUR_US)
+        assert timeline.duration_us(at(7, 30), at(9, 30)) == HOUR_US
+    
+    def test_empty_segment_is_ignored(self):
+        timeline = SegmentTimeline()
+        timeline.add(at(9), at(9))
+        assert len(timeline) == 0
+        assert timeline.duration_us(at(8), at(10)) == 0
+    
+    def test_remove_many_rebuilds_prefix_sums(self, timeline):
+        timeline.remove_many([(at(9), at(10)), (at(13), at(15))])
+        
+        assert len(timeline) == 1
+        assert timeline.duration_us() == int(1.5 * HOUR_US)
+        assert timeline.duration_us(at(12), at(16)) == HOUR_US // 2
@@ -0,0 +1,113 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+from models import SessionCreate, SessionStatus
+from session_service import SessionService
+from session_timers import SessionAutoPauser, TimerWheel
+
+
+class TestTimerWheel:
+    
+    @pytest.fixture
+    def wheel(self):
+        return TimerWheel(tick_seconds=1.0, slot_count=8, now=0)
+    
+    def test_fires_at_deadline(self, wheel):
+        wheel.schedule("a", 3.0)
+        wheel.schedule("b", 5.5)
+        
+        assert wheel.advance(2.9) == []
+        assert wheel.advance(3.0) == ["a"]
+        # 期限は切り上げるので 5.5 秒の期限は 6 秒のティックで発火する
+        assert wheel.advance(5.9) == []
+        assert wheel.advance(6.0) == ["b"]
+        assert len(wheel) == 0
+    
+    def test_cancel_and_reschedule(self, wheel):
+        wheel.schedule("a", 2.0)
+        wheel.schedule("b", 2.0)
+        
+        assert wheel.cancel("a")
+        assert not wheel.cancel("a")
+        wheel.schedule("b", 4.0)
+        
+        assert wheel.advance(3.0) == []
+        assert wheel.advance(4.0) == ["b"]
+    
+    def test_deadline_beyond_one_rotation(self, wheel):
+        wheel.schedule("far", 20.0)
+        
+        assert wheel.advance(12.0) == []
+        assert wheel.advance(19.0) == []
+        assert wheel.advance(20.0) == ["far"]
+    
+    def test_catches_up_after_long_gap(self, wheel):
+        for i in range(1, 6):
+            wheel.schedule(i, float(i * 3))
+        
+        assert sorted(wheel.advance(100.0)) == [1, 2, 3, 4, 5]
+
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+START = NOW - timedelta(hours=12)
+
+
+class TestSessionAutoPauser:
+    
+    @pytest.fixture
+    def service(self):
+        return SessionService()
+    
+    def make_pauser(self, service, **limits):
+        return SessionAutoPauser(service, wheel=TimerWheel(now=START.timestamp()), **limits)
+    
+    def test_idle_session_is_paused_at_last_activity(self, service):
+        pauser = self.make_pauser(service, idle_timeout=timedelta(minutes=30))
+        session = service.start_session(SessionCreate(task_name="放置"), current_time=START)
+        pauser.touch(session, START + timedelta(minutes=45))
+        
+        assert pauser.run_expired((START + timedelta(minutes=74)).timestamp()) == 0
+        assert pauser.run_expired((START + timedelta(minutes=75)).timestamp()) == 1
+        
+        paused = service.get_session(session.id)
+        assert paused.status == SessionStatus.PAUSED
+        assert paused.pause_time == START + timedelta(minutes=45)
+        assert paused.total_duration == 45 * 60 * 1000
+    
+    def test_max_duration_stops_session(self, service):
+        pauser = self.make_pauser(service, max_duration=timedelta(hours=2))
+        session = service.start_session(SessionCreate(task_name="長時間"), current_time=START)
+        service.pause_session(session.id, current_time=START + timedelta(hours=1))
+        service.pause_session(session.id, current_time=START + timedelta(hours=3))
+        
+        pauser.run_expired((START + timedelta(hours=4)).timestamp())
+        
+        stopped = service.get_session(session.id)
+        assert stopped.status == SessionStatus.STOPPED
+        assert stopped.end_time == START + timedelta(hours=4)
+        assert stopped.total_duration == 2 * 3600 * 1000
+    
+    def test_pause_and_stop_cancel_timers(self, service):
+        pauser = self.make_pauser(service, idle_timeout=timedelta(minutes=30))
+        first = service.start_session(SessionCreate(task_name="作業A"), current_time=START)
+        service.start_session(SessionCreate(task_name="作業B"), current_time=START + timedelta(minutes=10))
+        
+        assert first.id not in pauser.wheel
+        assert len(pauser.wheel) == 1
+        
+        service.stop_session(service.get_active_session().id, current_time=START + timedelta(minutes=20))
+        assert len(pauser.wheel) == 0
+        assert pauser.run_expired(NOW.timestamp()) == 0
+    
+    def test_active_sessions_are_armed_on_creation(self, service):
+        session = service.start_session(SessionCreate(task_name="再起動前"), current_time=START)
+        
+        pauser = self.make_pauser(service, idle_timeout=timedelta(minutes=30))
+        
+        assert session.id in pauser.wheel
+    
+    def test_disabled_pauser_does_not_listen(self, service):
+        pauser = self.make_pauser(service)
+        service.start_session(SessionCreate(task_name="作業"), current_time=START)
+        
+        assert not pauser.enabled
+        assert len(pauser.wheel) == 0
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "done"
+        
+        async def scenario():
+            flight = SingleFlight()
+            results = await asyncio.gather(*(flight.run("key", work) for _ in range(5)))
+            return flight, results
+        
+        flight, results = asyncio.run(scenario())
+        
+        assert results == ["done"] * 5
+        assert len(calls) == 1
+        assert (flight.started, flight.coalesced, len(flight)) == (1, 4, 0)
+    
+    def test_different_keys_run_separately(self):
+        async def scenario():
+            flight = SingleFlight()
+            return await asyncio.gather(flight.run("a", lambda: asyncio.sleep(0, "a")), flight.run("b", lambda: asyncio.sleep(0, "b")))
+        
+        assert asyncio.run(scenario()) == ["a", "b"]
+    
+    def test_finished_call_is_not_reused(self):
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            return len(calls)
+        
+        async def scenario():
+            flight = SingleFlight()
+            return [await flight.run("key", work), await flight.run("key", work)]
+        
+        assert asyncio.run(scenario()) == [1, 2]
+    
+    def test_exception_is_delivered_to_every_waiter(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+        
+        async def scenario():
+            flight = SingleFlight()
+            return await asyncio.gather(*(flight.run("key", work) for _ in range(3)), return_exceptions=True)
+        
+        results = asyncio.run(scenario())
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+    
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+        
+        async def scenario():
+            flight = SingleFlight()
+            first = asyncio.ensure_future(flight.run("key", work))
+            second = asyncio.ensure_future(flight.run("key", work))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+        
+        assert asyncio.run(scenario()) == "done"
+    
+    def test_work_is_cancelled_when_every_waiter_leaves(self):
+        cancelled = []
+        
+        async def work():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        
+        async def scenario():
+            flight = SingleFlight()
+            waiters = [asyncio.ensure_future(flight.run("key", work)) for _ in range(2)]
+            await asyncio.sleep(0)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+            return flight
+        
+        flight = asyncio.run(scenario())
+        
+        assert cancelled == [True]
+        assert len(flight) == 0
+    
+    def test_new_call_after_all_waiters_left_starts_fresh(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            return "done"
+        
+        async def scenario():
+            flight = SingleFlight()
+            waiter = asyncio.ensure_future(flight.run("key", work))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            return await flight.run("key", work), flight.started
+        
+        assert asyncio.run(scenario()) == ("done", 2)
@@ -1,7 +1,7 @@
 import pytest
 import os
 from fastapi.testclient import TestClient
-from main import app, reset_gemini_service
+from main import app, reset_gemini_service, reset_session_service
 
 
 class TestSummaryAPI:
@@ -141,4 +141,65 @@ class TestSummaryAPI:
             
             assert isinstance(category["category"], str)
             assert isinstance(category["subcategory"], str)
-            assert isinstance(category["total_duration_ms"], int)
\ No newline at end of file
+            assert isinstance(category["total_duration_ms"], int)
+
+
+class TestSessionSummaryAPI:
+    
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setenv("GEMINI_API_KEY", "")
+        reset_gemini_service()
+        reset_session_service()
+        return TestClient(app)
+    
+    def record_sessions(self, client, task_names):
+        import time
+        
+        session_ids = []
+        for task_name in task_names:
+            response = client.post("/sessions/start", json={"task_name": task_name})
+            session_ids.append(response.json()["id"])
+            time.sleep(0.01)
+        client.post(f"/sessions/{session_ids[-1]}/stop")
+        return session_ids
+    
+    def test_summary_from_time_window(self, client):
+        from datetime import datetime, timezone, timedelta
+        
+        window_start = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.record_sessions(client, ["API開発", "チーム会議", "API開発"])
+        
+        response = client.post("/summary/sessions", json={
+            "start": window_start.isoformat(),
+            "end": (window_start + timedelta(hours=1)).isoformat(),
+            "projects": []
+        })
+        assert response.status_code == 200
+        categories = {item["subcategory"]: item["total_duration_ms"] for item in response.json()["categories"]}
+        assert set(categories) == {"開発", "会議"}
+        assert categories["開発"] >= 20
+    
+    def test_summary_from_session_ids(self, client):
+        session_ids = self.record_sessions(client, ["設計レビュー", "テスト作成"])
+        
+        response = client.post("/summary/sessions", json={"session_ids": session_ids[:1]})
+        assert response.status_code == 200
+        categories = response.json()["categories"]
+        assert len(categories) == 1
+        assert categories[0]["subcategory"] == "設計"
+    
+    def test_summary_markdown_from_sessions(self, client):
+        session_ids = self.record_sessions(client, ["ドキュメント作成"])
+        
+        response = client.post("/summary/sessions/markdown", json={"session_ids": session_ids})
+        assert response.status_code == 200
+        assert "ドキュメント作成" in response.text
+    
+    def test_summary_requires_window_or_session_ids(self, client):
+        response = client.post("/summary/sessions", json={})
+        assert response.status_code == 400
+    
+    def test_summary_with_unknown_session_id(self, client):
+        response = client.post("/summary/sessions", json={"session_ids": ["unknown"]})
+        assert response.status_code == 404
@@ -0,0 +1,25 @@
+import socket
+from uvicorn.protocols.http.auto import AutoHTTPProtocol
+from uvicorn_protocol import NoDelayHTTPProtocol
+
+
+class FakeTransport:
+    
+    def __init__(self, sock):
+        self.sock = sock
+    
+    def get_extra_info(self, name, default=None):
+        return self.sock if name == "socket" else default
+
+
+class TestNoDelayHTTPProtocol:
+    
+    def test_connection_made_enables_tcp_nodelay(self, monkeypatch):
+        monkeypatch.setattr(AutoHTTPProtocol, "connection_made", lambda self, transport: None)
+        protocol = NoDelayHTTPProtocol.__new__(NoDelayHTTPProtocol)
+        
+        # uvicorn --workers と同じく proto を指定せずに作ったソケット
+        with socket.socket(socket.AF_INET) as sock:
+            protocol.connection_made(FakeTransport(sock))
+            
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
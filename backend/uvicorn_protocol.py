@@ -0,0 +1,18 @@
+import socket
+from uvicorn.protocols.http.auto import AutoHTTPProtocol
+
+
+class NoDelayHTTPProtocol(AutoHTTPProtocol):
+    """接続ごとに TCP_NODELAY を設定する uvicorn の HTTP プロトコル。
+    
+    uvicorn --workers N では待ち受けソケットを proto=0 で作るため、asyncio が受け付けた接続に
+    TCP_NODELAY を設定せず、Nagle アルゴリズムと遅延 ACK で 1 リクエストごとに約 40ms 待たされる。
+        
+        uvicorn main:app --workers 4 --http uvicorn_protocol:NoDelayHTTPProtocol
+    """
+    
+    def connection_made(self, transport) -> None:
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().connection_made(transport)